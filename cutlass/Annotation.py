@@ -768,7 +768,7 @@ class Annotation(Base):
         else:
             self._urls = ["fasp://" + Annotation.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is validated in the save function. If the data is not valid,
@@ -779,7 +779,8 @@ class Annotation(Base):
         Also, the version is updated as the data is saved in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -787,6 +788,9 @@ class Annotation(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -200,6 +200,26 @@ class Base(object):
 
         return valid
 
+    def _deferred(self):
+        """
+        Hands the node to the session's unit of work, if one is open. The
+        save() method of every node class calls this first, and returns
+        straight away if the node was deferred: it is validated and written
+        when the unit of work is flushed.
+
+        Args:
+            None
+
+        Returns:
+            True if the save was deferred, False if it should go ahead.
+        """
+        unit = iHMPSession.get_session().current_unit_of_work()
+
+        if unit is None:
+            return False
+
+        return unit.defer(self)
+
     def to_json(self, indent=4):
         """
         Converts the current object from a raw dictionary to a pretty-printed
@@ -223,6 +243,151 @@ class Base(object):
 
         return json_str
 
+    @classmethod
+    def load_many(cls, node_ids, cache=None, workers=8, records=False, lazy=False):
+        """
+        Loads many nodes of this class at once. The documents are retrieved
+        with concurrent lookups rather than one load() call after another.
+
+        Args:
+            node_ids (list): The OSDF IDs of the documents to load.
+            cache (dict): Optional dictionary of node ID to document that is
+                          consulted before, and filled in by, the lookups.
+            workers (int): The maximum number of concurrent lookups.
+            records (bool): Return lightweight, read-only NodeRecords
+                            instead of fully hydrated objects.
+            lazy (bool): Return LazyNodes, hydrated on first use.
+
+        Returns:
+            A tuple with the list of loaded objects, in the same order as
+            the IDs, and the list of IDs that could not be loaded (because
+            they do not exist or are not of this class).
+        """
+        module_logger.debug("In load_many.")
+
+        # local import to avoid cyclic imports
+        from .dependency import load_many, node_type_of
+
+        node_type = None if cls is Base else node_type_of(cls)
+
+        return load_many(node_ids, node_type=node_type, cache=cache, workers=workers,
+                         records=records, lazy=lazy)
+
+    @classmethod
+    def search_iter(cls, query=None, records=False, lazy=False, stream=False):
+        """
+        Searches OSDF for nodes of this class, like the search() method,
+        but returns a generator that walks through every page of results,
+        retrieving each page only when the previous one has been consumed.
+        Memory use therefore does not grow with the size of the result set.
+
+        Args:
+            query (str): Optional OQL criteria. The node type of the class
+                         is added to it automatically.
+            records (bool): Yield lightweight, read-only NodeRecords instead
+                            of fully hydrated objects.
+            lazy (bool): Yield LazyNodes, hydrated on first use.
+            stream (bool): Parse each page of results incrementally, so
+                           that the first node is available sooner and a
+                           whole page is never held in memory at once.
+
+        Returns:
+            A generator of objects of this class.
+        """
+        module_logger.debug("In search_iter.")
+
+        # local import to avoid cyclic imports
+        from .dependency import make_node, node_loaders, node_type_of, oql_docs, \
+                                typed_query
+
+        node_type = None if cls is Base else node_type_of(cls)
+        full_query = typed_query(query, node_type)
+
+        module_logger.debug("Submitting OQL query: %s", full_query)
+
+        for doc in oql_docs(full_query, cls.namespace, stream=stream):
+            if doc['node_type'] in node_loaders:
+                yield make_node(doc, records, lazy)
+
+    @classmethod
+    def count(cls, query=None):
+        """
+        Counts the nodes of this class matching a query, without retrieving
+        and loading them. Only the first page of results is requested, for
+        its result count.
+
+        Args:
+            query (str): Optional OQL criteria. The node type of the class
+                         is added to it automatically.
+
+        Returns:
+            The number of matching nodes.
+        """
+        module_logger.debug("In count.")
+
+        # local import to avoid cyclic imports
+        from .dependency import count_docs, node_type_of, typed_query
+
+        node_type = None if cls is Base else node_type_of(cls)
+
+        return count_docs(typed_query(query, node_type), cls.namespace)
+
+    @classmethod
+    def _export_docs(cls, query):
+        # local import to avoid cyclic imports
+        from .dependency import node_type_of, oql_docs, typed_query
+
+        node_type = None if cls is Base else node_type_of(cls)
+
+        return oql_docs(typed_query(query, node_type), cls.namespace, stream=True)
+
+    @classmethod
+    def to_frame(cls, query=None, columns=None, chunk_size=5000):
+        """
+        Exports the nodes of this class matching a query to a pandas data
+        frame. The documents are parsed from the OSDF responses one at a
+        time and converted to columns in chunks, without creating node
+        objects. Requires pandas.
+
+        Args:
+            query (str): Optional OQL criteria. The node type of the class
+                         is added to it automatically.
+            columns (list): The columns to include, such as 'id',
+                            'mixs.biome' or 'linkage.by'. Defaults to all.
+            chunk_size (int): The number of documents converted at a time.
+
+        Returns:
+            A pandas DataFrame with one row per node.
+        """
+        module_logger.debug("In to_frame.")
+
+        # local import to avoid cyclic imports
+        from .frames import to_frame
+
+        return to_frame(cls._export_docs(query), columns, chunk_size)
+
+    @classmethod
+    def to_arrow(cls, query=None, columns=None, chunk_size=5000):
+        """
+        Exports the nodes of this class matching a query to an Arrow table,
+        in the same way as to_frame(). Requires pyarrow.
+
+        Args:
+            query (str): Optional OQL criteria. The node type of the class
+                         is added to it automatically.
+            columns (list): The columns to include. Defaults to all.
+            chunk_size (int): The number of documents converted at a time.
+
+        Returns:
+            A pyarrow Table with one row per node.
+        """
+        module_logger.debug("In to_arrow.")
+
+        # local import to avoid cyclic imports
+        from .frames import to_arrow
+
+        return to_arrow(cls._export_docs(query), columns, chunk_size)
+
     def search(self, query):
         """
         Searches the OSDF instance using the specified input parameters
@@ -297,6 +462,80 @@ class Base(object):
         else:
             return cs
 
+    def traverse(self, max_depth=None, include_types=None, exclude_types=None,
+                 order="dfs", records=False, lazy=False, dry_run=False):
+        """
+        Iterates over the descendants of this node without recursion. Nodes
+        reachable through several parents are only returned once.
+
+        Args:
+            max_depth (int): How many levels to descend. None for no limit.
+            include_types (list): Only return nodes of these node types.
+                                  Branches that cannot lead to them are
+                                  never queried.
+            exclude_types (list): Node types to skip, along with all the
+                                  nodes below them.
+            order (str): Either 'dfs' (depth-first) or 'bfs' (breadth-first).
+            records (bool): Yield lightweight, read-only NodeRecords instead
+                            of fully hydrated objects.
+            lazy (bool): Yield LazyNodes, hydrated on first use.
+            dry_run (bool): Return a CostEstimate of the traversal instead.
+
+        Returns:
+            An iterator of the descendant node objects, or a CostEstimate.
+        """
+        self.logger.debug("In traverse.")
+
+        # local import to avoid cyclic imports
+        from .dependency import traverse
+
+        return traverse(self, max_depth=max_depth, include_types=include_types,
+                        exclude_types=exclude_types, order=order, records=records,
+                        lazy=lazy, dry_run=dry_run)
+
+    def parents(self, cache=None):
+        """
+        Returns the nodes this node links to, such as the sample a prep was
+        prepared from. The linked IDs are retrieved concurrently.
+
+        Args:
+            cache (dict): Optional dictionary of node ID to document that is
+                          consulted before, and filled in by, the lookups.
+
+        Returns:
+            A list of the parent node objects.
+        """
+        self.logger.debug("In parents.")
+
+        # local import to avoid cyclic imports
+        from .dependency import ancestor_lists
+
+        return ancestor_lists([self], max_depth=1, cache=cache)[0]
+
+    def ancestors(self, max_depth=None, include_types=None, cache=None):
+        """
+        Returns the nodes above this node, for instance the prep, sample,
+        visit, subject and study of a sequence set. The linkage is resolved
+        one level at a time with batched lookups. To resolve the ancestors
+        of many nodes efficiently, use dependency.ancestor_lists().
+
+        Args:
+            max_depth (int): How many levels to climb. None for no limit.
+            include_types (list): Only return ancestors of these node types.
+            cache (dict): Optional dictionary of node ID to document that is
+                          consulted before, and filled in by, the lookups.
+
+        Returns:
+            A list of ancestor node objects, nearest first.
+        """
+        self.logger.debug("In ancestors.")
+
+        # local import to avoid cyclic imports
+        from .dependency import ancestor_lists
+
+        return ancestor_lists([self], max_depth=max_depth,
+                              include_types=include_types, cache=cache)[0]
+
     def __call__(self):
         return self
 
@@ -733,7 +733,7 @@ class ClusteredSeqSet(Base):
         else:
             self._urls = ["fasp://" + ClusteredSeqSet.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is first validated. If the data is not valid, then the data
@@ -743,13 +743,17 @@ class ClusteredSeqSet(Base):
         save, will be assigned to the alphanumeric ID found in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -589,7 +589,7 @@ class Cytokine(Base):
         else:
             self._urls = ["fasp://" + Cytokine.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is first validated. If the data is not valid, then the data
@@ -599,7 +599,8 @@ class Cytokine(Base):
         save, will be assigned to the alphanumeric ID found in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -607,6 +608,9 @@ class Cytokine(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -972,7 +972,7 @@ class HostSeqPrep(Base):
 
         return prep
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current
         data for the instance is validated in the save function. If the data is
@@ -983,7 +983,8 @@ class HostSeqPrep(Base):
         Also, the version is updated as the data is saved in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -991,6 +992,9 @@ class HostSeqPrep(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid")
             return False
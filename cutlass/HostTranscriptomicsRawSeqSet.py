@@ -680,7 +680,7 @@ class HostTranscriptomicsRawSeqSet(Base):
         else:
             self._urls = ["fasp://" + HostTranscriptomicsRawSeqSet.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is validated in the save function. If the data is not valid,
@@ -691,13 +691,17 @@ class HostTranscriptomicsRawSeqSet(Base):
         OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid")
             return False
@@ -607,7 +607,7 @@ class Metabolome(Base):
         else:
             self._urls = ["fasp://" + Metabolome.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is first validated. If the data is not valid, then the data
@@ -617,7 +617,8 @@ class Metabolome(Base):
         save, will be assigned to the alphanumeric ID found in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -625,6 +626,9 @@ class Metabolome(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -906,7 +906,7 @@ class MicrobiomeAssayPrep(Base):
 
         return node
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in OSDF. The JSON form of the current data for the
         instance is validated in the save function. If the data is not valid,
@@ -917,7 +917,8 @@ class MicrobiomeAssayPrep(Base):
         Also, the version is updated as the data is saved in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -925,6 +926,9 @@ class MicrobiomeAssayPrep(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
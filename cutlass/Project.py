@@ -148,7 +148,7 @@ class Project(Base):
         fields = ('name', 'description', 'mixs', 'tags')
         return fields
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current
         data for the instance is validated in the save function. If the data is
@@ -159,7 +159,8 @@ class Project(Base):
         Also, the version is updated as the data is saved in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -170,6 +171,9 @@ class Project(Base):
         # if node previously saved, use edit_node instead since ID is given
         # (an update in a way) can also use get_node to check if the
         # node already exists
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid")
             return False
@@ -329,7 +329,7 @@ class Sample(Base):
 
         return valid
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data to OSDF. The JSON form of the object is not valid, then
         the data is not saved. If the instance was saved previously, then the
@@ -340,7 +340,8 @@ class Sample(Base):
         completed.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -348,6 +349,9 @@ class Sample(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid")
             return False
@@ -545,7 +549,7 @@ class Sample(Base):
 
         if self._int_sample_id is not None:
             self.logger.debug("%s object has the 'int_sample_id' property set.", __name__)
-            sample_doc['meta']['name'] = self._name
+            sample_doc['meta']['int_sample_id'] = self._int_sample_id
 
         if self._name is not None:
             self.logger.debug("%s object has the 'name' property set.", __name__)
@@ -678,7 +678,7 @@ class SixteenSDnaPrep(Base):
 
         return prep
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current data
         for the instance is validated in the save function. If the data is not valid,
@@ -689,7 +689,8 @@ class SixteenSDnaPrep(Base):
         version is updated as the data is saved in the OSDF instance.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -697,6 +698,9 @@ class SixteenSDnaPrep(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid")
             return False
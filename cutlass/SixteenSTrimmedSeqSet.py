@@ -625,7 +625,7 @@ class SixteenSTrimmedSeqSet(Base):
         else:
             self._urls = ["fasp://" + SixteenSTrimmedSeqSet.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current
         data for the instance is validated in the save function. If the data is
@@ -636,7 +636,8 @@ class SixteenSTrimmedSeqSet(Base):
         OSDF. Also, the version is updated as the data is saved in OSDF.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -644,6 +645,9 @@ class SixteenSTrimmedSeqSet(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -400,7 +400,7 @@ class Subject(Base):
         module_logger.debug("Returning loaded %s.", __name__)
         return subject
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current data
         for the instance is validated in the save function. If the data is not valid,
@@ -411,7 +411,8 @@ class Subject(Base):
         version is updated as the data is saved in the OSDF instance.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -419,6 +420,9 @@ class Subject(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -665,7 +665,7 @@ class VisitAttribute(Base):
 
         return result_list
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data to OSDF. The JSON form of the object is not valid, then
         the data is not saved. If the instance was saved previously, then the
@@ -676,7 +676,8 @@ class VisitAttribute(Base):
         completed.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -684,6 +685,9 @@ class VisitAttribute(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         if not self.is_valid():
             self.logger.error("Cannot save, data is invalid.")
             return False
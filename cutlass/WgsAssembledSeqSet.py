@@ -778,7 +778,7 @@ class WgsAssembledSeqSet(Base):
         else:
             self._urls = ["fasp://" + WgsAssembledSeqSet.aspera_server + remote_path]
 
-    def save(self):
+    def save(self, defer=True):
         """
         Saves the data in the current instance. The JSON form of the current
         data for the instance is validated in the save function. If the data is
@@ -790,7 +790,8 @@ class WgsAssembledSeqSet(Base):
         the OSDF instance.
 
         Args:
-            None
+            defer (bool): Whether to hand the node to an open unit of
+                          work instead of saving it now.
 
         Returns;
             True if successful, False otherwise.
@@ -798,6 +799,9 @@ class WgsAssembledSeqSet(Base):
         """
         self.logger.debug("In save.")
 
+        if defer and self._deferred():
+            return True
+
         # If node previously saved, use edit_node instead since ID
         # is given (an update in a way)
         # can also use get_node to check if the node already exists
@@ -6,6 +6,7 @@ import os
 import re
 import subprocess
 import logging
+import time
 
 # download example command(s):
 #
@@ -27,6 +28,10 @@ logger.addHandler(logging.NullHandler())
 ASCP_COMMAND = "ascp"
 ASCP_MIN_VERSION = '3.5'
 
+# Functions called with (local_file, size, seconds, success) after every
+# upload, for instance to keep track of the transfer rate.
+upload_listeners = []
+
 # compare version numbers
 def version_cmp(v1, v2):
     """
@@ -175,4 +180,11 @@ def upload_file(server, username, password, local_file, remote_path,
     remote_clause = username + "@" + server + ":" + remote_path
     ascp_cmd = [ASCP_COMMAND, "-T", "-v", "-l", "300M", local_file, remote_clause]
 
-    return run_ascp(ascp_cmd, password, keyfile)
+    start = time.time()
+    success = run_ascp(ascp_cmd, password, keyfile)
+    seconds = time.time() - start
+
+    for listener in list(upload_listeners):
+        listener(local_file, os.path.getsize(local_file), seconds, success)
+
+    return success
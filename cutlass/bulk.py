@@ -0,0 +1,853 @@
+"""
+Bulk operations over many nodes, ordered by the linkage between them.
+
+save_all() saves a collection of nodes parents first. The links of a node
+may refer to other node objects directly, including ones that have not
+been saved yet; those references are replaced with the IDs the parents
+receive as they are saved. The nodes of each level of the dependency
+order are saved concurrently.
+
+delete_subtree() and delete_where() work the other way around: the nodes
+are ordered leaves first, using the actual linkage between them, and the
+nodes of each level are deleted concurrently. Both can be run as a dry run
+that only reports what would be deleted.
+
+relink() changes the linkage of many existing nodes at once. The documents
+are retrieved, edited and written back in batches, and every edit is made
+to the version that was read, so a node changed by someone else in the
+meantime is reported as a conflict rather than overwritten.
+
+A UnitOfWork, opened with iHMPSession.unit_of_work(), collects the nodes
+saved inside a 'with' block and writes them with save_all() when the block
+exits, so that a node saved several times is only written once.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from cutlass.Base import Base
+from cutlass.costs import estimate_delete, estimate_save
+from cutlass.iHMPSession import iHMPSession
+from cutlass.dependency import fetch_docs, link_ids, node_type_of, oql_docs, \
+    typed_query, DEFAULT_WORKERS
+
+# pylint: disable=W0703, C1801, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# How many nodes relink() retrieves and edits at a time by default.
+DEFAULT_BATCH_SIZE = 100
+
+class BulkResult(object):
+    """
+    The outcome of a bulk operation.
+
+    Attributes:
+        results (list): One dictionary per node, in the order processed,
+                        with the node, its 'status' ('saved', 'resumed',
+                        'rolled_back', 'deleted', 'relinked', 'unchanged',
+                        'planned', 'conflict', 'failed' or 'skipped') and
+                        any 'error'. For a relink, the node is its ID and
+                        'doc' holds its document.
+        levels (list): The number of nodes in each level, in the order the
+                       levels were processed.
+        seconds (float): The time taken.
+        rollback (BulkResult): For a save that was rolled back, the outcome
+                               of deleting the inserted nodes, or None.
+        estimate (CostEstimate): For a dry run, the requests, uploads and
+                                 time the operation is expected to need.
+        id_map (dict): For an import, the new node ID of each node ID in
+                       the file, or None.
+    """
+
+    def __init__(self):
+        self.results = []
+        self.levels = []
+        self.seconds = 0.0
+        self.rollback = None
+        self.estimate = None
+        self.id_map = None
+
+    def count(self, status):
+        """ Returns the number of nodes with the given status. """
+        return len([result for result in self.results if result['status'] == status])
+
+    def nodes(self, status):
+        """ Returns the nodes with the given status. """
+        return [result['node'] for result in self.results if result['status'] == status]
+
+    @property
+    def ok(self):
+        """ bool: Whether no node failed, was skipped or was in conflict. """
+        return self.count('failed') == 0 and self.count('skipped') == 0 and \
+            self.count('conflict') == 0
+
+    @property
+    def throughput(self):
+        """ float: The number of nodes processed per second. """
+        done = len(self.results) - self.count('skipped') - self.count('resumed')
+
+        if self.seconds <= 0:
+            return float(done)
+
+        return done / self.seconds
+
+    def __str__(self):
+        counts = {}
+        for result in self.results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+
+        summary = ", ".join(["{} {}".format(number, status)
+                             for (status, number) in sorted(counts.items())])
+
+        return "{} in {} levels, {:.2f}s ({:.1f} nodes/s)".format(
+            summary or "nothing", len(self.levels), self.seconds, self.throughput)
+
+def _linked_nodes(node):
+    # The node objects referenced directly in the links of a node
+    found = []
+
+    for targets in node.links.values():
+        for target in targets:
+            if isinstance(target, Base):
+                found.append(target)
+
+    return found
+
+def save_levels(nodes):
+    """
+    Orders nodes so that every node comes after the nodes its links refer
+    to directly. Unsaved nodes referred to but missing from the list are
+    added; nodes that already have an ID are not saved again.
+
+    Args:
+        nodes (list): The node objects.
+
+    Returns:
+        A list of levels, each a list of nodes that only depend on the
+        nodes of the earlier levels.
+
+    Exceptions:
+        ValueError: If the links form a cycle.
+    """
+    by_key = {}
+    pending = list(nodes)
+
+    while pending:
+        node = pending.pop()
+        if id(node) not in by_key:
+            by_key[id(node)] = node
+            pending.extend([parent for parent in _linked_nodes(node) if parent.id is None])
+
+    # Keep the caller's order within each level
+    order = dict((id(node), index) for (index, node) in enumerate(nodes))
+
+    remaining = dict((key, set(id(parent) for parent in _linked_nodes(node)
+                               if id(parent) in by_key))
+                     for (key, node) in by_key.items())
+    levels = []
+
+    while remaining:
+        ready = [key for (key, parents) in remaining.items() if not parents]
+
+        if not ready:
+            raise ValueError("The links between the nodes form a cycle.")
+
+        ready.sort(key=lambda key: order.get(key, len(order)))
+        levels.append([by_key[key] for key in ready])
+
+        for key in ready:
+            del remaining[key]
+
+        for parents in remaining.values():
+            parents.difference_update(ready)
+
+    return levels
+
+def _resolve_links(node):
+    # Replaces references to node objects with their IDs. Returns False if
+    # a referenced node has no ID, because it could not be saved.
+    resolved = True
+
+    for (relation, targets) in node.links.items():
+        ids = []
+        for target in targets:
+            if isinstance(target, Base):
+                if target.id is None:
+                    resolved = False
+                    ids.append(target)
+                else:
+                    ids.append(target.id)
+            else:
+                ids.append(target)
+        node.links[relation] = ids
+
+    return resolved
+
+def _save(node, journal=None, key=None):
+    if journal is not None:
+        node_type = node_type_of(node)
+        journal.planned(key, node_type=node_type)
+
+    try:
+        if node.save(defer=False):
+            outcome = {'node': node, 'status': 'saved', 'error': None}
+        else:
+            outcome = {'node': node, 'status': 'failed', 'error': "save() returned False."}
+    except Exception as save_exception:
+        outcome = {'node': node, 'status': 'failed', 'error': str(save_exception)}
+
+    if journal is not None:
+        if outcome['status'] == 'saved':
+            journal.saved(key, node.id, node.version, node_type=node_type)
+        else:
+            journal.failed(key, outcome['error'], node_type=node_type)
+
+    return outcome
+
+def _rollback(result, inserted, links, workers, journal, keys):
+    # Deletes the inserted nodes, children first, and puts the nodes of the
+    # batch back the way they were before the save
+    by_id = dict((node.id, node) for node in inserted)
+    docs = [{'id': node.id, 'linkage': node.links} for node in inserted]
+
+    undo = delete_docs(docs, workers=workers)
+    removed = set()
+
+    for outcome in undo.results:
+        if outcome['status'] == 'deleted':
+            node = by_id[outcome['node']['id']]
+            removed.add(id(node))
+
+            node._set_id(None)
+            node._version = None
+
+            if journal is not None:
+                journal.rolled_back(keys[id(node)], node_type=node_type_of(node))
+
+    for outcome in result.results:
+        node = outcome['node']
+
+        if id(node) in removed:
+            outcome['status'] = 'rolled_back'
+
+        # The links to deleted nodes go back to being node objects
+        if id(node) in links:
+            node.links = links[id(node)]
+
+    result.rollback = undo
+
+    if undo.ok:
+        module_logger.info("Rolled back %s inserted nodes.", len(removed))
+    else:
+        module_logger.error("Could not roll back every inserted node: %s", undo)
+
+def save_all(nodes, workers=DEFAULT_WORKERS, journal=None, key=None, rollback=False,
+             dry_run=False):
+    """
+    Saves many nodes, parents first, saving the nodes of each level of the
+    dependency order concurrently. Node objects used in links are replaced
+    with their IDs once they are saved. A node whose parents failed to save
+    is skipped.
+
+    With rollback, the save stops at the first level in which a node fails,
+    and the nodes inserted so far are deleted again, children first. The
+    nodes are left as they were before the save, without IDs and with their
+    links to other node objects, so the same nodes can be saved again once
+    the problem is fixed. Edits of nodes that already existed are not
+    undone.
+
+    With a journal, every write is recorded, and the nodes whose writes the
+    journal records as completed by an earlier run are not saved again:
+    they get their recorded IDs and versions, and the status 'resumed'.
+
+    Args:
+        nodes (list): The node objects to save.
+        workers (int): The maximum number of concurrent saves.
+        journal (Journal): Optional journal to record the writes in and to
+                           resume from.
+        key (function): Returns the journal key of a node. Defaults to
+                        journal.content_key().
+        rollback (bool): Whether to delete the inserted nodes again if any
+                         node fails.
+        dry_run (bool): Only work out the order and estimate the cost;
+                        save nothing.
+
+    Returns:
+        A BulkResult. Nodes that were deleted again have the status
+        'rolled_back'. In a dry run every node has the status 'planned' and
+        the result has an estimate.
+
+    Exceptions:
+        ValueError: If the links between the nodes form a cycle.
+    """
+    module_logger.debug("In save_all.")
+
+    levels = save_levels(nodes)
+    result = BulkResult()
+    start = time.time()
+
+    keys = {}
+
+    if journal is not None:
+        # local import to avoid cyclic imports
+        from cutlass.journal import content_key
+
+        # The keys are computed before any node is saved or restored, so
+        # that they do not depend on how far an earlier run got
+        for level in levels:
+            for node in level:
+                if key is None:
+                    content_key(node, keys)
+                else:
+                    keys[id(node)] = key(node)
+
+    if dry_run:
+        for level in levels:
+            result.levels.append(len(level))
+            result.results.extend([{'node': node, 'status': 'planned', 'error': None}
+                                   for node in level])
+
+        result.estimate = estimate_save(levels, workers, journal, keys)
+
+        return result
+
+    def save(node):
+        return _save(node, journal, keys.get(id(node)))
+
+    # The links as given, and the nodes inserted, for a rollback
+    links = {}
+    inserted = []
+
+    if rollback:
+        for level in levels:
+            for node in level:
+                links[id(node)] = dict((relation, list(targets))
+                                       for (relation, targets) in node.links.items())
+
+    pool = ThreadPool(max(1, workers))
+
+    try:
+        for (number, level) in enumerate(levels):
+            if rollback and not result.ok:
+                result.results.extend([{'node': node, 'status': 'skipped',
+                                        'error': "Not saved after an earlier failure."}
+                                       for later in levels[number:] for node in later])
+                break
+
+            ready = []
+
+            for node in level:
+                if not _resolve_links(node):
+                    result.results.append({'node': node, 'status': 'skipped',
+                                           'error': "A linked node was not saved."})
+                elif journal is not None and journal.restore(node, keys[id(node)]):
+                    result.results.append({'node': node, 'status': 'resumed',
+                                           'error': None})
+                else:
+                    ready.append(node)
+
+            new = set(id(node) for node in ready if node.id is None)
+
+            result.levels.append(len(level))
+
+            for outcome in pool.map(save, ready):
+                result.results.append(outcome)
+
+                if outcome['status'] == 'saved' and id(outcome['node']) in new:
+                    inserted.append(outcome['node'])
+    finally:
+        pool.close()
+        pool.join()
+
+    if rollback and not result.ok and inserted:
+        _rollback(result, inserted, links, workers, journal, keys)
+
+    result.seconds = time.time() - start
+
+    module_logger.info("save_all: %s", result)
+
+    return result
+
+class UnitOfWork(object):
+    """
+    Defers the saves of nodes and writes them together through save_all().
+    Use iHMPSession.unit_of_work() to open one.
+
+    Attributes:
+        results (list): The BulkResult of each flush so far.
+        deferred (int): The number of save() calls deferred.
+        coalesced (int): The number of those calls that only replaced a
+                         write already pending for the same node.
+    """
+
+    def __init__(self, session, max_nodes=None, max_bytes=None, workers=DEFAULT_WORKERS):
+        """
+        Args:
+            session (iHMPSession): The session whose saves are deferred.
+            max_nodes (int): Flush whenever this many nodes are pending.
+            max_bytes (int): Flush whenever the JSON documents of the pending
+                             nodes reach this size.
+            workers (int): The maximum number of concurrent saves.
+        """
+        self.session = session
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.results = []
+        self.deferred = 0
+        self.coalesced = 0
+
+        # key -> node, in the order the nodes were first saved
+        self._pending = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def ok(self):
+        """ bool: Whether every flush so far saved every node. """
+        return all([result.ok for result in self.results])
+
+    @staticmethod
+    def _key(node):
+        # Objects loaded separately for the same OSDF node share their ID
+        if node.id is not None:
+            return node.id
+
+        return id(node)
+
+    def defer(self, node):
+        """
+        Registers a node to be saved at the next flush. Called by save().
+
+        Args:
+            node (Base): The node being saved.
+
+        Returns:
+            True, as the save is deferred.
+        """
+        with self._lock:
+            key = self._key(node)
+
+            if key in self._pending:
+                self.coalesced += 1
+
+            self._pending[key] = node
+            self.deferred += 1
+
+            if self.max_bytes is not None:
+                size = len(json.dumps(node._get_raw_doc(), default=str))
+                self._bytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+
+            full = (self.max_nodes is not None and len(self._pending) >= self.max_nodes) or \
+                   (self.max_bytes is not None and self._bytes >= self.max_bytes)
+
+        if full:
+            module_logger.debug("Flushing a full unit of work.")
+            self.flush()
+
+        return True
+
+    def discard(self):
+        """
+        Drops the pending writes.
+
+        Returns:
+            The nodes that were pending.
+        """
+        with self._lock:
+            nodes = list(self._pending.values())
+            self._pending = OrderedDict()
+            self._sizes = {}
+            self._bytes = 0
+
+        return nodes
+
+    def flush(self):
+        """
+        Saves the pending nodes with save_all(), parents first.
+
+        Returns:
+            The BulkResult of the flush.
+
+        Exceptions:
+            ValueError: If the links between the nodes form a cycle.
+        """
+        module_logger.debug("In flush.")
+
+        nodes = self.discard()
+
+        # save_all() saves the nodes with save(defer=False)
+        result = save_all(nodes, workers=self.workers)
+
+        self.results.append(result)
+
+        if not result.ok:
+            module_logger.error("A unit of work did not save every node: %s", result)
+
+        return result
+
+    def __enter__(self):
+        self.session._open_units().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.session._open_units().remove(self)
+
+        if exc_type is not None:
+            module_logger.warning("Discarding %s pending saves after an error.",
+                                  len(self._pending))
+            self.discard()
+            return False
+
+        outer = self.session.current_unit_of_work()
+
+        if outer is not None:
+            # A nested unit of work is written with the one around it
+            for node in self.discard():
+                outer.defer(node)
+        elif self._pending:
+            self.flush()
+
+        return False
+
+def delete_levels(docs):
+    """
+    Orders documents for deletion: a node comes after every node of the
+    list that links to it.
+
+    Args:
+        docs (list): The OSDF documents.
+
+    Returns:
+        A list of levels, each a list of documents, leaves first.
+
+    Exceptions:
+        ValueError: If the links form a cycle.
+    """
+    by_id = dict((doc['id'], doc) for doc in docs)
+    order = dict((doc['id'], index) for (index, doc) in enumerate(docs))
+
+    children = dict((node_id, set()) for node_id in by_id)
+
+    for (node_id, doc) in by_id.items():
+        for parent_id in link_ids(doc.get('linkage', {})):
+            if parent_id in children and parent_id != node_id:
+                children[parent_id].add(node_id)
+
+    levels = []
+
+    while children:
+        ready = sorted([node_id for (node_id, linked) in children.items() if not linked],
+                       key=lambda node_id: order[node_id])
+
+        if not ready:
+            raise ValueError("The links between the nodes form a cycle.")
+
+        levels.append([by_id[node_id] for node_id in ready])
+
+        for node_id in ready:
+            del children[node_id]
+
+        for linked in children.values():
+            linked.difference_update(ready)
+
+    return levels
+
+def _delete(doc):
+    try:
+        iHMPSession.get_session().get_osdf().delete_node(doc['id'])
+        return {'node': doc, 'status': 'deleted', 'error': None}
+    except Exception as delete_exception:
+        return {'node': doc, 'status': 'failed', 'error': str(delete_exception)}
+
+def delete_docs(docs, dry_run=False, workers=DEFAULT_WORKERS):
+    """
+    Deletes the nodes of the given documents, leaves first, deleting the
+    nodes of each level concurrently. A node is skipped if one of the nodes
+    linking to it could not be deleted.
+
+    Args:
+        docs (list): The OSDF documents of the nodes to delete.
+        dry_run (bool): Only work out the order; delete nothing.
+        workers (int): The maximum number of concurrent deletes.
+
+    Returns:
+        A BulkResult, with the documents as the nodes. In a dry run every
+        node has the status 'planned' and the result has an estimate.
+    """
+    module_logger.debug("In delete_docs.")
+
+    levels = delete_levels(docs)
+    result = BulkResult()
+    start = time.time()
+
+    if dry_run:
+        for level in levels:
+            result.levels.append(len(level))
+            result.results.extend([{'node': doc, 'status': 'planned', 'error': None}
+                                   for doc in level])
+
+        result.estimate = estimate_delete(levels, workers)
+
+        return result
+
+    blocked = set()
+    pool = ThreadPool(max(1, workers))
+
+    try:
+        for level in levels:
+            ready = []
+
+            for doc in level:
+                if doc['id'] in blocked:
+                    result.results.append({'node': doc, 'status': 'skipped',
+                                           'error': "A linked node was not deleted."})
+                else:
+                    ready.append(doc)
+
+            result.levels.append(len(level))
+
+            for outcome in pool.map(_delete, ready):
+                result.results.append(outcome)
+
+                if outcome['status'] == 'failed':
+                    blocked.update(link_ids(outcome['node'].get('linkage', {})))
+
+            # Skipped nodes block their parents too
+            for doc in level:
+                if doc['id'] in blocked:
+                    blocked.update(link_ids(doc.get('linkage', {})))
+    finally:
+        pool.close()
+        pool.join()
+
+    result.seconds = time.time() - start
+
+    module_logger.info("delete_docs: %s", result)
+
+    return result
+
+def delete_subtree(root, dry_run=False, include_root=True, workers=DEFAULT_WORKERS):
+    """
+    Deletes a node and everything below it, leaves first.
+
+    Args:
+        root (Base): The node at the top of the subtree. It must have an ID.
+        dry_run (bool): Only find the nodes and work out the order.
+        include_root (bool): Whether to delete the root node itself.
+        workers (int): The maximum number of concurrent queries and deletes.
+
+    Returns:
+        A BulkResult, with the documents of the nodes as the nodes.
+
+    Exceptions:
+        ValueError: If the root node has no ID.
+    """
+    module_logger.debug("In delete_subtree.")
+
+    # local import to avoid cyclic imports
+    from cutlass.planner import iter_levels
+
+    if root.id is None:
+        raise ValueError("Cannot delete below a node without an ID.")
+
+    docs = []
+    hops = []
+
+    if include_root:
+        docs.append(iHMPSession.get_session().get_osdf().get_node(root.id))
+
+    for (hop, level) in iter_levels(root, workers=workers):
+        hops.append(hop)
+        docs.extend(level)
+
+    result = delete_docs(docs, dry_run=dry_run, workers=workers)
+
+    if dry_run:
+        result.estimate = estimate_delete(delete_levels(docs), workers,
+                                          root=docs[0] if include_root else None,
+                                          hops=hops)
+
+    return result
+
+def delete_where(query, dry_run=False, namespace=Base.namespace, workers=DEFAULT_WORKERS):
+    """
+    Deletes every node matching an OQL query, leaves first.
+
+    Args:
+        query (str): The OQL criteria, for instance '"test_load"[tags]'.
+        dry_run (bool): Only find the nodes and work out the order.
+        namespace (str): The OSDF namespace to query.
+        workers (int): The maximum number of concurrent deletes.
+
+    Returns:
+        A BulkResult, with the documents of the nodes as the nodes.
+    """
+    module_logger.debug("In delete_where.")
+
+    stats = {}
+    docs = list(oql_docs(typed_query(query), namespace, stats=stats))
+
+    result = delete_docs(docs, dry_run=dry_run, workers=workers)
+
+    if dry_run:
+        result.estimate = estimate_delete(delete_levels(docs), workers,
+                                          pages=stats.get('pages', 0))
+
+    return result
+
+def link_changes(linkage, change):
+    """
+    Applies a linkage change to a copy of a node's linkage.
+
+    Args:
+        linkage (dict): The linkage of the node, relation to list of IDs.
+        change (dict): The change, with any of the keys 'set' (relation to
+                       the IDs that replace the current ones; an empty list
+                       removes the relation), 'add' and 'remove' (relation
+                       to the IDs to add or remove), applied in that order,
+                       and optionally 'ver', the version of the node the
+                       change was meant for.
+
+    Returns:
+        The new linkage dictionary.
+
+    Exceptions:
+        ValueError: If the change has unknown keys.
+    """
+    unknown = set(change) - set(['set', 'add', 'remove', 'ver'])
+
+    if unknown:
+        raise ValueError("Invalid linkage change. Unknown keys: %s" %
+                         ", ".join(sorted(unknown)))
+
+    new = dict((relation, list(targets)) for (relation, targets) in linkage.items())
+
+    for (relation, targets) in change.get('set', {}).items():
+        new[relation] = list(targets)
+
+    for (relation, targets) in change.get('add', {}).items():
+        current = new.setdefault(relation, [])
+        current.extend([target for target in targets if target not in current])
+
+    for (relation, targets) in change.get('remove', {}).items():
+        if relation in new:
+            new[relation] = [target for target in new[relation] if target not in targets]
+
+    return dict((relation, targets) for (relation, targets) in new.items() if targets)
+
+def _relink(args):
+    (node_id, doc, change) = args
+
+    if doc is None:
+        return {'node': node_id, 'doc': None, 'status': 'failed',
+                'error': "Unable to retrieve the node."}
+
+    if change.get('ver') is not None and change['ver'] != doc.get('ver'):
+        return {'node': node_id, 'doc': doc, 'status': 'conflict',
+                'error': "The node is at version %s, not %s." % (doc.get('ver'), change['ver'])}
+
+    linkage = link_changes(doc.get('linkage', {}), change)
+
+    if linkage == doc.get('linkage', {}):
+        return {'node': node_id, 'doc': doc, 'status': 'unchanged', 'error': None}
+
+    edited = dict(doc, linkage=linkage)
+    osdf = iHMPSession.get_session().get_osdf()
+
+    try:
+        osdf.edit_node(edited)
+    except Exception as edit_exception:
+        # The edit is refused if the node changed since it was read
+        try:
+            current = osdf.get_node(node_id)
+        except Exception:
+            current = None
+
+        if current is not None and current.get('ver') != doc.get('ver'):
+            return {'node': node_id, 'doc': current, 'status': 'conflict',
+                    'error': "The node was changed from version %s to %s after it was read." %
+                             (doc.get('ver'), current.get('ver'))}
+
+        return {'node': node_id, 'doc': doc, 'status': 'failed', 'error': str(edit_exception)}
+
+    edited['ver'] = doc.get('ver', 1) + 1
+
+    return {'node': node_id, 'doc': edited, 'status': 'relinked', 'error': None}
+
+def relink(changes, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS):
+    """
+    Changes the linkage of many nodes. The documents are retrieved a batch
+    at a time, edited in memory and written back concurrently. Each edit is
+    made to the version of the node that was read; if the node was changed
+    in the meantime, or is not at the version the change asks for, it is
+    reported as a conflict and left alone.
+
+        relink({
+            sample_id: {'set': {'collected_during': [visit_id]}},
+            matrix_id: {'add': {'computed_from': [seq_set_id]}, 'ver': 3}
+        })
+
+    Args:
+        changes (dict): Node ID to the change of its linkage, as described
+                        in link_changes().
+        batch_size (int): The maximum number of nodes retrieved and edited
+                          at a time.
+        workers (int): The maximum number of concurrent requests.
+
+    Returns:
+        A BulkResult with the status 'relinked', 'unchanged', 'conflict' or
+        'failed' for each node. The node is always the node ID; the 'doc'
+        is the document as written, or as found on the server for a
+        conflict, or None for a node that could not be retrieved. Each
+        batch is counted as a level.
+
+    Exceptions:
+        ValueError: If batch_size is invalid or a change has unknown keys.
+    """
+    module_logger.debug("In relink.")
+
+    if batch_size < 1:
+        raise ValueError("Invalid batch_size. Must be a positive integer.")
+
+    # Reject malformed changes before anything is written
+    for change in changes.values():
+        link_changes({}, change)
+
+    node_ids = sorted(changes)
+    result = BulkResult()
+    start = time.time()
+
+    pool = ThreadPool(max(1, workers))
+
+    try:
+        for offset in range(0, len(node_ids), batch_size):
+            batch = node_ids[offset:offset + batch_size]
+            docs = fetch_docs(batch, workers=workers)
+
+            result.levels.append(len(batch))
+            result.results.extend(pool.map(
+                _relink, [(node_id, docs.get(node_id), changes[node_id])
+                          for node_id in batch]))
+    finally:
+        pool.close()
+        pool.join()
+
+    result.seconds = time.time() - start
+
+    module_logger.info("relink: %s", result)
+
+    return result
@@ -0,0 +1,318 @@
+"""
+A materialized ancestor closure of the node graph, for provenance lookups.
+
+Questions such as "which subject, visit and study did this seq set come
+from?" normally walk the linkage relations one get_node() call at a time.
+A ClosureIndex instead records, for every node, the full set of its
+ancestors (with their distance) and, for every ancestor, its descendants
+grouped by node type. Both questions then become dictionary lookups.
+
+The index only needs the ID, node type and linkage of each document. It
+can be built from documents in hand, from a dump file or from a scan of
+the namespace, and kept current afterwards by attaching it to the session,
+which updates it whenever a node is saved or deleted. The bulk operations
+of the session save and delete from several threads at once, so every
+change and lookup holds the index's lock.
+"""
+
+import json
+import logging
+import threading
+
+from cutlass.Base import Base
+from cutlass.iHMPSession import iHMPSession
+
+# pylint: disable=C0111, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+class ClosureIndex(object):
+    """
+    The ancestors and descendants of every indexed node.
+
+    The index can be attached to a session with attach(), after which the
+    nodes saved or deleted through the session are reflected in it.
+    """
+
+    def __init__(self, docs=None):
+        """
+        Args:
+            docs (iterable): Optional OSDF documents to index.
+        """
+        self._types = {}
+        # node ID -> IDs of the nodes it links to
+        self._parents = {}
+        # node ID -> IDs of the nodes linking to it, including the IDs of
+        # parents not indexed yet
+        self._children = {}
+        # node ID -> {ancestor ID: distance}
+        self._ancestors = {}
+        # node ID -> {node type: set of descendant IDs}
+        self._descendants = {}
+        self._lock = threading.RLock()
+
+        if docs is not None:
+            self.update(docs)
+
+    @staticmethod
+    def from_dump(path):
+        """
+        Builds an index from a file with one JSON document per line, such
+        as a namespace dump.
+        """
+        index = ClosureIndex()
+
+        with open(path) as dump:
+            index.update(json.loads(line) for line in dump if line.strip())
+
+        return index
+
+    @staticmethod
+    def from_namespace(namespace=Base.namespace, node_types=None):
+        """
+        Builds an index by scanning the namespace for every node of the
+        given types (by default, every type known to cutlass).
+        """
+        # local import to avoid cyclic imports
+        from cutlass.dependency import node_loaders, oql_docs
+        from cutlass import oql
+
+        index = ClosureIndex()
+
+        for node_type in sorted(node_types or node_loaders.keys()):
+            module_logger.debug("Indexing the %s nodes.", node_type)
+
+            query = oql.node_type(node_type).to_oql()
+            index.update(oql_docs(query, namespace, stream=True))
+
+        return index
+
+    def __len__(self):
+        with self._lock:
+            return len(self._types)
+
+    def __contains__(self, node_id):
+        with self._lock:
+            return node_id in self._types
+
+    def node_type(self, node_id):
+        """ Returns the node type of an indexed node, or None. """
+        with self._lock:
+            return self._types.get(node_id)
+
+    def update(self, docs):
+        """
+        Adds or updates many documents. The closure is recomputed once, at
+        the end, for the affected nodes.
+        """
+        with self._lock:
+            dirty = set()
+
+            for doc in docs:
+                dirty.update(self._set_links(doc))
+
+            self._recompute(dirty)
+
+    def add(self, doc):
+        """ Adds or updates a single document. """
+        self.update([doc])
+
+    def remove(self, node_id):
+        """
+        Removes a node. The nodes below it lose the ancestors that were only
+        reachable through it.
+        """
+        with self._lock:
+            if node_id not in self._types:
+                return
+
+            self._unlink(node_id)
+            self._set_ancestors(node_id, {})
+
+            del self._types[node_id]
+            del self._parents[node_id]
+
+            dirty = set()
+            for child_id in self._children.get(node_id, ()):
+                dirty.update(self._subtree(child_id))
+
+            self._descendants.pop(node_id, None)
+            self._ancestors.pop(node_id, None)
+
+            if not self._children.get(node_id):
+                self._children.pop(node_id, None)
+
+            self._recompute(dirty)
+
+    # Listener interface, for iHMPSession.add_listener()
+    def node_saved(self, doc):
+        self.add(doc)
+
+    def node_deleted(self, node_id):
+        self.remove(node_id)
+
+    def attach(self, session=None):
+        """ Keeps the index current with the saves and deletes of a session. """
+        (session or iHMPSession.get_session()).add_listener(self)
+
+    def detach(self, session=None):
+        """ Stops following a session. """
+        (session or iHMPSession.get_session()).remove_listener(self)
+
+    def ancestors(self, node_id, node_type=None):
+        """
+        Returns the IDs of the ancestors of a node, nearest first, optionally
+        only those of one node type.
+        """
+        with self._lock:
+            distances = self._ancestors.get(node_id, {})
+
+            return [ancestor_id for (_distance, ancestor_id) in
+                    sorted((distance, ancestor_id)
+                           for (ancestor_id, distance) in distances.items())
+                    if node_type is None or self._types.get(ancestor_id) == node_type]
+
+    def ancestor(self, node_id, node_type):
+        """
+        Returns the ID of the nearest ancestor of the given type, such as the
+        subject of a sample, or None.
+        """
+        ancestors = self.ancestors(node_id, node_type)
+
+        return ancestors[0] if ancestors else None
+
+    def provenance(self, node_id):
+        """
+        Returns a dictionary of node type to the IDs of the ancestors of
+        that type, nearest first, e.g. {'visit': [...], 'subject': [...]}.
+        """
+        result = {}
+
+        with self._lock:
+            for ancestor_id in self.ancestors(node_id):
+                node_type = self._types.get(ancestor_id)
+                if node_type is not None:
+                    result.setdefault(node_type, []).append(ancestor_id)
+
+        return result
+
+    def descendants(self, node_id, node_type=None):
+        """
+        Returns the sorted IDs of the descendants of a node, optionally only
+        those of one node type.
+        """
+        with self._lock:
+            by_type = self._descendants.get(node_id, {})
+
+            if node_type is not None:
+                return sorted(by_type.get(node_type, ()))
+
+            found = set()
+            for ids in by_type.values():
+                found.update(ids)
+
+        return sorted(found)
+
+    def _set_links(self, doc):
+        # Records the parents of a node and returns the IDs whose closure
+        # is affected by the change.
+        # local import to avoid cyclic imports
+        from cutlass.dependency import link_ids
+
+        node_id = doc['id']
+        parents = link_ids(doc.get('linkage', {}))
+
+        known = node_id in self._types
+        changed = not known or self._parents[node_id] != parents or \
+                  self._types[node_id] != doc['node_type']
+
+        if not changed:
+            return set()
+
+        if known:
+            self._unlink(node_id)
+            self._set_ancestors(node_id, {})
+
+        self._types[node_id] = doc['node_type']
+        self._parents[node_id] = parents
+
+        for parent_id in parents:
+            self._children.setdefault(parent_id, set()).add(node_id)
+
+        return self._subtree(node_id)
+
+    def _unlink(self, node_id):
+        for parent_id in self._parents[node_id]:
+            children = self._children.get(parent_id)
+            if children is not None:
+                children.discard(node_id)
+
+    def _subtree(self, node_id):
+        found = set()
+        pending = [node_id]
+
+        while pending:
+            current = pending.pop()
+            if current not in found:
+                found.add(current)
+                pending.extend(self._children.get(current, ()))
+
+        return found
+
+    def _set_ancestors(self, node_id, distances):
+        node_type = self._types[node_id]
+
+        for ancestor_id in self._ancestors.get(node_id, {}):
+            by_type = self._descendants.get(ancestor_id, {})
+            ids = by_type.get(node_type)
+
+            if ids is not None:
+                ids.discard(node_id)
+                if not ids:
+                    del by_type[node_type]
+
+        self._ancestors[node_id] = distances
+
+        for ancestor_id in distances:
+            self._descendants.setdefault(ancestor_id, {}) \
+                             .setdefault(node_type, set()).add(node_id)
+
+    def _recompute(self, dirty):
+        # Parents are computed before their children; nodes outside the
+        # dirty set already have a current closure.
+        done = set()
+
+        def compute(node_id, path):
+            if node_id in done or node_id not in self._types:
+                return
+
+            path.add(node_id)
+            distances = {}
+
+            for parent_id in self._parents[node_id]:
+                if parent_id in dirty and parent_id not in path:
+                    compute(parent_id, path)
+
+                if parent_id not in self._types:
+                    continue
+
+                if parent_id in path:
+                    module_logger.warning("Linkage cycle through %s.", parent_id)
+                    continue
+
+                distances[parent_id] = 1
+
+                for (ancestor_id, distance) in self._ancestors.get(parent_id, {}).items():
+                    if ancestor_id != node_id and \
+                       distance + 1 < distances.get(ancestor_id, distance + 2):
+                        distances[ancestor_id] = distance + 1
+
+            path.discard(node_id)
+            self._set_ancestors(node_id, distances)
+            done.add(node_id)
+
+        for node_id in sorted(dirty):
+            compute(node_id, set())
@@ -0,0 +1,521 @@
+"""
+Latency statistics for the requests a session makes, and estimates of the
+requests, transfers and time a bulk operation will need.
+
+After iHMPSession.start_stats(), every OSDF request made through
+iHMPSession.get_osdf(), and every Aspera upload, is timed and recorded in
+the session's RequestStats (session.stats). The dry runs of save_all(),
+delete_subtree(), delete_where(), export_subtree() and traverse() work out
+what the operation would do without writing anything, and describe it as
+a CostEstimate: the round trips for each node type, the files and bytes to
+upload, and the time it should take at the latencies recorded so far.
+Until a kind of request has been timed, an assumed latency is used
+instead.
+
+Working out the plan may itself need queries: a subtree has to be walked
+to find the nodes to delete, export or traverse, so those dry runs are not
+free. The walk retrieves every document of the subtree, with batched
+queries; for an export, that is most of the work of the export itself.
+The queries are part of the real operation too, and are included in the
+estimate.
+"""
+
+import json
+import logging
+import os
+import threading
+
+# pylint: disable=W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# The OSDF client methods that are timed, each one a round trip.
+REQUESTS = ('delete_node', 'edit_node', 'get_node', 'get_node_by_version',
+            'insert_node', 'oql_query', 'validate_node')
+
+# Latencies assumed, in seconds, for the requests not yet timed.
+DEFAULT_LATENCY = {
+    'delete_node': 0.3,
+    'edit_node': 0.4,
+    'get_node': 0.2,
+    'get_node_by_version': 0.2,
+    'insert_node': 0.4,
+    'oql_query': 0.5,
+    'validate_node': 0.2
+}
+
+# Aspera throughput assumed, in bytes per second, until an upload is timed.
+DEFAULT_TRANSFER_RATE = 10 * 1024 ** 2
+
+class RequestStats(object):
+    """
+    The number, duration and failures of the requests made, by kind of
+    request (the OSDF client method, or 'upload' for Aspera uploads).
+    Safe to use from concurrent threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # operation -> [count, seconds, bytes, failures]
+        self._totals = {}
+
+    def record(self, operation, seconds, size=0, failed=False):
+        """
+        Records a completed request.
+
+        Args:
+            operation (str): The kind of request, such as 'get_node'.
+            seconds (float): How long it took.
+            size (int): The number of bytes transferred, for uploads.
+            failed (bool): Whether the request failed.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            totals = self._totals.setdefault(operation, [0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += size
+            totals[3] += 1 if failed else 0
+
+    def count(self, operation):
+        """ Returns the number of requests of a kind recorded. """
+        return self._totals.get(operation, [0])[0]
+
+    def mean(self, operation, default=None):
+        """
+        Returns the mean duration, in seconds, of a kind of request, or the
+        default if none was recorded.
+        """
+        with self._lock:
+            totals = self._totals.get(operation)
+
+            if not totals:
+                return default
+
+            return totals[1] / totals[0]
+
+    def rate(self, operation='upload', default=None):
+        """
+        Returns the bytes transferred per second by a kind of request, or
+        the default if nothing was transferred.
+        """
+        with self._lock:
+            totals = self._totals.get(operation)
+
+            if not totals or totals[2] == 0 or totals[1] <= 0:
+                return default
+
+            return totals[2] / totals[1]
+
+    def summary(self):
+        """
+        Returns a dictionary of each kind of request recorded to a
+        dictionary of its 'count', total 'seconds', 'mean', 'bytes' and
+        'failures'.
+        """
+        with self._lock:
+            return dict((operation, {'count': count, 'seconds': seconds,
+                                     'mean': seconds / count, 'bytes': size,
+                                     'failures': failures})
+                        for (operation, (count, seconds, size, failures))
+                        in self._totals.items())
+
+    def reset(self):
+        """ Forgets every request recorded. """
+        with self._lock:
+            self._totals = {}
+
+    def __str__(self):
+        lines = ["{}: {} requests, mean {:.3f}s, {} failed".format(
+            operation, totals['count'], totals['mean'], totals['failures'])
+                 for (operation, totals) in sorted(self.summary().items())]
+
+        return "\n".join(lines) or "No requests recorded."
+
+class CostEstimate(object):
+    """
+    The requests, transfers and time an operation is expected to need.
+
+    The operation is described as a series of steps, such as the levels of
+    a bulk save. The requests of a step are spread over the workers, up to
+    the number of independent units of work (nodes or queries) in the step;
+    the steps themselves run one after the other.
+
+    Attributes:
+        operation (str): What is estimated: 'save', 'delete', 'traverse' or
+                         'export'.
+        workers (int): The number of concurrent workers assumed.
+        nodes (int): The number of nodes the operation would handle.
+        requests (dict): Node type to a dictionary of request to count.
+        transfers (int): The number of files to upload.
+        bytes (int): The total size of the files to upload.
+        missing (list): The local files to upload that were not found.
+        output_bytes (int): For an export, the size of the file written.
+    """
+
+    def __init__(self, operation, workers=1):
+        self.operation = operation
+        self.workers = workers
+        self.nodes = 0
+        self.requests = {}
+        self.transfers = 0
+        self.bytes = 0
+        self.missing = []
+        self.output_bytes = 0
+        # One [requests, width] pair per step
+        self._steps = []
+
+    def step(self, width):
+        """
+        Starts a new step, in which up to 'width' units of work can be done
+        concurrently.
+        """
+        self._steps.append([{}, max(1, width)])
+
+    def add(self, node_type, request, count=1):
+        """ Adds requests of a kind, made for a node type, to the current step. """
+        if not self._steps:
+            self.step(1)
+
+        by_request = self.requests.setdefault(node_type, {})
+        by_request[request] = by_request.get(request, 0) + count
+
+        step_requests = self._steps[-1][0]
+        step_requests[request] = step_requests.get(request, 0) + count
+
+    def add_file(self, path):
+        """ Adds a local file to upload. """
+        self.transfers += 1
+
+        if os.path.isfile(path):
+            self.bytes += os.path.getsize(path)
+        else:
+            self.missing.append(path)
+
+    @property
+    def round_trips(self):
+        """ int: The total number of OSDF requests. """
+        return sum([sum(by_request.values()) for by_request in self.requests.values()])
+
+    def round_trips_by_type(self):
+        """ Returns a dictionary of node type to the number of requests. """
+        return dict((node_type, sum(by_request.values()))
+                    for (node_type, by_request) in self.requests.items())
+
+    def seconds(self, stats=None):
+        """
+        Returns the estimated duration of the operation, in seconds.
+
+        Args:
+            stats (RequestStats): The latencies to use. Defaults to those
+                                  recorded by the current session.
+
+        Returns:
+            The estimated number of seconds.
+        """
+        stats = _session_stats(stats)
+
+        total = 0.0
+
+        for (step_requests, width) in self._steps:
+            busy = sum([count * _latency(stats, request)
+                        for (request, count) in step_requests.items()])
+            total += busy / min(max(1, self.workers), width)
+
+        # Concurrent uploads share the bandwidth
+        rate = stats.rate('upload', DEFAULT_TRANSFER_RATE) if stats else DEFAULT_TRANSFER_RATE
+        total += float(self.bytes) / rate
+
+        return total
+
+    def explain(self, stats=None):
+        """
+        Returns a human readable description of the estimate.
+
+        Args:
+            stats (RequestStats): The latencies to use. Defaults to those
+                                  recorded by the current session.
+        """
+        stats = _session_stats(stats)
+
+        lines = ["Estimate for {} of {} nodes, {} workers:".format(
+            self.operation, self.nodes, self.workers)]
+
+        for (node_type, by_request) in sorted(self.requests.items()):
+            counts = ", ".join(["{} {}".format(count, request)
+                                for (request, count) in sorted(by_request.items())])
+            lines.append("{}: {} round trips ({})".format(
+                node_type, sum(by_request.values()), counts))
+
+        if self.transfers:
+            lines.append("uploads: {} files, {} bytes ({} missing)".format(
+                self.transfers, self.bytes, len(self.missing)))
+
+        if self.output_bytes:
+            lines.append("output: {} bytes".format(self.output_bytes))
+
+        assumed = sorted(set([request for by_request in self.requests.values()
+                              for request in by_request
+                              if stats is None or stats.count(request) == 0]))
+
+        lines.append("total: {} round trips, about {:.1f}s{}".format(
+            self.round_trips, self.seconds(stats),
+            " (assumed latency for {})".format(", ".join(assumed)) if assumed else ""))
+
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.explain()
+
+def _session_stats(stats):
+    if stats is not None:
+        return stats
+
+    # local import to avoid cyclic imports
+    from cutlass.iHMPSession import iHMPSession
+
+    if iHMPSession._single is None:
+        return None
+
+    return iHMPSession._single.stats
+
+def _latency(stats, request):
+    default = DEFAULT_LATENCY.get(request, DEFAULT_LATENCY['get_node'])
+
+    if stats is None:
+        return default
+
+    return stats.mean(request, default)
+
+def _upload_files(node):
+    # The local files a node uploads when it is saved
+    if getattr(node, '_private_files', False):
+        return []
+
+    files = []
+
+    for name in sorted(dir(type(node))):
+        if name.startswith("local_") and name.endswith("file") and \
+           isinstance(getattr(type(node), name), property):
+            path = getattr(node, name)
+
+            if path:
+                files.append(path)
+
+    return files
+
+def estimate_save(levels, workers, journal=None, keys=None):
+    """
+    Estimates a bulk save: the nodes are validated, then uploaded (for the
+    nodes with files) and inserted or, if they already have an ID, edited
+    and retrieved again for their new version.
+
+    Args:
+        levels (list): The levels of nodes, parents first, as returned by
+                       bulk.save_levels().
+        workers (int): The maximum number of concurrent saves.
+        journal (Journal): If provided, the nodes it records as saved are
+                           not counted.
+        keys (dict): id(node) to journal key, required with a journal.
+
+    Returns:
+        A CostEstimate.
+    """
+    # local import to avoid cyclic imports
+    from cutlass.dependency import node_type_of
+
+    estimate = CostEstimate('save', workers)
+
+    for level in levels:
+        if journal is not None:
+            level = [node for node in level if journal.lookup(keys[id(node)]) is None]
+
+        estimate.step(len(level))
+
+        for node in level:
+            node_type = node_type_of(node)
+
+            estimate.nodes += 1
+            estimate.add(node_type, 'validate_node')
+
+            if node.id is None:
+                estimate.add(node_type, 'insert_node')
+            else:
+                estimate.add(node_type, 'edit_node')
+                estimate.add(node_type, 'get_node')
+
+            for path in _upload_files(node):
+                estimate.add_file(path)
+
+    return estimate
+
+def add_hops(estimate, hops):
+    """
+    Adds the queries of a walk down a subtree, as returned by
+    planner.iter_levels(), to an estimate, one step per level. The queries
+    are counted for the node types of the parents they expanded.
+    """
+    for hop in hops:
+        estimate.step(hop['queries'])
+        estimate.add("/".join(hop['parent_types']), 'oql_query', hop['round_trips'])
+
+def estimate_delete(levels, workers=1, root=None, hops=(), pages=0):
+    """
+    Estimates a bulk delete, including the requests that found the nodes.
+
+    Args:
+        levels (list): The levels of documents to delete, leaves first, as
+                       returned by bulk.delete_levels().
+        workers (int): The maximum number of concurrent deletes.
+        root (dict): The document of the root of a subtree, if it had to
+                     be retrieved.
+        hops (list): The hops of the walk down the subtree.
+        pages (int): The result pages of the query that found the nodes.
+
+    Returns:
+        A CostEstimate.
+    """
+    estimate = CostEstimate('delete', workers)
+
+    if root is not None:
+        estimate.step(1)
+        estimate.add(root['node_type'], 'get_node')
+
+    add_hops(estimate, hops)
+
+    if pages:
+        estimate.step(1)
+        estimate.add("/".join(sorted(set([doc['node_type'] for level in levels
+                                          for doc in level]))) or "query",
+                     'oql_query', pages)
+
+    for level in levels:
+        estimate.step(len(level))
+
+        for doc in level:
+            estimate.nodes += 1
+            estimate.add(doc['node_type'], 'delete_node')
+
+    return estimate
+
+def estimate_export(root, include_root=True, exclude_types=None, chunk_size=None,
+                    workers=None):
+    """
+    Estimates snapshot.export_subtree(), walking the subtree but writing
+    nothing. The walk makes the same queries, and retrieves the same
+    documents, as the export, so it takes nearly as long; only the file is
+    not written.
+
+    Args:
+        root (Base): The node at the top of the subtree. It must have an ID.
+        include_root (bool): Whether the root node would be exported.
+        exclude_types (list): Node types not to export or descend into.
+        chunk_size (int): The maximum number of parent IDs per query.
+        workers (int): The maximum number of queries in flight at once.
+
+    Returns:
+        A CostEstimate, with the size of the export as the output_bytes.
+
+    Exceptions:
+        ValueError: If the root node has no ID.
+    """
+    # local import to avoid cyclic imports
+    from cutlass.dependency import node_type_of, DEFAULT_WORKERS
+    from cutlass.iHMPSession import iHMPSession
+    from cutlass.planner import iter_levels, DEFAULT_CHUNK_SIZE
+
+    if root.id is None:
+        raise ValueError("Cannot export a node without an ID.")
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    workers = workers or DEFAULT_WORKERS
+
+    estimate = CostEstimate('export', workers)
+
+    if include_root:
+        doc = iHMPSession.get_session().get_osdf().get_node(root.id)
+
+        estimate.step(1)
+        estimate.add(node_type_of(root), 'get_node')
+        estimate.nodes += 1
+        estimate.output_bytes += len(json.dumps(doc, sort_keys=True)) + 1
+
+    for (hop, docs) in iter_levels(root, exclude_types=exclude_types,
+                                   chunk_size=chunk_size, workers=workers):
+        add_hops(estimate, [hop])
+
+        estimate.nodes += len(docs)
+        estimate.output_bytes += sum([len(json.dumps(doc, sort_keys=True)) + 1
+                                      for doc in docs])
+
+    return estimate
+
+def estimate_traversal(root, max_depth=None, include_types=None, exclude_types=None,
+                       workers=None):
+    """
+    Estimates a traversal with traverse(), which queries the children
+    of each node it expands, one node at a time. The subtree is walked
+    level by level, with batched queries, to count the nodes that would be
+    expanded.
+
+    Args:
+        root (Base): The node to start from. It must have an ID.
+        max_depth (int): How many levels below the root to descend. None
+                         for no limit.
+        include_types (list): Only count the branches leading to these
+                              node types.
+        exclude_types (list): Node types not to descend into.
+        workers (int): The maximum number of queries in flight at once
+                       while walking the subtree.
+
+    Returns:
+        A CostEstimate, with one request for each node expanded. Nodes
+        with more children than fit in a page of results take more.
+
+    Exceptions:
+        ValueError: If the root node has no ID or max_depth is invalid.
+    """
+    # local import to avoid cyclic imports
+    from cutlass.dependency import child_relations, node_type_of, DEFAULT_WORKERS
+    from cutlass.planner import iter_levels
+
+    if root.id is None:
+        raise ValueError("Cannot traverse from a node without an ID.")
+
+    if max_depth is not None and max_depth < 0:
+        raise ValueError("Invalid max_depth. Must be a non-negative integer.")
+
+    # The traversal itself is sequential
+    estimate = CostEstimate('traverse', 1)
+
+    def expand(node_type, depth):
+        if (max_depth is None or depth < max_depth) and \
+           child_relations(node_type, include_types, exclude_types):
+            estimate.add(node_type, 'oql_query')
+
+    estimate.step(1)
+    expand(node_type_of(root), 0)
+
+    if max_depth == 0:
+        return estimate
+
+    for (hop, docs) in iter_levels(root, include_types=include_types,
+                                   exclude_types=exclude_types,
+                                   workers=workers or DEFAULT_WORKERS):
+        estimate.step(1)
+
+        for doc in docs:
+            if include_types is None or doc['node_type'] in include_types:
+                estimate.nodes += 1
+
+            expand(doc['node_type'], hop['hop'])
+
+        if max_depth is not None and hop['hop'] >= max_depth:
+            break
+
+    return estimate
@@ -1,26 +1,58 @@
 """
-Utility module for retrieving a node's children.
+Utility module for retrieving a node's children and for navigating the
+linkage relationships between the iHMP node types.
 """
 
 import inspect
+import logging
+from collections import deque
+from itertools import count
+from multiprocessing.pool import ThreadPool
 
 # pylint: disable=C0302, W0703, C1801
 
+from .AbundanceMatrix import AbundanceMatrix
 from .Annotation import Annotation
+from .ClusteredSeqSet import ClusteredSeqSet
+from .Cytokine import Cytokine
+from .HostAssayPrep import HostAssayPrep
+from .HostEpigeneticsRawSeqSet import HostEpigeneticsRawSeqSet
+from .HostSeqPrep import HostSeqPrep
+from .HostTranscriptomicsRawSeqSet import HostTranscriptomicsRawSeqSet
+from .HostVariantCall import HostVariantCall
+from .HostWgsRawSeqSet import HostWgsRawSeqSet
+from .Lipidome import Lipidome
+from .Metabolome import Metabolome
+from .MicrobTranscriptomicsRawSeqSet import MicrobTranscriptomicsRawSeqSet
+from .MicrobiomeAssayPrep import MicrobiomeAssayPrep
 from .Project import Project
+from .Proteome import Proteome
+from .ProteomeNonPride import ProteomeNonPride
+from .Sample import Sample
+from .SampleAttribute import SampleAttribute
+from .Serology import Serology
+from .SixteenSDnaPrep import SixteenSDnaPrep
+from .SixteenSRawSeqSet import SixteenSRawSeqSet
+from .SixteenSTrimmedSeqSet import SixteenSTrimmedSeqSet
 from .Study import Study
 from .Subject import Subject
+from .SubjectAttribute import SubjectAttribute
+from .ViralSeqSet import ViralSeqSet
 from .Visit import Visit
-from .Sample import Sample
+from .VisitAttribute import VisitAttribute
 from .WgsAssembledSeqSet import WgsAssembledSeqSet
 from .WgsDnaPrep import WgsDnaPrep
 from .WgsRawSeqSet import WgsRawSeqSet
-from .SixteenSDnaPrep import SixteenSDnaPrep
-from .SixteenSRawSeqSet import SixteenSRawSeqSet
-from .SixteenSTrimmedSeqSet import SixteenSTrimmedSeqSet
-from .MicrobiomeAssayPrep import MicrobiomeAssayPrep
-from .HostAssayPrep import HostAssayPrep
-from .HostSeqPrep import HostSeqPrep
+from .Base import Base
+from .iHMPSession import iHMPSession
+from . import oql
+from .records import LazyNode, NodeRecord
+from .streaming import stream_oql
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
 
 # currently used in Base.children()
 # __name__ attribute used to ensure that if the class or method name
@@ -43,8 +75,664 @@ dependency_methods = {
                WgsDnaPrep.__name__ : WgsDnaPrep.child_seq_sets.__name__,
              WgsRawSeqSet.__name__ : WgsRawSeqSet.viral_seq_sets.__name__
 }
+
+# The factory used to turn an OSDF document of each node type into an object.
+node_loaders = {
+                          "16s_dna_prep" : SixteenSDnaPrep.load_sixteenSDnaPrep,
+                       "16s_raw_seq_set" : SixteenSRawSeqSet.load_16s_raw_seq_set,
+                   "16s_trimmed_seq_set" : SixteenSTrimmedSeqSet.load_sixteenSTrimmedSeqSet,
+                      "abundance_matrix" : AbundanceMatrix.load_abundance_matrix,
+                            "annotation" : Annotation.load_annotation,
+                     "clustered_seq_set" : ClusteredSeqSet.load_clustered_seq_set,
+                              "cytokine" : Cytokine.load_cytokine,
+                       "host_assay_prep" : HostAssayPrep.load_host_assay_prep,
+          "host_epigenetics_raw_seq_set" : HostEpigeneticsRawSeqSet.load_host_epigenetics_raw_seq_set,
+                         "host_seq_prep" : HostSeqPrep.load_host_seq_prep,
+      "host_transcriptomics_raw_seq_set" : HostTranscriptomicsRawSeqSet.load_host_transcriptomics_raw_seq_set,
+                     "host_variant_call" : HostVariantCall.load_host_variant_call,
+                  "host_wgs_raw_seq_set" : HostWgsRawSeqSet.load_hostWgsRawSeqSet,
+                              "lipidome" : Lipidome.load_lipidome,
+                            "metabolome" : Metabolome.load_metabolome,
+    "microb_transcriptomics_raw_seq_set" : MicrobTranscriptomicsRawSeqSet.load_microb_transcriptomics_raw_seq_set,
+                     "microb_assay_prep" : MicrobiomeAssayPrep.load_microassayprep,
+                               "project" : Project.load_project,
+                              "proteome" : Proteome.load_proteome,
+                     "proteome_nonpride" : ProteomeNonPride.load_proteome_nonpride,
+                                "sample" : Sample.load_sample,
+                           "sample_attr" : SampleAttribute.load_sample_attr,
+                              "serology" : Serology.load_serology,
+                                 "study" : Study.load_study,
+                               "subject" : Subject.load_subject,
+                          "subject_attr" : SubjectAttribute.load_subject_attr,
+                         "viral_seq_set" : ViralSeqSet.load_viral_seq_set,
+                                 "visit" : Visit.load_visit,
+                            "visit_attr" : VisitAttribute.load_visit_attr,
+                 "wgs_assembled_seq_set" : WgsAssembledSeqSet.load_wgsAssembledSeqSet,
+                          "wgs_dna_prep" : WgsDnaPrep.load_wgsDnaPrep,
+                       "wgs_raw_seq_set" : WgsRawSeqSet.load_wgsRawSeqSet
+}
+
+# The linkage relations each node type uses to point at its parents, and
+# the node types found at the other end of each relation.
+node_linkages = {
+                          "16s_dna_prep" : {"prepared_from": ["sample"]},
+                       "16s_raw_seq_set" : {"sequenced_from": ["16s_dna_prep"]},
+                   "16s_trimmed_seq_set" : {"computed_from": ["16s_raw_seq_set"]},
+                      "abundance_matrix" : {"computed_from": ["16s_trimmed_seq_set",
+                                                              "wgs_assembled_seq_set"]},
+                            "annotation" : {"computed_from": ["wgs_assembled_seq_set"]},
+                     "clustered_seq_set" : {"computed_from": ["annotation"]},
+                              "cytokine" : {"derived_from": ["host_assay_prep",
+                                                             "microb_assay_prep"]},
+                       "host_assay_prep" : {"prepared_from": ["sample"]},
+          "host_epigenetics_raw_seq_set" : {"sequenced_from": ["host_seq_prep"]},
+                         "host_seq_prep" : {"prepared_from": ["sample"]},
+      "host_transcriptomics_raw_seq_set" : {"sequenced_from": ["host_seq_prep"]},
+                     "host_variant_call" : {"computed_from": ["host_wgs_raw_seq_set"]},
+                  "host_wgs_raw_seq_set" : {"sequenced_from": ["host_seq_prep"]},
+                              "lipidome" : {"derived_from": ["host_assay_prep",
+                                                             "microb_assay_prep"]},
+                            "metabolome" : {"derived_from": ["host_assay_prep",
+                                                             "microb_assay_prep"]},
+    "microb_transcriptomics_raw_seq_set" : {"sequenced_from": ["wgs_dna_prep"]},
+                     "microb_assay_prep" : {"prepared_from": ["sample"]},
+                               "project" : {},
+                              "proteome" : {"derived_from": ["host_assay_prep",
+                                                             "microb_assay_prep"]},
+                     "proteome_nonpride" : {"derived_from": ["host_assay_prep",
+                                                             "microb_assay_prep"]},
+                                "sample" : {"collected_during": ["visit"]},
+                           "sample_attr" : {"associated_with": ["sample"]},
+                              "serology" : {"derived_from": ["host_assay_prep"]},
+                                 "study" : {"part_of": ["project"],
+                                            "subset_of": ["study"]},
+                               "subject" : {"participates_in": ["study"]},
+                          "subject_attr" : {"associated_with": ["subject"]},
+                         "viral_seq_set" : {"computed_from": ["wgs_raw_seq_set"],
+                                            "sequenced_from": ["wgs_dna_prep"]},
+                                 "visit" : {"by": ["subject"]},
+                            "visit_attr" : {"associated_with": ["visit"]},
+                 "wgs_assembled_seq_set" : {"computed_from": ["wgs_raw_seq_set"]},
+                          "wgs_dna_prep" : {"prepared_from": ["sample"]},
+                       "wgs_raw_seq_set" : {"sequenced_from": ["wgs_dna_prep"]}
+}
 # pylint: enable=C0330
 
+# How many documents to retrieve from OSDF at the same time by default.
+DEFAULT_WORKERS = 8
+
+# The node type modelled by each class, keyed by class name.
+class_node_types = dict(
+    (loader.__module__.split('.')[-1], node_type)
+    for (node_type, loader) in node_loaders.items()
+)
+
+# The class modelling each node type.
+node_classes = dict(
+    (node_type, globals()[class_name])
+    for (class_name, node_type) in class_node_types.items()
+)
+
+def _invert_linkages():
+    children = {}
+
+    for (child_type, relations) in node_linkages.items():
+        for (relation, parent_types) in relations.items():
+            for parent_type in parent_types:
+                children.setdefault(parent_type, []).append((relation, child_type))
+
+    for relations in children.values():
+        relations.sort()
+
+    return children
+
+# The (linkage relation, node type) pairs of the nodes that can point at
+# each node type. This is the inverse of node_linkages.
+child_linkages = _invert_linkages()
+
+def node_type_of(node):
+    """
+    Returns the OSDF node type of a cutlass object or class.
+
+    Args:
+        node (object): A cutlass node object or record, or one of the node
+                       classes.
+
+    Returns:
+        The node type string, for instance 'wgs_raw_seq_set'.
+
+    Exceptions:
+        ValueError: If the object is not one of the iHMP node types.
+    """
+    if isinstance(node, NodeRecord):
+        return node.node_type
+
+    cls = node if inspect.isclass(node) else node.__class__
+
+    if cls.__name__ not in class_node_types:
+        raise ValueError("%s is not an iHMP node type." % cls.__name__)
+
+    return class_node_types[cls.__name__]
+
+def descendant_types(node_type, exclude_types=None):
+    """
+    Returns the set of node types that can appear anywhere below a node of
+    the given type, without passing through any of the excluded types.
+    """
+    exclude_types = set(exclude_types or [])
+    found = set()
+    pending = [node_type]
+
+    while pending:
+        current = pending.pop()
+        for (_relation, child_type) in child_linkages.get(current, []):
+            if child_type in exclude_types or child_type in found:
+                continue
+            found.add(child_type)
+            pending.append(child_type)
+
+    return found
+
+def child_relations(node_type, include_types=None, exclude_types=None):
+    """
+    Works out which linkage relations need to be followed to find the
+    children of a node of the given type. Child types that are excluded,
+    or that can never lead to one of the included types, are pruned so
+    that they are never queried.
+
+    Args:
+        node_type (str): The node type of the parent.
+        include_types (list): Node types the caller is interested in. If
+                              None, every node type is of interest.
+        exclude_types (list): Node types to skip, along with everything
+                              below them.
+
+    Returns:
+        A dictionary of linkage relation to the sorted list of child node
+        types worth following through that relation.
+    """
+    exclude_types = set(exclude_types or [])
+    relations = {}
+
+    for (relation, child_type) in child_linkages.get(node_type, []):
+        if child_type in exclude_types:
+            continue
+
+        if include_types is not None and child_type not in include_types:
+            below = descendant_types(child_type, exclude_types)
+            if not below.intersection(include_types):
+                continue
+
+        relations.setdefault(relation, []).append(child_type)
+
+    return relations
+
+def typed_query(query=None, node_type=None):
+    """
+    Restricts an OQL query to a node type, in the same way as the search()
+    methods of the node classes, and returns it in canonical form.
+
+    Args:
+        query (str or oql.Query): The OQL criteria, or None to match the
+                                  whole node type.
+        node_type (str): The node type, or None to leave the query as is.
+
+    Returns:
+        The OQL query string.
+
+    Exceptions:
+        ValueError: If neither a query nor a node type is provided.
+    """
+    if node_type is None:
+        if query is None:
+            raise ValueError("A query is required to search across node types.")
+        return oql.canonical(query)
+
+    type_query = oql.node_type(node_type)
+
+    if query is None or oql.canonical(query) == type_query.to_oql():
+        return type_query.to_oql()
+
+    return oql.And(query, type_query).to_oql()
+
+def count_docs(query, namespace=Base.namespace):
+    """
+    Returns the number of documents matching an OQL query, as reported by
+    the first page of results.
+    """
+    res = iHMPSession.get_session().get_osdf().oql_query(namespace, query, page=1)
+
+    return res['result_count']
+
+def count_by_type(node_types, query=None, namespace=Base.namespace,
+                  workers=DEFAULT_WORKERS):
+    """
+    Counts the nodes matching a query for several node types, issuing the
+    count queries concurrently.
+
+    Args:
+        node_types (list): The node types to count.
+        query (str): Optional OQL criteria applied to every node type.
+        namespace (str): The OSDF namespace to query.
+        workers (int): The maximum number of concurrent queries.
+
+    Returns:
+        A dictionary of node type to the number of matching nodes.
+    """
+    module_logger.debug("In count_by_type.")
+
+    node_types = list(node_types)
+
+    if not node_types:
+        return {}
+
+    def _count(node_type):
+        return (node_type, count_docs(typed_query(query, node_type), namespace))
+
+    pool = ThreadPool(max(1, min(workers, len(node_types))))
+    try:
+        counts = pool.map(_count, node_types)
+    finally:
+        pool.close()
+        pool.join()
+
+    return dict(counts)
+
+def oql_docs(query, namespace=Base.namespace, stats=None, stream=False):
+    """
+    Generator over every document matching an OQL query, following the
+    result pages one at a time.
+
+    Args:
+        query (str): The OQL query to submit.
+        namespace (str): The OSDF namespace to query.
+        stats (dict): Optional dictionary in which the number of pages
+                      requested is accumulated under the 'pages' key.
+        stream (bool): Parse each page incrementally, yielding documents
+                       while the rest of the page is still being read,
+                       instead of parsing the whole page first.
+
+    Returns:
+        An iterator of the raw OSDF documents.
+    """
+    osdf = iHMPSession.get_session().get_osdf()
+    retrieved = 0
+
+    for page_no in count(1):
+        if stream:
+            res = {}
+            results = stream_oql(osdf, namespace, query, page=page_no, meta=res)
+        else:
+            res = osdf.oql_query(namespace, query, page=page_no)
+            results = res['results']
+
+        if stats is not None:
+            stats['pages'] = stats.get('pages', 0) + 1
+
+        page_count = 0
+        for doc in results:
+            page_count += 1
+            yield doc
+
+        # result_count is the total across all the pages
+        retrieved += page_count
+
+        if retrieved >= res['result_count'] or page_count == 0:
+            break
+
+def link_ids(links):
+    """
+    Returns the distinct node IDs referenced by a linkage dictionary, in the
+    order they first appear.
+    """
+    ids = []
+    seen = set()
+
+    for relation in sorted(links.keys()):
+        for node_id in links[relation]:
+            if node_id not in seen:
+                seen.add(node_id)
+                ids.append(node_id)
+
+    return ids
+
+def fetch_docs(node_ids, cache=None, workers=DEFAULT_WORKERS):
+    """
+    Retrieves the OSDF documents for many node IDs, issuing the lookups
+    concurrently. Documents already present in the cache are not fetched
+    again, and newly fetched documents are added to it.
+
+    Args:
+        node_ids (list): The OSDF IDs to retrieve.
+        cache (dict): Optional dictionary of node ID to document shared
+                      between calls.
+        workers (int): The maximum number of concurrent lookups.
+
+    Returns:
+        A dictionary of node ID to document. IDs that could not be
+        retrieved are absent from it.
+    """
+    module_logger.debug("In fetch_docs.")
+
+    if cache is None:
+        cache = {}
+
+    # The list keeps the order of the IDs, the set makes the checks cheap
+    wanted = []
+    wanted_ids = set()
+    for node_id in node_ids:
+        if node_id not in cache and node_id not in wanted_ids:
+            wanted.append(node_id)
+            wanted_ids.add(node_id)
+
+    if wanted:
+        osdf = iHMPSession.get_session().get_osdf()
+
+        def _get(node_id):
+            try:
+                return (node_id, osdf.get_node(node_id))
+            except Exception as get_exception:
+                module_logger.warn("Unable to retrieve node %s. Reason: %s",
+                                   node_id, get_exception)
+                return (node_id, None)
+
+        module_logger.debug("Retrieving %s documents.", len(wanted))
+
+        pool = ThreadPool(max(1, min(workers, len(wanted))))
+        try:
+            results = pool.map(_get, wanted)
+        finally:
+            pool.close()
+            pool.join()
+
+        for (node_id, doc) in results:
+            if doc is not None:
+                cache[node_id] = doc
+
+    return dict((node_id, cache[node_id]) for node_id in node_ids if node_id in cache)
+
+def make_node(doc, records=False, lazy=False):
+    """
+    Turns an OSDF document into a node object, into a lightweight
+    NodeRecord if records is True, or into a LazyNode that is only hydrated
+    when used if lazy is True.
+    """
+    if records:
+        return NodeRecord(doc)
+
+    if lazy:
+        return LazyNode.from_doc(doc)
+
+    return node_loaders[doc['node_type']](doc)
+
+def load_many(node_ids, node_type=None, cache=None, workers=DEFAULT_WORKERS,
+              records=False, lazy=False):
+    """
+    Loads many nodes by ID with concurrent lookups.
+
+    Args:
+        node_ids (iterable): The OSDF IDs to load, in a list or any other
+                             iterable, such as a generator.
+        node_type (str): If set, only nodes of this type are accepted and
+                         IDs of any other type are reported as missing.
+        cache (dict): Optional dictionary of node ID to document shared
+                      between calls.
+        workers (int): The maximum number of concurrent lookups.
+        records (bool): Return read-only NodeRecords instead of objects.
+        lazy (bool): Return LazyNodes, hydrated on first use.
+
+    Returns:
+        A tuple of the list of loaded objects, in the order of the input
+        IDs, and the list of IDs that could not be loaded.
+    """
+    # A generator could only be read once
+    node_ids = list(node_ids)
+
+    module_logger.debug("In load_many. Loading %s IDs.", len(node_ids))
+
+    docs = fetch_docs(node_ids, cache, workers)
+
+    nodes = []
+    missing = []
+
+    for node_id in node_ids:
+        doc = docs.get(node_id)
+
+        if doc is None:
+            missing.append(node_id)
+        elif doc['node_type'] not in node_loaders:
+            module_logger.warn("Node %s has unknown type %s.", node_id, doc['node_type'])
+            missing.append(node_id)
+        elif node_type is not None and doc['node_type'] != node_type:
+            module_logger.warn("Node %s is a %s, not a %s.", node_id,
+                               doc['node_type'], node_type)
+            missing.append(node_id)
+        else:
+            nodes.append(make_node(doc, records, lazy))
+
+    if missing:
+        module_logger.info("Unable to load %s of %s nodes.", len(missing), len(node_ids))
+
+    return (nodes, missing)
+
+def ancestor_lists(nodes, max_depth=None, include_types=None, cache=None,
+                   workers=DEFAULT_WORKERS):
+    """
+    Resolves the ancestors of many nodes at once. The linkage IDs are
+    followed one level at a time for all the nodes together, so each level
+    costs a single batch of concurrent lookups and shared ancestors (the
+    same visit, subject or study) are only retrieved once.
+
+    Args:
+        nodes (list): The node objects whose ancestors are wanted.
+        max_depth (int): How many levels to climb. None for no limit.
+        include_types (list): Only report ancestors of these node types.
+                              The intermediate levels are still resolved.
+        cache (dict): Optional dictionary of node ID to document, shared
+                      between calls.
+        workers (int): The maximum number of concurrent lookups.
+
+    Returns:
+        A list with one entry per input node, in the same order, each a
+        list of ancestor objects ordered from the nearest to the furthest.
+    """
+    module_logger.debug("In ancestor_lists.")
+
+    if max_depth is not None and max_depth < 0:
+        raise ValueError("Invalid max_depth. Must be a non-negative integer.")
+
+    if cache is None:
+        cache = {}
+
+    # The parent IDs of every node seen so far
+    parents_of = {}
+
+    # The lists keep the order of the IDs, the sets make the checks cheap
+    frontier = []
+    queued = set()
+    for node in nodes:
+        for parent_id in link_ids(node.links):
+            if parent_id not in queued:
+                frontier.append(parent_id)
+                queued.add(parent_id)
+
+    depth = 1
+    while frontier and (max_depth is None or depth <= max_depth):
+        docs = fetch_docs(frontier, cache, workers)
+
+        next_frontier = []
+        queued = set()
+        for node_id in frontier:
+            if node_id not in docs:
+                parents_of[node_id] = []
+                continue
+
+            parents_of[node_id] = link_ids(docs[node_id].get('linkage', {}))
+
+            for parent_id in parents_of[node_id]:
+                if parent_id not in parents_of and parent_id not in queued:
+                    next_frontier.append(parent_id)
+                    queued.add(parent_id)
+
+        frontier = next_frontier
+        depth += 1
+
+    loaded = {}
+
+    def _load(node_id):
+        if node_id not in loaded:
+            doc = cache.get(node_id)
+
+            if doc is None or doc['node_type'] not in node_loaders:
+                loaded[node_id] = None
+            else:
+                loaded[node_id] = node_loaders[doc['node_type']](doc)
+
+        return loaded[node_id]
+
+    lists = []
+    for node in nodes:
+        ancestors = []
+        seen = set()
+        level = deque([(parent_id, 1) for parent_id in link_ids(node.links)])
+
+        while level:
+            (node_id, node_depth) = level.popleft()
+
+            if node_id in seen or (max_depth is not None and node_depth > max_depth):
+                continue
+            seen.add(node_id)
+
+            ancestor = _load(node_id)
+            if ancestor is None:
+                continue
+
+            if include_types is None or cache[node_id]['node_type'] in include_types:
+                ancestors.append(ancestor)
+
+            level.extend([(parent_id, node_depth + 1)
+                          for parent_id in parents_of.get(node_id, [])])
+
+        lists.append(ancestors)
+
+    return lists
+
+def _children_query(node_id, node_type, relations):
+    clauses = []
+
+    for (relation, child_types) in relations.items():
+        clause = oql.linkage(relation, node_id)
+
+        all_types = [c for (r, c) in child_linkages.get(node_type, []) if r == relation]
+
+        if len(child_types) < len(all_types):
+            clause = clause & oql.node_type(*child_types)
+
+        clauses.append(clause)
+
+    return oql.Or(*clauses).to_oql()
+
+def traverse(root, max_depth=None, include_types=None, exclude_types=None,
+             order="dfs", records=False, lazy=False, dry_run=False):
+    """
+    Walks the nodes below the root using an explicit stack (or queue), so
+    that no Python frames pile up with the depth of the graph. Each node is
+    visited once, even when it is reachable through several parents, as is
+    the case for abundance matrices computed from several seq sets.
+
+    Args:
+        root (Base): The node to start from. It must have an ID.
+        max_depth (int): How many levels below the root to descend. None
+                         for no limit.
+        include_types (list): Only yield nodes of these types. Branches that
+                              cannot lead to one of them are not queried.
+        exclude_types (list): Neither yield nor descend into these types.
+        order (str): 'dfs' for depth-first (pre-order) or 'bfs' for
+                     breadth-first order.
+        records (bool): Yield read-only NodeRecords instead of objects.
+        lazy (bool): Yield LazyNodes, hydrated on first use. Only the IDs
+                     and node types are needed to continue the traversal.
+        dry_run (bool): Only estimate the queries and time the traversal
+                        would need. The subtree is still walked, one level
+                        at a time with batched queries, to count its nodes.
+
+    Returns:
+        An iterator of the descendant node objects or, for a dry run, a
+        CostEstimate.
+
+    Exceptions:
+        ValueError: If the order or max_depth is not valid, or if the root
+                    has no ID.
+    """
+    module_logger.debug("In traverse.")
+
+    # Checked here, since the generator would only raise on the first next()
+    if order not in ("dfs", "bfs"):
+        raise ValueError("Invalid order. Must be 'dfs' or 'bfs'.")
+
+    if max_depth is not None and max_depth < 0:
+        raise ValueError("Invalid max_depth. Must be a non-negative integer.")
+
+    if root.id is None:
+        raise ValueError("Cannot traverse from a node without an ID.")
+
+    if dry_run:
+        # local import to avoid cyclic imports
+        from cutlass.costs import estimate_traversal
+
+        return estimate_traversal(root, max_depth=max_depth, include_types=include_types,
+                                  exclude_types=exclude_types)
+
+    return _traverse(root, max_depth, include_types, exclude_types, order, records, lazy)
+
+def _traverse(root, max_depth, include_types, exclude_types, order, records, lazy):
+    if include_types is not None:
+        include_types = set(include_types)
+    exclude_types = set(exclude_types or [])
+
+    visited = set([root.id])
+    pending = deque([(root, node_type_of(root), 0)])
+
+    while pending:
+        if order == "dfs":
+            (node, node_type, depth) = pending.pop()
+        else:
+            (node, node_type, depth) = pending.popleft()
+
+        if node is not root and (include_types is None or node_type in include_types):
+            yield node
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+
+        relations = child_relations(node_type, include_types, exclude_types)
+
+        if not relations:
+            continue
+
+        query = _children_query(node.id, node_type, relations)
+        module_logger.debug("Expanding %s with OQL query: %s", node, query)
+
+        children = []
+        for doc in oql_docs(query):
+            child_type = doc['node_type']
+
+            if doc['id'] in visited or child_type in exclude_types:
+                continue
+
+            if child_type not in node_loaders:
+                module_logger.warn("Skipping unknown node type %s.", child_type)
+                continue
+
+            visited.add(doc['id'])
+            children.append((make_node(doc, records, lazy), child_type, depth + 1))
+
+        if order == "dfs":
+            # Reversed so the children are popped in their natural order
+            children.reverse()
+
+        pending.extend(children)
+
 def generator_flatten(gen):
     """ Flatten the result of the generator. """
     for item in gen:
@@ -0,0 +1,433 @@
+"""
+Columnar export of node collections to pandas data frames and Arrow tables.
+
+The tables are built directly from OSDF documents, without hydrating node
+objects. Each document becomes one row with these columns:
+
+    id, ver, node_type      the OSDF fields
+    <property>              every meta property, e.g. 'fma_body_site'
+    <property>.<key>        nested dictionaries such as mixs and mims are
+                            flattened, e.g. 'mixs.biome'
+    linkage.<relation>      the list of linked IDs, e.g. 'linkage.by'
+
+Rows are converted in chunks, and each column is given a single type per
+chunk (bool, int, float, str or list) so that the libraries do not have to
+fall back to generic object columns. A column mixing lists with other
+values holds text: the lists as JSON, and everything else as in a str
+column. The iter_frames() and iter_batches() generators keep only one
+chunk in memory, which allows very large namespaces to be exported piece
+by piece.
+
+pandas and pyarrow are optional; they are only imported by the functions
+that need them.
+"""
+
+import json
+import logging
+
+# pylint: disable=C0111
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# How many rows to convert at a time by default.
+DEFAULT_CHUNK_SIZE = 5000
+
+# The column types, from narrowest to widest.
+KINDS = ("bool", "int", "float", "str", "list", "object")
+
+def _as_doc(item):
+    # Accepts documents, node objects, NodeRecords and LazyNodes
+    if isinstance(item, dict):
+        return item
+
+    if hasattr(item, 'to_doc'):
+        return item.to_doc()
+
+    return item._get_raw_doc()
+
+def _flatten(prefix, data, row):
+    for (key, value) in data.items():
+        name = prefix + key
+        if isinstance(value, dict) and value:
+            _flatten(name + ".", value, row)
+        else:
+            row[name] = value
+
+def flatten_doc(doc):
+    """
+    Turns an OSDF document (or node object or record) into a flat dictionary
+    of column name to value.
+
+    Args:
+        doc (dict): The OSDF document.
+
+    Returns:
+        A dictionary with one entry per column.
+    """
+    doc = _as_doc(doc)
+
+    row = {'id': doc.get('id'), 'ver': doc.get('ver'), 'node_type': doc.get('node_type')}
+
+    _flatten("", doc.get('meta', {}), row)
+
+    for (relation, ids) in doc.get('linkage', {}).items():
+        row["linkage." + relation] = list(ids)
+
+    return row
+
+def _kind_of(value):
+    if isinstance(value, bool):
+        return "bool"
+    elif isinstance(value, (int, long)):
+        return "int"
+    elif isinstance(value, float):
+        return "float"
+    elif isinstance(value, basestring):
+        return "str"
+    elif isinstance(value, (list, tuple)) and \
+         all([isinstance(item, basestring) for item in value]):
+        return "list"
+
+    return "object"
+
+def merge_kinds(first, second):
+    """
+    Returns the column type able to hold the values of both column types.
+    None stands for a column without any values.
+    """
+    if first is None or first == second:
+        return second
+
+    if second is None:
+        return first
+
+    if set([first, second]) == set(["int", "float"]):
+        return "float"
+
+    if "list" in (first, second) or "object" in (first, second):
+        return "object"
+
+    return "str"
+
+def column_kind(values):
+    """
+    Returns the type of a column of values: 'bool', 'int', 'float', 'str',
+    'list' or 'object', or None if every value is missing.
+    """
+    kind = None
+
+    for value in values:
+        if value is not None:
+            kind = merge_kinds(kind, _kind_of(value))
+
+    return kind
+
+def _convert(value, kind):
+    if value is None:
+        return None
+
+    if kind == "float":
+        return float(value)
+    elif kind == "object" and isinstance(value, (list, tuple, dict)):
+        # Only values without a plain text form are written as JSON
+        return json.dumps(value, sort_keys=True)
+    elif kind in ("str", "object") and not isinstance(value, basestring):
+        return str(value)
+
+    return value
+
+def to_columns(items, columns=None):
+    """
+    Converts documents (or node objects or records) into columns.
+
+    Args:
+        items (list): The documents to convert.
+        columns (list): The columns to produce, in order. By default every
+                        column found in the documents is produced, with the
+                        OSDF fields first and the others sorted by name.
+
+    Returns:
+        A tuple of the list of column names, a dictionary of column name to
+        list of values, and a dictionary of column name to column type.
+    """
+    rows = [flatten_doc(item) for item in items]
+
+    if columns is None:
+        found = set()
+        for row in rows:
+            found.update(row)
+
+        fixed = [name for name in ('id', 'ver', 'node_type') if name in found]
+        columns = fixed + sorted(found.difference(fixed))
+
+    data = {}
+    kinds = {}
+
+    for name in columns:
+        values = [row.get(name) for row in rows]
+        kind = column_kind(values)
+
+        kinds[name] = kind
+        data[name] = [_convert(value, kind) for value in values]
+
+    return (list(columns), data, kinds)
+
+def _chunked(items, chunk_size):
+    if chunk_size < 1:
+        raise ValueError("Invalid chunk_size. Must be a positive integer.")
+
+    chunk = []
+
+    for item in items:
+        chunk.append(item)
+
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def _import(name):
+    try:
+        return __import__(name)
+    except ImportError:
+        raise ImportError("The %s package is required for this export." % name)
+
+def iter_frames(items, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Converts documents (or node objects or records) into a sequence of
+    pandas data frames of at most chunk_size rows each.
+
+    The column types are inferred per frame, so the frames can disagree on
+    the type of a column. to_frame() reconciles them.
+
+    Args:
+        items (iterable): The documents to convert. May be a generator,
+                          such as the one returned by search_iter().
+        columns (list): The columns to produce. See to_columns().
+        chunk_size (int): The maximum number of rows per frame.
+
+    Returns:
+        A generator of pandas DataFrames.
+
+    Exceptions:
+        ImportError: If pandas is not installed.
+    """
+    pandas = _import("pandas")
+
+    for chunk in _chunked(items, chunk_size):
+        (names, data, kinds) = to_columns(chunk, columns)
+
+        yield _frame(pandas, names, data, kinds)
+
+def _frame(pandas, names, data, kinds):
+    frame = pandas.DataFrame(data, columns=names)
+
+    for name in names:
+        if kinds[name] == "int" and None not in data[name]:
+            frame[name] = frame[name].astype("int64")
+
+    return frame
+
+def reconcile_columns(chunks, columns=None):
+    """
+    Brings chunks of columns, as returned by to_columns(), to a common set
+    of columns and column types. A column missing from a chunk is filled
+    with None, and the values of a chunk whose column type is narrower
+    than the common type (for instance int where another chunk has float)
+    are converted to the common type.
+
+    Args:
+        chunks (list): Tuples of column names, values and types, which are
+                       changed in place.
+        columns (list): The columns requested, if any, which come first.
+
+    Returns:
+        A tuple of the list of column names and a dictionary of column name
+        to common column type.
+    """
+    names = list(columns or [])
+    kinds = dict((name, None) for name in names)
+
+    for (chunk_names, _data, chunk_kinds) in chunks:
+        for name in chunk_names:
+            if name not in kinds:
+                names.append(name)
+                kinds[name] = None
+
+            kinds[name] = merge_kinds(kinds[name], chunk_kinds[name])
+
+    for (chunk_names, data, chunk_kinds) in chunks:
+        rows = max([len(values) for values in data.values()] or [0])
+
+        for name in names:
+            if name not in data:
+                data[name] = [None] * rows
+            elif chunk_kinds[name] not in (None, kinds[name]):
+                data[name] = [_convert(value, kinds[name]) for value in data[name]]
+
+            chunk_kinds[name] = kinds[name]
+
+        chunk_names[:] = names
+
+    return (names, kinds)
+
+def to_frame(items, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Converts documents (or node objects or records) into a single pandas
+    data frame. The rows are converted chunk by chunk, and the column types
+    of the chunks are reconciled with reconcile_columns() before the frames
+    are joined, so that a column has one type throughout.
+
+    Args:
+        items (iterable): The documents to convert.
+        columns (list): The columns to produce. See to_columns().
+        chunk_size (int): The number of rows to convert at a time.
+
+    Returns:
+        A pandas DataFrame.
+
+    Exceptions:
+        ImportError: If pandas is not installed.
+    """
+    pandas = _import("pandas")
+
+    chunks = [to_columns(chunk, columns) for chunk in _chunked(items, chunk_size)]
+
+    if not chunks:
+        return pandas.DataFrame(columns=columns or [])
+
+    (names, _kinds) = reconcile_columns(chunks, columns)
+
+    frames = []
+
+    for index in range(len(chunks)):
+        (_names, data, kinds) = chunks[index]
+        # Each chunk's values are let go once its frame is built
+        chunks[index] = None
+        frames.append(_frame(pandas, names, data, kinds))
+
+    if len(frames) == 1:
+        return frames[0]
+
+    return pandas.concat(frames, ignore_index=True, sort=False)
+
+def _arrow_type(pyarrow, kind):
+    types = {
+        "bool": pyarrow.bool_(),
+        "int": pyarrow.int64(),
+        "float": pyarrow.float64(),
+        "list": pyarrow.list_(pyarrow.string())
+    }
+
+    return types.get(kind, pyarrow.string())
+
+def iter_batches(items, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Converts documents (or node objects or records) into a sequence of
+    Arrow record batches of at most chunk_size rows each.
+
+    The column types are inferred per batch, so unless every batch has the
+    same kind of values, the batches can have different schemas. to_arrow()
+    reconciles them.
+
+    Args:
+        items (iterable): The documents to convert.
+        columns (list): The columns to produce. See to_columns().
+        chunk_size (int): The maximum number of rows per batch.
+
+    Returns:
+        A generator of pyarrow RecordBatches.
+
+    Exceptions:
+        ImportError: If pyarrow is not installed.
+    """
+    pyarrow = _import("pyarrow")
+
+    for chunk in _chunked(items, chunk_size):
+        (names, data, kinds) = to_columns(chunk, columns)
+
+        arrays = [pyarrow.array(data[name], type=_arrow_type(pyarrow, kinds[name]))
+                  for name in names]
+
+        yield pyarrow.RecordBatch.from_arrays(arrays, names)
+
+def _batch_kind(pyarrow, arrow_type):
+    for kind in KINDS:
+        if arrow_type == _arrow_type(pyarrow, kind):
+            return kind
+
+    return None
+
+def to_arrow(items, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Converts documents (or node objects or records) into a single Arrow
+    table. The batches are converted one at a time and then brought to a
+    common schema: columns missing from a batch are filled with nulls, and
+    columns whose type differs between batches are converted to the wider
+    type (for instance integers to floats).
+
+    Args:
+        items (iterable): The documents to convert.
+        columns (list): The columns to produce. See to_columns().
+        chunk_size (int): The number of rows to convert at a time.
+
+    Returns:
+        A pyarrow Table.
+
+    Exceptions:
+        ImportError: If pyarrow is not installed.
+    """
+    pyarrow = _import("pyarrow")
+
+    batches = []
+    names = list(columns or [])
+    kinds = {}
+
+    for batch in iter_batches(items, columns, chunk_size):
+        for field in batch.schema:
+            if field.name not in kinds:
+                if field.name not in names:
+                    names.append(field.name)
+                kinds[field.name] = None
+
+            # An all-null column says nothing about the type
+            if batch.column(batch.schema.get_field_index(field.name)).null_count \
+               < batch.num_rows:
+                kinds[field.name] = merge_kinds(kinds[field.name],
+                                                _batch_kind(pyarrow, field.type))
+
+        batches.append(batch)
+
+    schema = pyarrow.schema([(name, _arrow_type(pyarrow, kinds.get(name)))
+                             for name in names])
+
+    tables = []
+
+    for batch in batches:
+        arrays = []
+
+        for field in schema:
+            index = batch.schema.get_field_index(field.name)
+
+            if index < 0:
+                arrays.append(pyarrow.nulls(batch.num_rows, type=field.type))
+            else:
+                column = batch.column(index)
+                if column.type != field.type:
+                    kind = kinds[field.name]
+                    column = pyarrow.array([_convert(value, kind)
+                                            for value in column.to_pylist()],
+                                           type=field.type)
+                arrays.append(column)
+
+        tables.append(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    if not tables:
+        return schema.empty_table()
+
+    return pyarrow.concat_tables(tables)
@@ -4,11 +4,79 @@ to an Open Science Data Framwork (OSDF) instance operated for the
 Integrative Human Microbiome Project (iHMP).
 """
 
+import functools
 import importlib
 import logging
+import threading
+import time
 from osdf import OSDF
+from cutlass.aspera import aspera
+from cutlass.costs import RequestStats, REQUESTS
 from cutlass.Util import *
 
+class _ObservedOSDF(object):
+    """
+    Passes every call through to an OSDF client, timing the requests if the
+    session records them, and tells the session's listeners about the nodes
+    that were saved or deleted successfully.
+    """
+
+    def __init__(self, osdf, listeners, stats):
+        self._osdf = osdf
+        self._listeners = listeners
+        self._stats = stats
+
+    @property
+    def client(self):
+        """ The OSDF client the calls are passed to. """
+        return self._osdf
+
+    def __getattr__(self, name):
+        if name in REQUESTS:
+            return functools.partial(self._request, name)
+
+        return getattr(self._osdf, name)
+
+    def _request(self, name, *args, **kwargs):
+        start = time.time()
+        failed = True
+
+        try:
+            result = getattr(self._osdf, name)(*args, **kwargs)
+            failed = False
+        finally:
+            if self._stats is not None:
+                self._stats.record(name, time.time() - start, failed=failed)
+
+        return result
+
+    def insert_node(self, json_data):
+        node_id = self._request('insert_node', json_data)
+
+        doc = dict(json_data, id=node_id, ver=1)
+        for listener in list(self._listeners):
+            listener.node_saved(doc)
+
+        return node_id
+
+    def edit_node(self, json_data):
+        result = self._request('edit_node', json_data)
+
+        # The server increments the version of the edited node
+        doc = dict(json_data, ver=json_data.get('ver', 1) + 1)
+        for listener in list(self._listeners):
+            listener.node_saved(doc)
+
+        return result
+
+    def delete_node(self, node_id):
+        result = self._request('delete_node', node_id)
+
+        for listener in list(self._listeners):
+            listener.node_deleted(node_id)
+
+        return result
+
 class iHMPSession(object):
     """
     The iHMP Session class. This class allows you to connect with an OSDF
@@ -19,6 +87,9 @@ class iHMPSession(object):
     Attributes:
         _single (iHMPSession): The iHMP Session that is currently live. None
         otherwise.
+        stats (RequestStats): The number and duration of the OSDF requests
+        and Aspera uploads made through the session since start_stats() was
+        called, or None.
     """
 
     check_python_version(name="Cutlass")
@@ -46,6 +117,15 @@ class iHMPSession(object):
         self._ssl = ssl
         self._osdf = OSDF(self._server, self._username, self._password,
                           port=self._port, ssl=self._ssl)
+        # The OSDF client set aside while a local store is in use
+        self._remote_osdf = None
+        # Objects told about every node saved or deleted
+        self._listeners = []
+        # The open units of work of each thread, innermost last
+        self._local = threading.local()
+        # The number and duration of the requests made, by kind of request,
+        # while they are being recorded
+        self.stats = None
 
         self.logger = logging.getLogger(self.__module__ + '.' + \
                                         self.__class__.__name__)
@@ -150,8 +230,134 @@ class iHMPSession(object):
             An OSDF object.
         """
         self.logger.debug("In get_osdf.")
+
+        if self._listeners or self.stats is not None:
+            return _ObservedOSDF(self._osdf, self._listeners, self.stats)
+
+        return self._osdf
+
+    def start_stats(self):
+        """
+        Starts timing the OSDF requests and Aspera uploads made through
+        this session, for instance to estimate the duration of a bulk
+        operation from a dry run. Does nothing if they are already timed.
+
+        Args:
+            None
+
+        Returns:
+            The RequestStats the requests are recorded in.
+        """
+        self.logger.debug("In start_stats.")
+
+        if self.stats is None:
+            self.stats = RequestStats()
+            aspera.upload_listeners.append(self._record_upload)
+
+        return self.stats
+
+    def stop_stats(self):
+        """
+        Stops timing the requests made through this session.
+
+        Args:
+            None
+
+        Returns:
+            The RequestStats recorded so far, or None.
+        """
+        self.logger.debug("In stop_stats.")
+
+        stats = self.stats
+        self.stats = None
+
+        if self._record_upload in aspera.upload_listeners:
+            aspera.upload_listeners.remove(self._record_upload)
+
+        return stats
+
+    def _record_upload(self, _local_file, size, seconds, success):
+        stats = self.stats
+
+        if stats is not None:
+            stats.record('upload', seconds, size=size, failed=not success)
+
+    def add_listener(self, listener):
+        """
+        Registers an object to be told about the nodes saved and deleted
+        through this session. The listener's node_saved(doc) method is
+        called with the document of each node inserted or edited, and its
+        node_deleted(node_id) method with the ID of each node deleted.
+
+        Args:
+            listener (object): The object to notify.
+
+        Returns:
+            None
+        """
+        self.logger.debug("In add_listener.")
+
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stops notifying a listener registered with add_listener().
+
+        Args:
+            listener (object): The object to stop notifying.
+
+        Returns:
+            None
+        """
+        self.logger.debug("In remove_listener.")
+
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def use_local(self, store=None, page_size=None):
+        """
+        Switches the session to a local, in-memory document store, so that
+        searches, counts, loads and saves are served without a server. The
+        OSDF client in use is kept, to be restored with use_remote().
+
+        Args:
+            store (LocalStore): The documents to serve. Defaults to a new,
+                                empty store.
+            page_size (int): How many results to return per OQL page. By
+                             default every result is on the first page.
+
+        Returns:
+            The LocalOSDF client now in use by the session.
+        """
+        self.logger.debug("In use_local.")
+
+        # local import to avoid cyclic imports
+        from cutlass.local import LocalOSDF
+
+        if self._remote_osdf is None:
+            self._remote_osdf = self._osdf
+
+        self._osdf = LocalOSDF(store, page_size=page_size)
+
         return self._osdf
 
+    def use_remote(self):
+        """
+        Switches the session back to the OSDF server after use_local().
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.logger.debug("In use_remote.")
+
+        if self._remote_osdf is not None:
+            self._osdf = self._remote_osdf
+            self._remote_osdf = None
+
     def create_object(self, node_type):
         """
         Returns an empty object of the node_type provided. It must be a
@@ -174,6 +380,221 @@ class iHMPSession(object):
 
         return instance
 
+    def load_many(self, node_ids, cache=None, workers=8, records=False, lazy=False):
+        """
+        Loads many nodes, of any type, by their OSDF IDs. The documents are
+        retrieved with concurrent lookups.
+
+        Args:
+            node_ids (list): The OSDF IDs of the documents to load.
+            cache (dict): Optional dictionary of node ID to document that is
+                          consulted before, and filled in by, the lookups.
+            workers (int): The maximum number of concurrent lookups.
+            records (bool): Return lightweight, read-only NodeRecords
+                            instead of fully hydrated objects.
+            lazy (bool): Return LazyNodes, hydrated on first use.
+
+        Returns:
+            A tuple with the list of loaded objects, in the same order as
+            the IDs, and the list of IDs that could not be loaded.
+        """
+        self.logger.debug("In load_many.")
+
+        # local import to avoid cyclic imports
+        from cutlass.dependency import load_many
+
+        return load_many(node_ids, cache=cache, workers=workers, records=records,
+                         lazy=lazy)
+
+    def save_all(self, nodes, workers=8, journal=None, rollback=False, dry_run=False):
+        """
+        Saves many nodes in dependency order: a node is saved after the
+        nodes it links to. The links may refer to node objects instead of
+        IDs, including nodes that have not been saved yet; they are replaced
+        with the IDs assigned as the parents are saved. The nodes of each
+        level of the order are saved concurrently.
+
+        Args:
+            nodes (list): The node objects to save.
+            workers (int): The maximum number of concurrent saves.
+            journal (Journal): Optional journal to record the writes in. The
+                               nodes it records as saved by an earlier,
+                               interrupted run are not saved again.
+            rollback (bool): If any node fails, stop and delete the nodes
+                             inserted so far, children first.
+            dry_run (bool): Save nothing; only estimate the requests, uploads
+                            and time the save would need.
+
+        Returns:
+            A BulkResult with the outcome for each node, and the time taken.
+            For a dry run, its estimate attribute holds a CostEstimate.
+        """
+        self.logger.debug("In save_all.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import save_all
+
+        return save_all(nodes, workers=workers, journal=journal, rollback=rollback,
+                        dry_run=dry_run)
+
+    def unit_of_work(self, max_nodes=None, max_bytes=None, workers=8):
+        """
+        Returns a context in which save() calls are deferred. Saving the
+        same node again only replaces the pending write, so each node is
+        validated and written once, when the context exits, through
+        save_all(). If the block raises an exception, the pending writes
+        are discarded.
+
+            with session.unit_of_work() as unit:
+                subject.save()
+                visit.links = {"by": [subject]}
+                visit.save()
+
+        Since IDs are only assigned at the flush, link new nodes to each
+        other with the node objects rather than their IDs.
+
+        Args:
+            max_nodes (int): Flush whenever this many nodes are pending.
+            max_bytes (int): Flush whenever the JSON documents of the pending
+                             nodes reach this size.
+            workers (int): The maximum number of concurrent saves.
+
+        Returns:
+            A UnitOfWork, to be used in a 'with' statement.
+        """
+        self.logger.debug("In unit_of_work.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import UnitOfWork
+
+        return UnitOfWork(self, max_nodes=max_nodes, max_bytes=max_bytes,
+                          workers=workers)
+
+    def current_unit_of_work(self):
+        """
+        Returns the innermost unit of work opened by the current thread,
+        or None.
+
+        Args:
+            None
+
+        Returns:
+            A UnitOfWork or None.
+        """
+        units = self._open_units()
+
+        if units:
+            return units[-1]
+
+        return None
+
+    def _open_units(self):
+        # Units of work only defer the saves made by the thread that opened
+        # them, so the workers of a bulk save are never deferred
+        if not hasattr(self._local, 'units'):
+            self._local.units = []
+
+        return self._local.units
+
+    def delete_subtree(self, root, dry_run=False, workers=8):
+        """
+        Deletes a node and all of its descendants. The nodes are ordered by
+        their linkage, so that no node is deleted while another still links
+        to it, and the nodes of each level are deleted concurrently.
+
+        Args:
+            root (Base): The node at the top of the subtree.
+            dry_run (bool): Only report what would be deleted, in which
+                            order, and at what estimated cost.
+            workers (int): The maximum number of concurrent deletes.
+
+        Returns:
+            A BulkResult with the outcome for each node.
+        """
+        self.logger.debug("In delete_subtree.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import delete_subtree
+
+        return delete_subtree(root, dry_run=dry_run, workers=workers)
+
+    def delete_where(self, query, dry_run=False, workers=8):
+        """
+        Deletes every node matching an OQL query, in the same way as
+        delete_subtree().
+
+        Args:
+            query (str): The OQL criteria, for instance '"my_test"[tags]'.
+            dry_run (bool): Only report what would be deleted, in which
+                            order, and at what estimated cost.
+            workers (int): The maximum number of concurrent deletes.
+
+        Returns:
+            A BulkResult with the outcome for each node.
+        """
+        self.logger.debug("In delete_where.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import delete_where
+
+        return delete_where(query, dry_run=dry_run, workers=workers)
+
+    def relink(self, changes, batch_size=100, workers=8):
+        """
+        Changes the linkage of many existing nodes, without loading them
+        as objects. The documents are retrieved and written back in
+        batches, and a node that was changed by someone else since it was
+        read is reported as a conflict instead of being overwritten.
+
+            session.relink({
+                sample_id: {"set": {"collected_during": [visit_id]}},
+                matrix_id: {"add": {"computed_from": [seq_set_id]}}
+            })
+
+        Args:
+            changes (dict): Node ID to the change of its linkage: a
+                            dictionary with any of 'set', 'add' and 'remove',
+                            each mapping relations to lists of IDs, and
+                            optionally 'ver', the version the change expects.
+            batch_size (int): The maximum number of nodes handled at a time.
+            workers (int): The maximum number of concurrent requests.
+
+        Returns:
+            A BulkResult with the outcome for each node ID: 'relinked',
+            'unchanged', 'conflict' or 'failed', and its document in 'doc'.
+        """
+        self.logger.debug("In relink.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import relink
+
+        return relink(changes, batch_size=batch_size, workers=workers)
+
+    def count(self, query=None, node_types=None, workers=8):
+        """
+        Counts the nodes matching a query without retrieving them.
+
+        Args:
+            query (str): The OQL criteria. Required unless node_types is set.
+            node_types (list): If provided, the nodes of each of these types
+                               are counted separately, with the queries
+                               issued concurrently.
+            workers (int): The maximum number of concurrent queries.
+
+        Returns:
+            The number of matching nodes or, if node_types is provided, a
+            dictionary of node type to the number of matching nodes.
+        """
+        self.logger.debug("In count.")
+
+        # local import to avoid cyclic imports
+        from cutlass.dependency import count_by_type, count_docs, typed_query
+
+        if node_types is None:
+            return count_docs(typed_query(query))
+
+        return count_by_type(node_types, query=query, workers=workers)
+
     @property
     def password(self):
         """
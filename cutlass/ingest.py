@@ -0,0 +1,614 @@
+"""
+A streaming pipeline that turns CSV or TSV manifests into nodes.
+
+Each row of a manifest describes one or more related nodes, for instance a
+subject, one of its visits and a sample collected during that visit. A
+mapping spec says which columns set which properties of which nodes, and
+how the nodes of a row link to each other:
+
+    spec = {
+        "subject": {
+            "columns": {"rand_subject_id": "Subject", "gender": "Sex"},
+            "links": {"participates_in": [study_id]}
+        },
+        "visit": {
+            "columns": {"visit_id": "Visit",
+                        "visit_number": ("Visit number", int),
+                        "interval": ("Days", int)},
+            "links": {"by": "subject"}
+        },
+        "sample": {
+            "columns": {"name": "Sample", "fma_body_site": "Body site"},
+            "values": {"mixs": mixs},
+            "links": {"collected_during": "visit"}
+        }
+    }
+
+Each entry of the spec is named after a node type, or sets 'node_type'
+explicitly. 'columns' maps properties to a column, or to a column and a
+conversion function; empty cells leave the property unset. 'values' sets
+constant properties. 'links' maps each linkage relation to another entry
+of the same row or to a list of OSDF IDs. 'key' names the property that
+identifies a node (by default its natural key from cutlass.keys), so that
+rows mentioning the same subject or visit share one node.
+
+The rows pass through four stages connected by bounded queues:
+
+    parse      read the cells and convert them to property values
+    build      create the node objects, or reuse those of earlier rows
+    validate   check each new node against the OSDF schema
+    save       save the nodes of the row, parents first
+
+Every stage runs its own pool of worker threads. When a stage falls
+behind, the queue in front of it fills up and the stages before it wait,
+so only the rows in the queues are held in memory. The one exception is
+the nodes shared between rows: the loader remembers each key it has seen,
+and once such a node is saved, it keeps only the node's ID. The report
+gives the throughput of each stage and the time its workers spent busy,
+starved or blocked, which shows where the bottleneck is.
+"""
+
+import csv
+import gzip
+import logging
+import Queue
+import threading
+import time
+
+from cutlass.Base import Base
+from cutlass.iHMPSession import iHMPSession
+from cutlass.keys import NATURAL_KEYS
+
+# pylint: disable=W0703, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# The number of worker threads of each stage, by default.
+DEFAULT_STAGE_WORKERS = {"parse": 2, "build": 2, "validate": 8, "save": 8}
+
+# How many rows each queue between two stages holds, by default.
+DEFAULT_QUEUE_SIZE = 1000
+
+# Marks the end of the rows in a queue
+_DONE = object()
+
+# Stands in for the ID of a linked node not saved yet, during validation
+UNSAVED_ID = "unsaved"
+
+class StageStats(object):
+    """
+    The work done by one stage of a pipeline.
+
+    Attributes:
+        name (str): The name of the stage.
+        workers (int): The number of worker threads.
+        rows (int): The number of rows the stage passed on.
+        errors (int): The number of rows the stage rejected.
+        busy (float): The seconds the workers spent working, summed.
+        blocked (float): The seconds the workers spent waiting for room in
+                         the queue of the next stage, summed.
+        seconds (float): The time from the first row to the last.
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.rows = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.seconds = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def _record(self, started, finished, blocked, failed):
+        with self._lock:
+            if self._started is None or started < self._started:
+                self._started = started
+
+            self.seconds = max(self.seconds, finished + blocked - self._started)
+            self.busy += finished - started
+            self.blocked += blocked
+
+            if failed:
+                self.errors += 1
+            else:
+                self.rows += 1
+
+    @property
+    def rate(self):
+        """ float: The rows passed on per second. """
+        if self.seconds <= 0:
+            return float(self.rows)
+
+        return self.rows / self.seconds
+
+    @property
+    def capacity(self):
+        """
+        float: The rows per second the stage could handle if it never
+        waited for the other stages. The lowest capacity is the bottleneck.
+        """
+        done = self.rows + self.errors
+
+        if self.busy <= 0:
+            return float(done)
+
+        return done * self.workers / self.busy
+
+    def __str__(self):
+        return "{}: {} rows, {} errors, {:.1f} rows/s, capacity {:.1f} rows/s, " \
+               "{:.2f}s busy, {:.2f}s blocked ({} workers)".format(
+                   self.name, self.rows, self.errors, self.rate, self.capacity,
+                   self.busy, self.blocked, self.workers)
+
+class IngestReport(object):
+    """
+    The outcome of ingesting a manifest.
+
+    Attributes:
+        rows (int): The number of rows read.
+        saved (int): The number of rows whose nodes were all saved.
+        nodes (int): The number of distinct nodes saved.
+        errors (list): A dictionary per rejected row, with its 'line', the
+                       'stage' that rejected it and the 'error'.
+        stages (list): The StageStats of each stage, in order.
+        seconds (float): The total time taken.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.saved = 0
+        self.nodes = 0
+        self.errors = []
+        self.stages = []
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        """ bool: Whether every row was saved. """
+        return len(self.errors) == 0
+
+    @property
+    def bottleneck(self):
+        """ str: The name of the stage with the lowest capacity. """
+        stages = [stage for stage in self.stages if stage.rows + stage.errors > 0]
+
+        if not stages:
+            return None
+
+        return min(stages, key=lambda stage: stage.capacity).name
+
+    def __str__(self):
+        lines = ["{} rows, {} saved, {} nodes, {} errors in {:.2f}s".format(
+            self.rows, self.saved, self.nodes, len(self.errors), self.seconds)]
+        lines.extend(["  " + str(stage) for stage in self.stages])
+
+        return "\n".join(lines)
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+
+    return open(path, "rb")
+
+def _validate(node):
+    # The links to node objects are replaced with IDs for the validation,
+    # as the nodes cannot be serialized and may not have been saved yet
+    links = node._links
+    node._links = dict((relation, [(target.id or UNSAVED_ID) if isinstance(target, Base)
+                                   else target for target in targets])
+                       for (relation, targets) in links.items())
+
+    try:
+        return node.validate()
+    finally:
+        node._links = links
+
+def read_manifest(path, delimiter=None):
+    """
+    Generator over the rows of a CSV or TSV manifest, as tuples of the line
+    number and a dictionary of column to cell.
+
+    Args:
+        path (str): The manifest. Decompressed if it ends in '.gz'.
+        delimiter (str): The cell delimiter. Defaults to a tab for files
+                         named .tsv or .txt, and a comma otherwise.
+    """
+    if delimiter is None:
+        name = path[:-3] if path.endswith(".gz") else path
+        delimiter = "\t" if name.endswith((".tsv", ".txt")) else ","
+
+    with _open(path) as handle:
+        reader = csv.DictReader(handle, delimiter=delimiter)
+
+        for row in reader:
+            yield (reader.line_num, row)
+
+class _Row(object):
+    # A row as it moves through the stages
+    __slots__ = ('line', 'cells', 'values', 'nodes')
+
+    def __init__(self, line, cells):
+        self.line = line
+        self.cells = cells
+        self.values = None
+        # (entry, _Node) pairs, parents first
+        self.nodes = None
+
+class _Node(object):
+    # A node of a row, with its progress through the stages. The rows that
+    # share a node share its _Node, so the state goes away with the last of
+    # those rows, or stays with the key of a shared node.
+    __slots__ = ('node', 'node_id', 'lock', 'checked', 'problems', 'error')
+
+    def __init__(self, node):
+        self.node = node
+        # Set once saved, when the node object itself is let go
+        self.node_id = None
+        self.lock = threading.Lock()
+        self.checked = False
+        self.problems = None
+        self.error = None
+
+    @property
+    def saved(self):
+        return self.node_id is not None
+
+    @property
+    def link(self):
+        # What the nodes of later rows link to
+        return self.node_id if self.saved else self.node
+
+class ManifestLoader(object):
+    """
+    Loads manifests into OSDF according to a mapping spec.
+    """
+
+    def __init__(self, spec, workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 validate=True, index=None):
+        """
+        Args:
+            spec (dict): The mapping of columns to nodes, as described in
+                         the module documentation.
+            workers (dict): The number of workers of each stage ('parse',
+                            'build', 'validate' and 'save'), to override
+                            DEFAULT_STAGE_WORKERS.
+            queue_size (int): How many rows to hold between two stages.
+            validate (bool): Whether to run the validate stage. Rejecting
+                             invalid rows before anything is saved costs a
+                             validation request per new node.
+            index (KeyIndex): Optional key index to upsert the nodes with,
+                              so loading a manifest again does not create
+                              duplicates and only writes what changed.
+
+        Exceptions:
+            ValueError: If the spec links to an entry it does not have, or
+                        the links between the entries form a cycle.
+        """
+        self.spec = spec
+        self.workers = dict(DEFAULT_STAGE_WORKERS)
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+        self.validate = validate
+        self.index = index
+
+        self.order = self._entry_order()
+
+        self._lock = threading.Lock()
+        # (entry, key value) -> _Node, for the nodes shared between rows
+        self._shared = {}
+        self._saved = 0
+
+    def _entry_order(self):
+        remaining = {}
+
+        for (entry, mapping) in self.spec.items():
+            parents = set()
+
+            for (relation, target) in mapping.get('links', {}).items():
+                if isinstance(target, basestring):
+                    if target not in self.spec:
+                        raise ValueError("The %s link of %s refers to an unknown entry: %s" %
+                                         (relation, entry, target))
+                    parents.add(target)
+
+            remaining[entry] = parents
+
+        order = []
+
+        while remaining:
+            ready = sorted([entry for (entry, parents) in remaining.items() if not parents])
+
+            if not ready:
+                raise ValueError("The links between the entries of the spec form a cycle.")
+
+            order.extend(ready)
+
+            for entry in ready:
+                del remaining[entry]
+
+            for parents in remaining.values():
+                parents.difference_update(ready)
+
+        return order
+
+    def _node_type(self, entry):
+        return self.spec[entry].get('node_type', entry)
+
+    def _key(self, entry):
+        mapping = self.spec[entry]
+
+        if 'key' in mapping:
+            return mapping['key']
+
+        for key in NATURAL_KEYS.get(self._node_type(entry), []):
+            if key in mapping.get('columns', {}) or key in mapping.get('values', {}):
+                return key
+
+        return None
+
+    def parse(self, row):
+        """ Converts the cells of a row to the property values of each entry. """
+        row.values = {}
+
+        for entry in self.order:
+            mapping = self.spec[entry]
+            values = dict(mapping.get('values', {}))
+
+            for (prop, column) in mapping.get('columns', {}).items():
+                convert = None
+
+                if isinstance(column, tuple):
+                    (column, convert) = column
+
+                if column not in row.cells:
+                    raise ValueError("Missing column: %s" % column)
+
+                cell = row.cells[column]
+
+                if cell is None or cell.strip() == "":
+                    continue
+
+                try:
+                    values[prop] = convert(cell.strip()) if convert else cell.strip()
+                except Exception as convert_exception:
+                    raise ValueError("Bad value for %s in column %s: %r (%s)" %
+                                     (prop, column, cell, convert_exception))
+
+            row.values[entry] = values
+
+        return row
+
+    def _new_node(self, entry, values, nodes):
+        node = iHMPSession.get_session().create_object(self._node_type(entry))
+
+        for (prop, value) in sorted(values.items()):
+            try:
+                setattr(node, prop, value)
+            except Exception as set_exception:
+                raise ValueError("Cannot set %s of %s to %r: %s" %
+                                 (prop, entry, value, set_exception))
+
+        links = {}
+        for (relation, target) in self.spec[entry].get('links', {}).items():
+            if isinstance(target, basestring):
+                links[relation] = [nodes[target]]
+            else:
+                links[relation] = list(target)
+
+        node.links = links
+
+        return node
+
+    def build(self, row):
+        """
+        Creates the nodes of a row. A node with the same key as a node of an
+        earlier row is not created again; the earlier node is used.
+        """
+        row.nodes = []
+        nodes = {}
+
+        for entry in self.order:
+            values = row.values[entry]
+            key = self._key(entry)
+
+            if key is not None and values.get(key) is not None:
+                name = (entry, values[key])
+
+                with self._lock:
+                    state = self._shared.get(name)
+
+                    if state is None:
+                        state = _Node(self._new_node(entry, values, nodes))
+                        self._shared[name] = state
+            else:
+                state = _Node(self._new_node(entry, values, nodes))
+
+            nodes[entry] = state.link
+            row.nodes.append((entry, state))
+
+        return row
+
+    def check(self, row):
+        """ Validates the nodes of a row that have not been validated yet. """
+        for (entry, state) in row.nodes:
+            with state.lock:
+                if not state.checked and not state.saved:
+                    if state.node.id is None:
+                        state.problems = _validate(state.node) or None
+                    state.checked = True
+
+            if state.problems:
+                raise ValueError("Invalid %s: %s" % (entry, "; ".join(
+                    [str(problem) for problem in state.problems])))
+
+        return row
+
+    def save(self, row):
+        """ Saves the nodes of a row that have not been saved yet, parents first. """
+        # local import to avoid cyclic imports
+        from cutlass.bulk import _resolve_links
+
+        for (entry, state) in row.nodes:
+            with state.lock:
+                if state.error is not None:
+                    raise ValueError("The %s could not be saved: %s" % (entry, state.error))
+
+                if state.saved:
+                    continue
+
+                node = state.node
+                error = None
+
+                if not _resolve_links(node):
+                    error = "A linked node was not saved."
+                elif self.index is not None:
+                    if self.index.upsert(node) is None:
+                        error = "save() returned False."
+                elif not node.save(defer=False):
+                    error = "save() returned False."
+
+                if error is not None:
+                    state.error = error
+                    raise ValueError("The %s could not be saved: %s" % (entry, error))
+
+                # Later rows link to the ID; only the rows in flight hold
+                # on to the node object
+                state.node_id = node.id
+                state.node = None
+
+                with self._lock:
+                    self._saved += 1
+
+        return row
+
+    def _work(self, stage, function, inbox, outbox, report):
+        while True:
+            row = inbox.get()
+
+            if row is _DONE:
+                break
+
+            started = time.time()
+            failed = False
+
+            try:
+                row = function(row)
+            except Exception as stage_exception:
+                failed = True
+                with self._lock:
+                    report.errors.append({'line': row.line, 'stage': stage.name,
+                                          'error': str(stage_exception)})
+
+            finished = time.time()
+
+            if not failed and outbox is not None:
+                outbox.put(row)
+
+            stage._record(started, finished, time.time() - finished, failed)
+
+    def load(self, path, delimiter=None):
+        """
+        Loads a manifest file.
+
+        Args:
+            path (str): The CSV or TSV file. Decompressed if it ends in '.gz'.
+            delimiter (str): The cell delimiter. Guessed from the file name
+                             by default.
+
+        Returns:
+            An IngestReport.
+        """
+        return self.load_rows(read_manifest(path, delimiter=delimiter))
+
+    def load_rows(self, rows):
+        """
+        Loads rows that have already been read.
+
+        Args:
+            rows (iterable): Tuples of a line number and a dictionary of
+                             column to cell, such as csv.DictReader rows.
+
+        Returns:
+            An IngestReport.
+        """
+        module_logger.debug("In load_rows.")
+
+        stages = [("parse", self.parse), ("build", self.build)]
+
+        if self.validate:
+            stages.append(("validate", self.check))
+
+        stages.append(("save", self.save))
+
+        report = IngestReport()
+        report.stages = [StageStats(name, max(1, self.workers.get(name, 1)))
+                         for (name, _function) in stages]
+
+        queues = [Queue.Queue(self.queue_size) for _stage in stages]
+        threads = []
+
+        for (index, (_name, function)) in enumerate(stages):
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            stage_threads = []
+
+            for _worker in range(report.stages[index].workers):
+                thread = threading.Thread(target=self._work,
+                                          args=(report.stages[index], function,
+                                                queues[index], outbox, report))
+                thread.daemon = True
+                thread.start()
+                stage_threads.append(thread)
+
+            threads.append(stage_threads)
+
+        start = time.time()
+
+        # Reading is the only sequential part: the rows are handed to the
+        # parse workers as fast as they can take them.
+        for (line, cells) in rows:
+            queues[0].put(_Row(line, cells))
+            report.rows += 1
+
+        for (index, stage_threads) in enumerate(threads):
+            for _thread in stage_threads:
+                queues[index].put(_DONE)
+
+            for thread in stage_threads:
+                thread.join()
+
+        report.seconds = time.time() - start
+        report.saved = report.stages[-1].rows
+        report.nodes = self._saved
+        report.errors.sort(key=lambda error: error['line'])
+
+        module_logger.info("Ingested a manifest: %s", report)
+
+        return report
+
+def ingest_manifest(path, spec, workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+                    validate=True, index=None, delimiter=None):
+    """
+    Loads a CSV or TSV manifest into OSDF with a ManifestLoader.
+
+    Args:
+        path (str): The manifest. Decompressed if it ends in '.gz'.
+        spec (dict): The mapping of columns to nodes.
+        workers (dict): The number of workers of each stage.
+        queue_size (int): How many rows to hold between two stages.
+        validate (bool): Whether to validate the new nodes before saving.
+        index (KeyIndex): Optional key index to upsert the nodes with.
+        delimiter (str): The cell delimiter. Guessed from the file name by
+                         default.
+
+    Returns:
+        An IngestReport.
+    """
+    loader = ManifestLoader(spec, workers=workers, queue_size=queue_size,
+                            validate=validate, index=index)
+
+    return loader.load(path, delimiter=delimiter)
@@ -0,0 +1,219 @@
+"""
+An append-only journal of the writes made by bulk operations, so that an
+interrupted load can be resumed without saving anything twice.
+
+Every write is recorded twice: once as 'planned', before the request is
+sent, and once as 'saved' (with the OSDF ID and version assigned) or
+'failed' when it completes. A write undone by a rollback is recorded as
+'rolled_back'. Writes are identified by a client-side key, which is by
+default derived from the content of the node, so the same input produces
+the same keys when the load is run again.
+
+When a journal is passed to save_all() or import_subtree(), the writes it
+records as saved are not repeated: the nodes are given their recorded IDs
+and versions instead, without querying the server. Writes that were
+planned but never completed were in flight when the load stopped; they
+are listed by in_flight() and should be checked by hand.
+
+The journal is a JSON lines file, one record per write event, appended to
+and flushed as each event happens.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from cutlass.Base import Base
+from cutlass.records import byteify
+
+# pylint: disable=W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+def content_key(node, keys=None):
+    """
+    Returns a key identifying a node by its type, properties and links. A
+    link to another unsaved node is represented by the key of that node,
+    so a whole tree of new nodes gets the same keys every time it is built.
+
+    Args:
+        node (Base): The node.
+        keys (dict): Optional cache of id(node) to key, filled in as the
+                     keys of the node and its linked nodes are computed.
+
+    Returns:
+        A string such as 'subject:3f2a...'.
+    """
+    if keys is None:
+        keys = {}
+
+    if id(node) in keys:
+        return keys[id(node)]
+
+    doc = node._get_raw_doc()
+    doc.pop('ver', None)
+
+    linkage = {}
+    for (relation, targets) in node.links.items():
+        linkage[relation] = sorted([content_key(target, keys) if isinstance(target, Base)
+                                    else target for target in targets])
+    doc['linkage'] = linkage
+
+    digest = hashlib.sha1(json.dumps(doc, sort_keys=True, default=str)).hexdigest()
+    key = "{}:{}".format(doc.get('node_type'), digest)
+
+    keys[id(node)] = key
+
+    return key
+
+class Journal(object):
+    """
+    An append-only record of planned and completed writes, kept in a file.
+    Safe to use from concurrent threads.
+    """
+
+    def __init__(self, path, sync=False):
+        """
+        Opens a journal, replaying the records already in the file.
+
+        Args:
+            path (str): The journal file. Created if it does not exist.
+            sync (bool): Also fsync() the file after every record, so the
+                         journal survives a crash of the machine and not
+                         only of the process.
+        """
+        self.path = path
+        self.sync = sync
+
+        # key -> record of the last completed write
+        self._saved = {}
+        # key -> record of the writes started but not completed
+        self._planned = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as handle:
+                for line in handle:
+                    if line.strip():
+                        self._replay(byteify(json.loads(line)))
+
+            module_logger.info("Replayed a journal of %s saved writes.", len(self._saved))
+
+        self._handle = open(path, "a")
+
+    def _replay(self, record):
+        key = record['key']
+
+        if record['event'] == 'planned':
+            self._planned[key] = record
+        elif record['event'] == 'rolled_back':
+            self._saved.pop(key, None)
+        else:
+            self._planned.pop(key, None)
+
+            if record['event'] == 'saved':
+                self._saved[key] = record
+                self._failed.pop(key, None)
+            else:
+                self._failed[key] = record
+
+    def _append(self, record):
+        record['time'] = time.time()
+
+        with self._lock:
+            self._replay(record)
+            self._handle.write(json.dumps(record, sort_keys=True) + "\n")
+            self._handle.flush()
+
+            if self.sync:
+                os.fsync(self._handle.fileno())
+
+    def close(self):
+        """ Closes the journal file. """
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self._saved)
+
+    def __contains__(self, key):
+        return key in self._saved
+
+    def planned(self, key, node_type=None):
+        """ Records that a write is about to be sent. """
+        self._append({'event': 'planned', 'key': key, 'node_type': node_type})
+
+    def saved(self, key, node_id, version=None, node_type=None):
+        """ Records a completed write and the ID and version it produced. """
+        self._append({'event': 'saved', 'key': key, 'id': node_id, 'ver': version,
+                      'node_type': node_type})
+
+    def failed(self, key, error=None, node_type=None):
+        """ Records a write that failed. """
+        self._append({'event': 'failed', 'key': key, 'error': error,
+                      'node_type': node_type})
+
+    def rolled_back(self, key, node_type=None):
+        """ Records that the node of a completed write was deleted again. """
+        self._append({'event': 'rolled_back', 'key': key, 'node_type': node_type})
+
+    def lookup(self, key):
+        """
+        Returns a tuple of the OSDF ID and version recorded for a completed
+        write, or None.
+        """
+        record = self._saved.get(key)
+
+        if record is None:
+            return None
+
+        return (record['id'], record.get('ver'))
+
+    def restore(self, node, key):
+        """
+        Gives a node the ID and version recorded for its key, if its write
+        completed in an earlier run.
+
+        Args:
+            node (Base): The node.
+            key (str): The key of its write.
+
+        Returns:
+            True if the node was restored, False otherwise.
+        """
+        found = self.lookup(key)
+
+        if found is None:
+            return False
+
+        (node_id, version) = found
+        node._set_id(node_id)
+
+        if version is not None:
+            node._version = version
+
+        return True
+
+    def in_flight(self):
+        """
+        Returns the records of the writes that were planned but neither
+        saved nor failed. They may or may not have reached the server.
+        """
+        return [self._planned[key] for key in sorted(self._planned)]
+
+    def failures(self):
+        """ Returns the records of the writes whose last attempt failed. """
+        return [self._failed[key] for key in sorted(self._failed)]
@@ -0,0 +1,360 @@
+"""
+A local index from natural keys to OSDF IDs, for idempotent loads.
+
+Most iHMP nodes carry an identifier assigned by the submitting center:
+the rand_subject_id of a subject, the visit_id of a visit, the name or
+int_sample_id of a sample and the prep_id of a prep. A KeyIndex maps these
+natural keys to the ID, version and a digest of the content of the node
+holding them. It is built with one scan per node type and kept current by
+the upserts made through it and, once attached, by every save and delete
+made through the session.
+
+KeyIndex.upsert() then decides without querying the server whether a node
+is new (insert), known but changed (edit) or known and unchanged (nothing
+to write):
+
+    index = KeyIndex.from_namespace(node_types=["subject", "visit"])
+
+    for subject in subjects:
+        index.upsert(subject)
+
+A key is a property name, a dotted path such as 'linkage.by', or a tuple of
+those for composite keys, like ('visit_id', 'linkage.by') for visit IDs
+that are only unique per subject.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+
+from cutlass.Base import Base
+from cutlass.iHMPSession import iHMPSession
+from cutlass.local import field_values
+
+# pylint: disable=C0111, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# The natural keys of each node type. The first one is used by default.
+NATURAL_KEYS = {
+    "16s_dna_prep": ["prep_id"],
+    "host_assay_prep": ["prep_id"],
+    "host_seq_prep": ["prep_id"],
+    "microb_assay_prep": ["prep_id"],
+    "sample": ["name", "int_sample_id"],
+    "subject": ["rand_subject_id"],
+    "visit": ["visit_id"],
+    "wgs_dna_prep": ["prep_id"]
+}
+
+def key_value(doc, key):
+    """
+    Returns the value of a natural key in a document, or None if the
+    document does not have it.
+
+    Args:
+        doc (dict): The OSDF document.
+        key (str or tuple): The key: a field, or a tuple of fields.
+
+    Returns:
+        The value, a tuple of values for a composite key, or None.
+    """
+    fields = key if isinstance(key, tuple) else (key,)
+    parts = []
+
+    for field in fields:
+        values = field_values(doc, field)
+
+        if not values:
+            return None
+
+        parts.append(values[0] if len(values) == 1 else tuple(sorted(values)))
+
+    return parts[0] if len(parts) == 1 else tuple(parts)
+
+def content_digest(doc):
+    """
+    Returns a digest of the properties and linkage of a document, ignoring
+    its ID, version and any property that is not set.
+    """
+    meta = dict((name, value) for (name, value) in doc.get('meta', {}).items()
+                if value is not None)
+    linkage = dict((relation, sorted(ids)) for (relation, ids) in
+                   doc.get('linkage', {}).items() if ids)
+
+    content = {'node_type': doc.get('node_type'), 'meta': meta, 'linkage': linkage}
+
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str)).hexdigest()
+
+class KeyIndex(object):
+    """
+    The OSDF ID, version and content digest of every node, by natural key.
+
+    Attributes:
+        keys (dict): The keys indexed, as lists by node type.
+        duplicates (dict): For each (node type, key, value) held by more
+                           than one node, the IDs of those nodes. Lookups
+                           return the first one indexed.
+    """
+
+    def __init__(self, docs=None, keys=None):
+        """
+        Args:
+            docs (iterable): Optional OSDF documents to index.
+            keys (dict): Node type to a list of keys, replacing the
+                         NATURAL_KEYS of those node types.
+        """
+        self.keys = dict(NATURAL_KEYS)
+        self.keys.update(keys or {})
+        self.duplicates = {}
+
+        # (node type, key, value) -> {'id': ..., 'ver': ..., 'digest': ...}
+        self._entries = {}
+        # node ID -> the (node type, key, value) entries pointing at it
+        self._by_id = {}
+        self._lock = threading.RLock()
+
+        for doc in docs or []:
+            self.add(doc)
+
+    @staticmethod
+    def from_namespace(namespace=Base.namespace, node_types=None, keys=None):
+        """
+        Builds an index with one scan of the namespace per node type.
+
+        Args:
+            namespace (str): The namespace to scan.
+            node_types (list): The node types to index. Defaults to every
+                               node type with a key.
+            keys (dict): Node type to a list of keys, replacing the
+                         NATURAL_KEYS of those node types.
+
+        Returns:
+            A KeyIndex.
+        """
+        # local import to avoid cyclic imports
+        from cutlass.dependency import oql_docs
+        from cutlass import oql
+
+        index = KeyIndex(keys=keys)
+
+        for node_type in sorted(node_types or index.keys.keys()):
+            module_logger.debug("Indexing the keys of the %s nodes.", node_type)
+
+            query = oql.node_type(node_type).to_oql()
+
+            for doc in oql_docs(query, namespace, stream=True):
+                index.add(doc)
+
+        module_logger.info("Indexed %s nodes by their natural keys.", len(index))
+
+        return index
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, node_id):
+        return node_id in self._by_id
+
+    def _key(self, node_type, key):
+        if key is None:
+            keys = self.keys.get(node_type)
+
+            if not keys:
+                raise ValueError("No natural key is known for %s nodes." % node_type)
+
+            return keys[0]
+
+        return key
+
+    def add(self, doc):
+        """ Adds or updates the entries of a document. """
+        node_id = doc['id']
+        node_type = doc.get('node_type')
+        entry = {'id': node_id, 'ver': doc.get('ver'), 'digest': content_digest(doc)}
+
+        with self._lock:
+            self.remove(node_id)
+
+            entries = []
+
+            for key in self.keys.get(node_type, []):
+                value = key_value(doc, key)
+
+                if value is None:
+                    continue
+
+                name = (node_type, key, value)
+                current = self._entries.get(name)
+
+                if current is not None and current['id'] != node_id:
+                    module_logger.warning("Nodes %s and %s share the %s %s.",
+                                          current['id'], node_id, key, value)
+                    self.duplicates.setdefault(name, set([current['id']])).add(node_id)
+                    continue
+
+                self._entries[name] = entry
+                entries.append(name)
+
+            self._by_id[node_id] = entries
+
+    def remove(self, node_id):
+        """ Removes the entries of a node. """
+        with self._lock:
+            for name in self._by_id.pop(node_id, []):
+                del self._entries[name]
+
+    # Listener interface, for iHMPSession.add_listener()
+    def node_saved(self, doc):
+        self.add(doc)
+
+    def node_deleted(self, node_id):
+        self.remove(node_id)
+
+    def attach(self, session=None):
+        """ Keeps the index current with the saves and deletes of a session. """
+        (session or iHMPSession.get_session()).add_listener(self)
+
+    def detach(self, session=None):
+        """ Stops following a session. """
+        (session or iHMPSession.get_session()).remove_listener(self)
+
+    def lookup(self, node_type, value, key=None):
+        """
+        Returns the OSDF ID of the node of a type with a natural key value,
+        or None.
+
+        Args:
+            node_type (str): The node type, for instance 'subject'.
+            value (object): The key value, a tuple for composite keys.
+            key (str or tuple): The key. Defaults to the first key of the
+                                node type.
+
+        Returns:
+            The OSDF ID or None.
+        """
+        entry = self._entries.get((node_type, self._key(node_type, key), value))
+
+        return entry['id'] if entry is not None else None
+
+    def match(self, node, key=None):
+        """
+        Gives a node the ID and version of the indexed node with the same
+        natural key, if there is one.
+
+        Args:
+            node (Base): The node.
+            key (str or tuple): The key. Defaults to the first key of the
+                                node type.
+
+        Returns:
+            'new' if no node has the key, 'changed' if one does but its
+            content differs, 'unchanged' otherwise.
+
+        Exceptions:
+            ValueError: If the node does not have a value for the key.
+        """
+        doc = node._get_raw_doc()
+        node_type = doc['node_type']
+        key = self._key(node_type, key)
+        value = key_value(doc, key)
+
+        if value is None:
+            raise ValueError("%s has no value for the key %s." % (node, key))
+
+        entry = self._entries.get((node_type, key, value))
+
+        if entry is None:
+            return 'new'
+
+        if node.id is not None and node.id != entry['id']:
+            raise ValueError("%s has the %s of node %s." % (node, key, entry['id']))
+
+        node._set_id(entry['id'])
+
+        if entry['ver'] is not None:
+            node._version = entry['ver']
+
+        if content_digest(doc) == entry['digest']:
+            return 'unchanged'
+
+        return 'changed'
+
+    def upsert(self, node, key=None):
+        """
+        Inserts a node, or edits the node with the same natural key. Nothing
+        is written if the indexed node has the same content.
+
+        Args:
+            node (Base): The node. Its links must be IDs.
+            key (str or tuple): The key. Defaults to the first key of the
+                                node type.
+
+        Returns:
+            'inserted', 'updated' or 'unchanged', or None if the save failed.
+
+        Exceptions:
+            ValueError: If the node does not have a value for the key.
+        """
+        state = self.match(node, key)
+
+        if state == 'unchanged':
+            return state
+
+        if not node.save(defer=False):
+            return None
+
+        self.add(node._get_raw_doc())
+
+        return 'inserted' if state == 'new' else 'updated'
+
+    def upsert_all(self, nodes, key=None, workers=8):
+        """
+        Upserts many nodes through save_all(), parents first. The links of
+        the nodes may refer to other, unsaved node objects.
+
+        Args:
+            nodes (list): The nodes.
+            key (str or tuple): The key, for nodes of every type. Defaults
+                                to the first key of each node type.
+            workers (int): The maximum number of concurrent saves.
+
+        Returns:
+            A BulkResult, in which the nodes that did not need to be written
+            have the status 'unchanged'.
+
+        Exceptions:
+            ValueError: If a node does not have a value for its key.
+        """
+        module_logger.debug("In upsert_all.")
+
+        # local import to avoid cyclic imports
+        from cutlass.bulk import save_levels, save_all, _resolve_links
+
+        unchanged = []
+        changed = []
+
+        for level in save_levels(nodes):
+            for node in level:
+                # Links to parents matched so far become their IDs, so the
+                # digest can be compared
+                _resolve_links(node)
+
+                if self.match(node, key) == 'unchanged':
+                    unchanged.append({'node': node, 'status': 'unchanged', 'error': None})
+                else:
+                    changed.append(node)
+
+        result = save_all(changed, workers=workers)
+
+        for outcome in result.results:
+            if outcome['status'] == 'saved':
+                self.add(outcome['node']._get_raw_doc())
+
+        result.results = unchanged + result.results
+
+        return result
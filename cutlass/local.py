@@ -0,0 +1,415 @@
+"""
+An in-memory document store that evaluates OSDF Query Language (OQL)
+queries locally.
+
+Documents held locally, for instance from a cache or a dump, can be loaded
+into a LocalStore. The store keeps secondary indexes on node_type, on every
+linkage relation, on the tags and on any other fields requested, and uses
+them to narrow down the documents a query has to be checked against.
+
+A LocalOSDF wraps a store behind the same interface as the OSDF client, so
+once a session is switched to it with iHMPSession.use_local(), the search()
+and search_iter() methods, count() and the linkage iterators of the node
+classes all run offline.
+
+Matching follows the server's text matching as closely as is practical: a
+"value"[field] term matches when the field equals the value, or when every
+word of the value appears among the words of the field (ignoring case). A
+list field matches if any of its elements does.
+"""
+
+import copy
+import json
+import logging
+import re
+import uuid
+
+from cutlass import oql
+
+# pylint: disable=C0111, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# The fields indexed in addition to the linkage relations.
+DEFAULT_INDEXED_FIELDS = ("id", "node_type", "tags", "meta.tags")
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b
+}
+
+def _words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+def _text(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, basestring):
+        return value
+
+    return str(value)
+
+def field_values(doc, field):
+    """
+    Returns the values found at a dotted path in a document, such as
+    'meta.mixs.biome' or 'linkage.by'. Lists are flattened, so the result
+    is always a list of scalar values. A path that does not start with a
+    top level field is looked up in meta.
+    """
+    parts = field.split(".")
+
+    # Properties can be named without the meta prefix, as in "x"[tags]
+    if parts[0] not in doc and parts[0] in doc.get('meta', {}):
+        parts.insert(0, 'meta')
+
+    values = [doc]
+
+    for part in parts:
+        found = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                if isinstance(item, list):
+                    found.extend(item)
+                else:
+                    found.append(item)
+        values = found
+
+    return [value for value in values if value is not None and
+            not isinstance(value, (dict, list))]
+
+def _text_matches(value, text):
+    value = _text(value)
+
+    if value == text:
+        return True
+
+    wanted = _words(text)
+
+    return len(wanted) > 0 and set(wanted).issubset(_words(value))
+
+def matches(doc, query):
+    """
+    Returns whether a document satisfies a query.
+
+    Args:
+        doc (dict): The OSDF document.
+        query (str or Query): The OQL query, as a string or built terms.
+
+    Returns:
+        True if the document matches, False otherwise.
+    """
+    query = oql.parse(query)
+
+    if isinstance(query, oql.Match):
+        return any([_text_matches(value, query.value)
+                    for value in field_values(doc, query.name)])
+    elif isinstance(query, oql.Compare):
+        compare = COMPARISONS[query.operator]
+        return any([compare(value, query.value)
+                    for value in field_values(doc, query.name)
+                    if isinstance(value, (int, long, float)) and
+                    not isinstance(value, bool)])
+    elif isinstance(query, oql.And):
+        return all([matches(doc, term) for term in query.terms])
+    elif isinstance(query, oql.Or):
+        return any([matches(doc, term) for term in query.terms])
+    elif isinstance(query, oql.Not):
+        return not matches(doc, query.term)
+    elif isinstance(query, oql.Raw):
+        return matches(doc, oql.parse(query.oql))
+
+    raise ValueError("Unsupported query term: %r" % (query,))
+
+class LocalStore(object):
+    """
+    A collection of OSDF documents, keyed by ID, with secondary indexes.
+
+    Attributes:
+        indexed_fields (set): The fields indexed in addition to the linkage
+                              relations.
+    """
+
+    def __init__(self, docs=None, indexed_fields=None):
+        """
+        Args:
+            docs (iterable): Optional documents to add to the store.
+            indexed_fields (list): Extra fields to index, such as
+                                   'meta.body_site' or 'meta.subtype'.
+        """
+        self.indexed_fields = set(DEFAULT_INDEXED_FIELDS)
+        self.indexed_fields.update(indexed_fields or [])
+
+        self._docs = {}
+        # field -> key (an exact value or a word) -> set of IDs
+        self._indexes = {}
+
+        for doc in docs or []:
+            self.add(doc)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, node_id):
+        return node_id in self._docs
+
+    def __iter__(self):
+        return iter(self._docs.values())
+
+    def _is_indexed(self, field):
+        return field in self.indexed_fields or field.startswith("linkage.")
+
+    def _index_keys(self, doc):
+        fields = set(self.indexed_fields)
+        fields.update(["linkage." + relation for relation in doc.get('linkage', {})])
+
+        keys = set()
+
+        for field in fields:
+            for value in field_values(doc, field):
+                text = _text(value)
+                keys.add((field, text))
+                keys.update([(field, word) for word in _words(text)])
+
+        return keys
+
+    def add(self, doc):
+        """
+        Adds a document to the store, replacing any document with the same
+        ID. The document must have an ID.
+        """
+        node_id = doc.get('id')
+
+        if node_id is None:
+            raise ValueError("Documents must have an ID to be stored.")
+
+        if node_id in self._docs:
+            self.remove(node_id)
+
+        self._docs[node_id] = doc
+
+        for (field, key) in self._index_keys(doc):
+            self._indexes.setdefault(field, {}).setdefault(key, set()).add(node_id)
+
+    def remove(self, node_id):
+        """ Removes a document from the store. Returns the removed document. """
+        doc = self._docs.pop(node_id)
+
+        for (field, key) in self._index_keys(doc):
+            ids = self._indexes[field][key]
+            ids.discard(node_id)
+
+            if not ids:
+                del self._indexes[field][key]
+
+        return doc
+
+    def get(self, node_id):
+        """ Returns the document with the given ID, or None. """
+        return self._docs.get(node_id)
+
+    def add_index(self, field):
+        """ Indexes another field, such as 'meta.body_site'. """
+        if field in self.indexed_fields:
+            return
+
+        self.indexed_fields.add(field)
+        index = self._indexes.setdefault(field, {})
+
+        for (node_id, doc) in self._docs.items():
+            for value in field_values(doc, field):
+                text = _text(value)
+                for key in [text] + _words(text):
+                    index.setdefault(key, set()).add(node_id)
+
+    def _candidates(self, query):
+        # The IDs that may match the query according to the indexes, or None
+        # if the indexes cannot narrow the query down.
+        if isinstance(query, oql.Match):
+            if not self._is_indexed(query.name):
+                return None
+
+            index = self._indexes.get(query.name, {})
+            ids = set(index.get(query.value, ()))
+
+            words = _words(query.value)
+            if words:
+                by_word = set(index.get(words[0], ()))
+                for word in words[1:]:
+                    by_word.intersection_update(index.get(word, ()))
+                ids.update(by_word)
+
+            return ids
+        elif isinstance(query, oql.And):
+            found = None
+            for term in query.terms:
+                ids = self._candidates(term)
+                if ids is not None:
+                    found = ids if found is None else found & ids
+            return found
+        elif isinstance(query, oql.Or):
+            found = set()
+            for term in query.terms:
+                ids = self._candidates(term)
+                if ids is None:
+                    return None
+                found.update(ids)
+            return found
+        elif isinstance(query, oql.Raw):
+            return self._candidates(oql.parse(query.oql))
+
+        return None
+
+    def find(self, query):
+        """
+        Returns the documents matching an OQL query, ordered by ID.
+
+        Args:
+            query (str or Query): The OQL query.
+
+        Returns:
+            A list of documents.
+        """
+        query = oql.parse(query)
+        ids = self._candidates(query)
+
+        if ids is None:
+            ids = self._docs.keys()
+
+        return [self._docs[node_id] for node_id in sorted(ids)
+                if matches(self._docs[node_id], query)]
+
+    def count(self, query):
+        """ Returns the number of documents matching an OQL query. """
+        return len(self.find(query))
+
+    def load(self, path):
+        """
+        Adds the documents of a file with one JSON document per line, such
+        as a namespace dump. Returns the number of documents added.
+        """
+        # local import to avoid cyclic imports
+        from cutlass.records import byteify
+
+        added = 0
+
+        with open(path) as dump:
+            for line in dump:
+                if line.strip():
+                    self.add(byteify(json.loads(line)))
+                    added += 1
+
+        return added
+
+    def dump(self, path):
+        """ Writes the documents to a file, one JSON document per line. """
+        with open(path, "w") as dump:
+            for node_id in sorted(self._docs):
+                dump.write(json.dumps(self._docs[node_id], sort_keys=True) + "\n")
+
+class LocalOSDF(object):
+    """
+    A stand-in for the OSDF client that serves requests from a LocalStore.
+    Documents are copied on the way in and out, so callers cannot modify
+    the stored documents by accident. Edits keep the earlier versions, for
+    get_node_by_version(), and are refused if they were made to a version
+    other than the latest.
+
+    Attributes:
+        store (LocalStore): The documents.
+        page_size (int): How many results to return per OQL page. None
+                         returns every result on the first page.
+    """
+
+    def __init__(self, store=None, page_size=None):
+        self.store = store if store is not None else LocalStore()
+        self.page_size = page_size
+        self._history = {}
+
+    def oql_query(self, namespace, query, page=1):
+        module_logger.debug("Evaluating OQL query locally: %s", query)
+
+        docs = [doc for doc in self.store.find(query) if doc.get('ns', namespace) == namespace]
+
+        if self.page_size is None:
+            results = docs if page == 1 else []
+        else:
+            results = docs[(page - 1) * self.page_size:page * self.page_size]
+
+        return {'result_count': len(docs), 'page': page,
+                'results': copy.deepcopy(results)}
+
+    def oql_query_all_pages(self, namespace, query):
+        docs = [doc for doc in self.store.find(query) if doc.get('ns', namespace) == namespace]
+
+        return {'result_count': len(docs), 'page': None, 'results': copy.deepcopy(docs)}
+
+    def get_node(self, node_id):
+        doc = self.store.get(node_id)
+
+        if doc is None:
+            raise Exception("Unable to retrieve node %s." % node_id)
+
+        return copy.deepcopy(doc)
+
+    def get_node_by_version(self, node_id, version):
+        doc = self.store.get(node_id)
+
+        if doc is not None and doc.get('ver') == version:
+            return copy.deepcopy(doc)
+
+        if version in self._history.get(node_id, {}):
+            return copy.deepcopy(self._history[node_id][version])
+
+        raise Exception("Unable to retrieve version %s of node %s." % (version, node_id))
+
+    def validate_node(self, json_data):
+        # Serialized like the client does, so documents it cannot send fail
+        json.dumps(json_data)
+
+        return (True, None)
+
+    def insert_node(self, json_data):
+        doc = copy.deepcopy(json_data)
+        doc['id'] = uuid.uuid4().hex
+        doc['ver'] = 1
+
+        self.store.add(doc)
+
+        return doc['id']
+
+    def edit_node(self, json_data):
+        if 'id' not in json_data:
+            raise Exception("No node id specified in document.")
+
+        current = self.store.get(json_data['id'])
+
+        if current is None:
+            raise Exception("Unable to edit node %s: not found." % json_data['id'])
+
+        # Like the server, refuse edits made to an earlier version
+        if json_data.get('ver', current.get('ver', 1)) != current.get('ver', 1):
+            raise Exception("Unable to edit node %s: version %s is not the latest (%s)." %
+                            (json_data['id'], json_data['ver'], current.get('ver', 1)))
+
+        self._history.setdefault(current['id'], {})[current.get('ver', 1)] = current
+
+        doc = copy.deepcopy(json_data)
+        doc['ver'] = current.get('ver', 1) + 1
+
+        self.store.add(doc)
+
+    def delete_node(self, node_id):
+        if node_id not in self.store:
+            raise Exception("Unable to delete node %s: not found." % node_id)
+
+        self.store.remove(node_id)
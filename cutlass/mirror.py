@@ -0,0 +1,312 @@
+"""
+An incrementally synchronized local mirror of an OSDF namespace.
+
+A Mirror keeps the documents of a namespace in a LocalStore, together with
+the version and count information needed to refresh it. Each sync() scans
+the namespace one node type at a time, with the result pages of a type
+fetched concurrently, and applies only the differences: documents that are
+new, documents whose 'ver' changed and documents that disappeared.
+
+OSDF cannot list node versions without their documents, so changed types
+are still read in full; what the mirror saves is the work of rewriting and
+re-indexing unchanged documents. With quick=True, types whose result_count
+is unchanged since the previous sync are not scanned at all, which finds
+insertions and deletions but can miss edits.
+
+Result pages have no stable order, so a document inserted or deleted
+upstream during a scan can shift the pages and hide another document. A
+document is therefore only deleted from the mirror if the count of its
+type did not change during the scan and the document itself can no
+longer be retrieved.
+
+When given a directory, the mirror persists itself there:
+
+    docs.jsonl.gz   the documents as of the last completed sync
+    changes.jsonl   the changes applied since, one JSON record per line
+    state.json      the per type counts and the progress of the current run
+
+The changes are appended as each node type completes, so an interrupted
+sync resumes with the next node type instead of starting over.
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+from cutlass.Base import Base
+from cutlass.iHMPSession import iHMPSession
+from cutlass.local import LocalStore
+from cutlass.records import byteify
+
+# pylint: disable=W0703, C1801
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+DOCS_FILE = "docs.jsonl.gz"
+CHANGES_FILE = "changes.jsonl"
+STATE_FILE = "state.json"
+
+def _fetch_page(args):
+    (namespace, query, page) = args
+    osdf = iHMPSession.get_session().get_osdf()
+
+    return osdf.oql_query(namespace, query, page=page)['results']
+
+class Mirror(object):
+    """
+    A local copy of the documents of a namespace, refreshed with sync().
+
+    Attributes:
+        store (LocalStore): The mirrored documents, which can be queried
+                            directly or served with iHMPSession.use_local().
+        namespace (str): The mirrored namespace.
+        path (str): The directory the mirror is persisted in, or None.
+    """
+
+    def __init__(self, path=None, namespace=Base.namespace, indexed_fields=None):
+        """
+        Args:
+            path (str): Optional directory to persist the mirror in. An
+                        existing mirror in the directory is loaded.
+            namespace (str): The namespace to mirror.
+            indexed_fields (list): Extra fields for the store to index.
+        """
+        self.path = path
+        self.namespace = namespace
+        self.store = LocalStore(indexed_fields=indexed_fields)
+        self._counts = {}
+        self._run = None
+
+        if path is not None:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file(STATE_FILE)):
+            with open(self._file(STATE_FILE)) as handle:
+                state = byteify(json.load(handle))
+
+            self.namespace = state.get('namespace', self.namespace)
+            self._counts = state.get('counts', {})
+            self._run = state.get('run')
+
+        if os.path.exists(self._file(DOCS_FILE)):
+            with gzip.open(self._file(DOCS_FILE), "rb") as handle:
+                for line in handle:
+                    if line.strip():
+                        self.store.add(byteify(json.loads(line)))
+
+        if os.path.exists(self._file(CHANGES_FILE)):
+            with open(self._file(CHANGES_FILE)) as handle:
+                for line in handle:
+                    if line.strip():
+                        self._apply(byteify(json.loads(line)))
+
+        module_logger.info("Loaded a mirror of %s documents.", len(self.store))
+
+    def _apply(self, change):
+        if change['op'] == 'put':
+            self.store.add(change['doc'])
+        elif change['id'] in self.store:
+            self.store.remove(change['id'])
+
+    def _save_state(self):
+        if self.path is None:
+            return
+
+        state = {'namespace': self.namespace, 'counts': self._counts, 'run': self._run}
+        temp = self._file(STATE_FILE + ".tmp")
+
+        with open(temp, "w") as handle:
+            json.dump(state, handle, sort_keys=True)
+
+        os.rename(temp, self._file(STATE_FILE))
+
+    def _log(self, changes):
+        if self.path is None or not changes:
+            return
+
+        with open(self._file(CHANGES_FILE), "a") as handle:
+            for change in changes:
+                handle.write(json.dumps(change, sort_keys=True) + "\n")
+
+    def compact(self):
+        """
+        Rewrites the document file with the current documents and empties
+        the change log. Called at the end of every completed sync.
+        """
+        if self.path is None:
+            return
+
+        temp = self._file(DOCS_FILE + ".tmp")
+
+        with gzip.open(temp, "wb") as handle:
+            for doc in sorted(self.store, key=lambda doc: doc['id']):
+                handle.write(json.dumps(doc, sort_keys=True) + "\n")
+
+        os.rename(temp, self._file(DOCS_FILE))
+
+        if os.path.exists(self._file(CHANGES_FILE)):
+            os.remove(self._file(CHANGES_FILE))
+
+    def _sync_type(self, node_type, quick, workers):
+        # local import to avoid cyclic imports
+        from cutlass import oql
+
+        query = oql.node_type(node_type).to_oql()
+        stats = {'added': 0, 'changed': 0, 'deleted': 0, 'unchanged': 0,
+                 'pages': 1, 'skipped': False, 'incomplete': False}
+
+        osdf = iHMPSession.get_session().get_osdf()
+        first = osdf.oql_query(self.namespace, query, page=1)
+        total = first['result_count']
+
+        local_ids = set(doc['id'] for doc in self.store.find(query))
+
+        if quick and self._counts.get(node_type) == total == len(local_ids):
+            stats['skipped'] = True
+            stats['unchanged'] = total
+            return stats
+
+        pages = [first['results']]
+        page_size = len(first['results'])
+
+        if page_size > 0 and total > page_size:
+            count = (total + page_size - 1) // page_size
+            stats['pages'] = count
+
+            pool = ThreadPool(max(1, min(workers, count - 1)))
+            try:
+                pages.extend(pool.map(_fetch_page, [(self.namespace, query, page)
+                                                    for page in range(2, count + 1)]))
+            finally:
+                pool.close()
+                pool.join()
+
+        changes = []
+        seen = set()
+
+        for results in pages:
+            for doc in results:
+                if doc['id'] in seen:
+                    continue
+                seen.add(doc['id'])
+
+                current = self.store.get(doc['id'])
+
+                if current is None:
+                    stats['added'] += 1
+                elif current.get('ver') != doc.get('ver'):
+                    stats['changed'] += 1
+                else:
+                    stats['unchanged'] += 1
+                    continue
+
+                changes.append({'op': 'put', 'doc': doc})
+
+        # OQL results have no stable order, so documents inserted or deleted
+        # while the pages are read shift the later pages: a document can be
+        # missed and look deleted. Deletions are only applied if the count
+        # did not change during the scan, and each one is confirmed.
+        missing = sorted(local_ids - seen)
+        end_total = osdf.oql_query(self.namespace, query, page=1)['result_count']
+
+        if end_total != total or len(seen) < total:
+            module_logger.warning("The %s nodes changed during the sync (%s, then %s, "
+                                  "with %s read). Not applying deletions.",
+                                  node_type, total, end_total, len(seen))
+            stats['incomplete'] = True
+            missing = []
+        elif missing:
+            # local import to avoid cyclic imports
+            from cutlass.dependency import fetch_docs
+
+            found = fetch_docs(missing, workers=workers)
+
+            for node_id in missing:
+                if node_id in found:
+                    doc = found[node_id]
+
+                    if doc.get('ver') != self.store.get(node_id).get('ver'):
+                        stats['changed'] += 1
+                        changes.append({'op': 'put', 'doc': doc})
+                    else:
+                        stats['unchanged'] += 1
+
+            missing = [node_id for node_id in missing if node_id not in found]
+
+        for node_id in missing:
+            stats['deleted'] += 1
+            changes.append({'op': 'delete', 'id': node_id})
+
+        for change in changes:
+            self._apply(change)
+
+        self._log(changes)
+
+        # An incomplete scan is not trusted by a later quick sync
+        if stats['incomplete']:
+            self._counts.pop(node_type, None)
+        else:
+            self._counts[node_type] = total
+
+        return stats
+
+    def sync(self, node_types=None, quick=False, workers=8):
+        """
+        Brings the mirror up to date with the namespace. If a previous sync
+        was interrupted, the node types it completed are not scanned again.
+
+        Args:
+            node_types (list): The node types to mirror. Defaults to every
+                               node type known to cutlass.
+            quick (bool): Skip the node types whose result_count has not
+                          changed since the last sync.
+            workers (int): The maximum number of pages fetched at once.
+
+        Returns:
+            A dictionary of node type to the numbers of documents added,
+            changed, deleted and unchanged, and the pages read. A type is
+            'incomplete' if its nodes changed while it was scanned, in which
+            case the deletions were not applied and it is scanned again by
+            the next sync, even a quick one.
+        """
+        module_logger.debug("In sync.")
+
+        # local import to avoid cyclic imports
+        from cutlass.dependency import node_loaders
+
+        node_types = sorted(node_types or node_loaders.keys())
+
+        if self._run is None or self._run.get('types') != node_types:
+            self._run = {'types': node_types, 'done': [], 'started': time.time()}
+            self._save_state()
+
+        results = {}
+
+        for node_type in node_types:
+            if node_type in self._run['done']:
+                continue
+
+            results[node_type] = self._sync_type(node_type, quick, workers)
+
+            self._run['done'].append(node_type)
+            self._save_state()
+
+            module_logger.info("Synchronized %s: %s", node_type, results[node_type])
+
+        self._run = None
+        self.compact()
+        self._save_state()
+
+        return results
@@ -0,0 +1,354 @@
+"""
+A small builder for OSDF Query Language (OQL) queries.
+
+Queries are assembled from predicates and combined with the & (and),
+| (or) and ~ (not) operators:
+
+    query = node_type("sample") & (field("meta.supersite", "oral") |
+                                   field("meta.supersite", "skin"))
+
+The queries compile to escaped OQL with to_oql(). The output is canonical:
+nested conjunctions and disjunctions are flattened, duplicate terms are
+dropped and the terms are sorted. Two logically identical queries built in
+a different order therefore produce the same string, which makes the
+output usable as a cache key.
+
+parse() reads an OQL string back into the same terms, which allows the
+queries to be evaluated without a server (see the local module).
+"""
+
+import re
+
+# pylint: disable=C0111
+
+FIELD_PATTERN = re.compile(r'^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$')
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=")
+
+def _check_field(name):
+    if not isinstance(name, basestring) or not FIELD_PATTERN.match(name):
+        raise ValueError("Invalid field name: %r" % (name,))
+
+    return name
+
+def quote(value):
+    """
+    Returns the value as an OQL string literal, with any backslashes and
+    double quotes escaped.
+    """
+    if not isinstance(value, basestring):
+        raise ValueError("Invalid value provided. Must be a string.")
+
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class Query(object):
+    """
+    The parent class of all the query terms. Terms are immutable, and they
+    compare and hash by their canonical OQL form.
+    """
+
+    def to_oql(self):
+        """ Returns the canonical OQL string for the query. """
+        raise NotImplementedError()
+
+    def _operand(self):
+        # How the term is written when it is nested inside another term
+        return self.to_oql()
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and self.to_oql() == other.to_oql()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.to_oql())
+
+    def __str__(self):
+        return self.to_oql()
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, self.to_oql())
+
+class Match(Query):
+    """ Matches documents whose field contains the given string. """
+
+    def __init__(self, name, value):
+        self.name = _check_field(name)
+        self.value = value
+        # Concatenated, as a str format would fail on non-ASCII unicode values
+        self._oql = quote(value) + "[" + self.name + "]"
+
+    def to_oql(self):
+        return self._oql
+
+class Compare(Query):
+    """ Compares a numeric field with a number. """
+
+    def __init__(self, name, operator, value):
+        if operator not in OPERATORS:
+            raise ValueError("Invalid operator: %r" % (operator,))
+
+        if not isinstance(value, (int, long, float)):
+            raise ValueError("Invalid value provided. Must be a number.")
+
+        self.name = _check_field(name)
+        self.operator = operator
+        self.value = value
+
+        # repr() keeps the precision of floats, but would add an L to longs
+        number = repr(value) if isinstance(value, float) else "%d" % value
+        self._oql = "[{}] {} {}".format(self.name, operator, number)
+
+    def to_oql(self):
+        return self._oql
+
+class Raw(Query):
+    """
+    Wraps an existing OQL string so it can be combined with built terms.
+    The string is kept as is, so it is only canonical if it was already.
+    """
+
+    def __init__(self, oql):
+        if not isinstance(oql, basestring) or not oql.strip():
+            raise ValueError("Invalid query provided. Must be a non-empty string.")
+
+        self.oql = oql.strip()
+
+    def to_oql(self):
+        return self.oql
+
+    def _operand(self):
+        return "(" + self.oql + ")"
+
+class _Compound(Query):
+    separator = None
+
+    def __init__(self, *terms):
+        flat = []
+
+        for term in terms:
+            if isinstance(term, basestring):
+                term = Raw(term)
+
+            if not isinstance(term, Query):
+                raise ValueError("Invalid query term: %r" % (term,))
+
+            # (a && b) && c is the same as a && b && c
+            if type(term) is type(self):
+                flat.extend(term.terms)
+            else:
+                flat.append(term)
+
+        if not flat:
+            raise ValueError("At least one query term is required.")
+
+        unique = {}
+        for term in flat:
+            unique[term._operand()] = term
+
+        self.terms = tuple(unique[key] for key in sorted(unique))
+
+    def to_oql(self):
+        if len(self.terms) == 1:
+            return self.terms[0].to_oql()
+
+        return self.separator.join(term._operand() for term in self.terms)
+
+    def _operand(self):
+        if len(self.terms) == 1:
+            return self.terms[0]._operand()
+
+        return "(" + self.to_oql() + ")"
+
+class And(_Compound):
+    """ Matches documents that satisfy all of the terms. """
+    separator = " && "
+
+class Or(_Compound):
+    """ Matches documents that satisfy any of the terms. """
+    separator = " || "
+
+class Not(Query):
+    """ Matches documents that do not satisfy the term. """
+
+    def __init__(self, term):
+        if isinstance(term, basestring):
+            term = Raw(term)
+
+        if not isinstance(term, Query):
+            raise ValueError("Invalid query term: %r" % (term,))
+
+        self.term = term
+
+    def to_oql(self):
+        return "!" + self.term._operand()
+
+    def __invert__(self):
+        return self.term
+
+def field(name, value):
+    """ Documents whose field (for instance 'meta.body_site') contains value. """
+    return Match(name, value)
+
+def compare(name, operator, value):
+    """ Documents whose numeric field compares to value, e.g. ('meta.size', '>', 0). """
+    return Compare(name, operator, value)
+
+def node_type(*node_types):
+    """ Documents of any of the given node types. """
+    return Or(*[Match("node_type", value) for value in node_types])
+
+def linkage(relation, *node_ids):
+    """ Documents linking to any of the given IDs through the relation. """
+    return Or(*[Match("linkage." + _check_field(relation), node_id)
+                for node_id in node_ids])
+
+def tag(*tags):
+    """ Documents carrying any of the given tags. """
+    return Or(*[Match("tags", value) for value in tags])
+
+def id_in(node_ids):
+    """ Documents whose OSDF ID is one of the given IDs. """
+    return Or(*[Match("id", node_id) for node_id in node_ids])
+
+def raw(oql):
+    """ An existing OQL string, for combining with built terms. """
+    return Raw(oql)
+
+def canonical(query):
+    """
+    Returns the canonical OQL for a built query. Plain strings are
+    returned stripped but otherwise unchanged.
+    """
+    if isinstance(query, Query):
+        return query.to_oql()
+
+    return Raw(query).to_oql()
+
+TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+      (?P<string>"(?:[^"\\]|\\.)*")
+    | \[\s*(?P<field>[^\]\s]+)\s*\]
+    | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+    | (?P<op>&&|\|\||==|!=|<=|>=|<|>|!|\(|\))
+    )''', re.VERBOSE)
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+
+        if match is None:
+            raise ValueError("Invalid OQL at position %s: %r" % (pos, text[pos:pos + 20]))
+
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+
+    return tokens
+
+class _Parser(object):
+    # Recursive descent over the token list, with the usual precedence:
+    # ! binds tighter than &&, which binds tighter than ||.
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def take(self, kind, value=None):
+        token = self.peek()
+
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise ValueError("Invalid OQL: expected %s, found %r." % (value or kind, token[1]))
+
+        self.pos += 1
+        return token[1]
+
+    def expression(self):
+        terms = [self.conjunction()]
+
+        while self.peek() == ('op', '||'):
+            self.pos += 1
+            terms.append(self.conjunction())
+
+        return terms[0] if len(terms) == 1 else Or(*terms)
+
+    def conjunction(self):
+        terms = [self.unary()]
+
+        while self.peek() == ('op', '&&'):
+            self.pos += 1
+            terms.append(self.unary())
+
+        return terms[0] if len(terms) == 1 else And(*terms)
+
+    def unary(self):
+        if self.peek() == ('op', '!'):
+            self.pos += 1
+            return Not(self.unary())
+
+        return self.primary()
+
+    def primary(self):
+        (kind, value) = self.peek()
+
+        if (kind, value) == ('op', '('):
+            self.pos += 1
+            term = self.expression()
+            self.take('op', ')')
+            return term
+
+        if kind == 'string':
+            self.pos += 1
+            text = re.sub(r'\\(.)', r'\1', value[1:-1])
+            return Match(self.take('field'), text)
+
+        if kind == 'field':
+            self.pos += 1
+            operator = self.take('op')
+            number = self.take('number')
+            number = float(number) if re.search(r'[.eE]', number) else int(number)
+            return Compare(value, operator, number)
+
+        raise ValueError("Invalid OQL: unexpected %r." % (value,))
+
+def parse(text):
+    """
+    Parses an OQL string into query terms.
+
+    Args:
+        text (str): The OQL query, e.g. '"visit"[node_type] && [meta.visit_number] > 2'.
+
+    Returns:
+        The Query for the string.
+
+    Exceptions:
+        ValueError: If the string is not valid OQL.
+    """
+    if isinstance(text, Query):
+        return text
+
+    parser = _Parser(_tokenize(text))
+    query = parser.expression()
+
+    if parser.pos != len(parser.tokens):
+        raise ValueError("Invalid OQL: unexpected %r." % (parser.peek()[1],))
+
+    return query
@@ -0,0 +1,232 @@
+"""
+Answers "all nodes of type X under node Y" questions, such as every
+wgs_raw_seq_set of a study or every abundance_matrix of a subject, with
+set-at-a-time queries instead of walking the graph one node at a time.
+
+The path from the start node to the target type is derived from the
+linkage relations in the dependency module. Each hop then issues one OQL
+query per linkage relation for the whole frontier of parent IDs (split
+into chunks to keep the queries to a reasonable size), with the chunks
+submitted concurrently.
+"""
+
+import logging
+import time
+from multiprocessing.pool import ThreadPool
+
+from cutlass import oql
+from cutlass.dependency import child_relations, node_loaders, node_type_of, \
+                               oql_docs, DEFAULT_WORKERS
+
+# pylint: disable=W0703, C1801
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# How many parent IDs to put in a single linkage query by default.
+DEFAULT_CHUNK_SIZE = 100
+
+class PlanResult(object):
+    """
+    The outcome of a planned search: the target nodes and a record of the
+    work done for each hop.
+
+    Attributes:
+        start_types (list): The node types of the start nodes.
+        target_type (str): The node type that was searched for.
+        nodes (list): The target node objects (or documents, if loading
+                      was disabled).
+        hops (list): One dictionary per hop with the linkage relations
+                     followed, the number and node types of the parent IDs,
+                     the number of queries, round trips (result pages) and
+                     documents, and the time spent.
+    """
+
+    def __init__(self, start_types, target_type):
+        self.start_types = start_types
+        self.target_type = target_type
+        self.nodes = []
+        self.hops = []
+
+    @property
+    def round_trips(self):
+        """ int: The total number of OQL requests made. """
+        return sum([hop['round_trips'] for hop in self.hops])
+
+    def explain(self):
+        """
+        Returns a human readable description of the hops performed.
+        """
+        lines = ["Plan: {} -> {}".format(", ".join(self.start_types), self.target_type)]
+
+        for hop in self.hops:
+            relations = ", ".join(["{} -> {}".format(relation, "/".join(types))
+                                   for (relation, types) in sorted(hop['relations'].items())])
+
+            lines.append("hop {}: {} ({} parents, {} queries, {} round trips, "
+                         "{} documents, {:.2f}s)".format(
+                             hop['hop'], relations, hop['parents'], hop['queries'],
+                             hop['round_trips'], hop['documents'], hop['seconds']))
+
+        lines.append("total: {} hops, {} round trips, {} {} nodes".format(
+            len(self.hops), self.round_trips, len(self.nodes), self.target_type))
+
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.explain()
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _run_query(query):
+    stats = {}
+    docs = list(oql_docs(query, stats=stats))
+
+    return (docs, stats.get('pages', 0))
+
+def iter_levels(start, include_types=None, exclude_types=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS):
+    """
+    Walks down from the start node(s) one level at a time, issuing the
+    linkage queries for each level concurrently. Each node is returned
+    once, at the first level it is reached.
+
+    Args:
+        start (Base or list): The node, or list of nodes, to walk down from.
+                              They must have been saved (have IDs).
+        include_types (list): If provided, only follow the branches that
+                              can lead to one of these node types.
+        exclude_types (list): Node types not to descend into.
+        chunk_size (int): The maximum number of parent IDs per query.
+        workers (int): The maximum number of queries in flight at once.
+
+    Returns:
+        A generator of (hop, docs) tuples, where hop is a dictionary with
+        the statistics of the level (see PlanResult) and docs is the list
+        of documents first reached at that level.
+
+    Exceptions:
+        ValueError: If a start node has no ID or chunk_size is invalid.
+    """
+    if chunk_size < 1:
+        raise ValueError("Invalid chunk_size. Must be a positive integer.")
+
+    starts = start if isinstance(start, (list, tuple)) else [start]
+
+    frontier = {}
+    for node in starts:
+        if node.id is None:
+            raise ValueError("Cannot search under a node without an ID.")
+        frontier[node.id] = node_type_of(node)
+
+    seen = set(frontier)
+    level = 0
+
+    while frontier:
+        by_relation = {}
+
+        for (node_id, node_type) in sorted(frontier.items()):
+            relations = child_relations(node_type, include_types, exclude_types)
+
+            for (relation, child_types) in relations.items():
+                (ids, types) = by_relation.setdefault(relation, ([], set()))
+                ids.append(node_id)
+                types.update(child_types)
+
+        if not by_relation:
+            break
+
+        queries = []
+        for (relation, (ids, types)) in sorted(by_relation.items()):
+            for chunk in _chunks(ids, chunk_size):
+                query = oql.linkage(relation, *chunk) & oql.node_type(*sorted(types))
+                queries.append(query.to_oql())
+
+        hop_start = time.time()
+
+        pool = ThreadPool(max(1, min(workers, len(queries))))
+        try:
+            answers = pool.map(_run_query, queries)
+        finally:
+            pool.close()
+            pool.join()
+
+        level += 1
+        next_frontier = {}
+        docs = []
+        documents = 0
+
+        for (answer, _pages) in answers:
+            documents += len(answer)
+
+            for doc in answer:
+                if doc['id'] in seen:
+                    continue
+                seen.add(doc['id'])
+                docs.append(doc)
+
+                if child_relations(doc['node_type'], include_types, exclude_types):
+                    next_frontier[doc['id']] = doc['node_type']
+
+        hop = {
+            'hop': level,
+            'relations': dict((relation, sorted(types))
+                              for (relation, (_ids, types)) in by_relation.items()),
+            'parents': len(frontier),
+            'parent_types': sorted(set(frontier.values())),
+            'queries': len(queries),
+            'round_trips': sum([pages for (_docs, pages) in answers]),
+            'documents': documents,
+            'seconds': time.time() - hop_start
+        }
+
+        yield (hop, docs)
+
+        frontier = next_frontier
+
+def find_under(start, target_type, chunk_size=DEFAULT_CHUNK_SIZE,
+               workers=DEFAULT_WORKERS, load=True):
+    """
+    Finds every node of the target type below the start node(s).
+
+    Args:
+        start (Base or list): The node, or list of nodes, to search under.
+                              They must have been saved (have IDs).
+        target_type (str): The node type to find, e.g. 'wgs_raw_seq_set'.
+        chunk_size (int): The maximum number of parent IDs per query.
+        workers (int): The maximum number of queries in flight at once.
+        load (bool): Whether to turn the target documents into objects.
+
+    Returns:
+        A PlanResult with the target nodes and the per-hop statistics.
+
+    Exceptions:
+        ValueError: If the target type is unknown or a start node has no ID.
+    """
+    module_logger.debug("In find_under. Target type: %s", target_type)
+
+    if target_type not in node_loaders:
+        raise ValueError("Unknown node type: %s" % target_type)
+
+    starts = start if isinstance(start, (list, tuple)) else [start]
+    result = PlanResult(sorted(set([node_type_of(node) for node in starts])), target_type)
+
+    for (hop, docs) in iter_levels(starts, include_types=[target_type],
+                                   chunk_size=chunk_size, workers=workers):
+        for doc in docs:
+            if doc['node_type'] == target_type:
+                if load:
+                    result.nodes.append(node_loaders[target_type](doc))
+                else:
+                    result.nodes.append(doc)
+
+        result.hops.append(hop)
+
+    module_logger.debug("Found %s %s nodes in %s round trips.", len(result.nodes),
+                        target_type, result.round_trips)
+
+    return result
@@ -0,0 +1,309 @@
+"""
+Compact, read-only views of OSDF documents, and lazily hydrated nodes.
+
+Hydrating a document into a full node object creates a logger, runs every
+property setter and keeps one Python attribute per property. When only a
+few fields are needed, for instance to build a report over hundreds of
+thousands of nodes, a NodeRecord is much cheaper: it keeps a reference to
+the document's data in a handful of slots and performs no validation. A
+record can be promoted to the full node object when needed.
+
+A LazyNode goes one step further for traversals: it holds only the ID,
+the node type and the document, and it becomes the full node object the
+first time one of its properties is read.
+"""
+
+# pylint: disable=C0111
+
+try:
+    TEXT_TYPE = unicode
+except NameError:
+    TEXT_TYPE = None
+
+def byteify(value):
+    """
+    Converts the unicode strings produced by the json module into plain
+    strings, as the OSDF client does, since the node setters only accept
+    str values.
+    """
+    if TEXT_TYPE is None:
+        return value
+
+    if isinstance(value, dict):
+        return dict((byteify(key), byteify(item)) for (key, item) in value.items())
+    elif isinstance(value, list):
+        return [byteify(item) for item in value]
+    elif isinstance(value, TEXT_TYPE):
+        return value.encode('utf-8')
+
+    return value
+
+class MetaView(object):
+    """
+    Read-only, attribute style access to a dictionary. Nested dictionaries
+    are wrapped in turn, so record.meta.mixs.biome works.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data):
+        object.__setattr__(self, '_data', data)
+
+    def __getattr__(self, name):
+        try:
+            return _wrap(self._data[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return _wrap(self._data[name])
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Records are read-only.")
+
+    def get(self, name, default=None):
+        """ Returns the value for the key, or the default if it is absent. """
+        if name in self._data:
+            return _wrap(self._data[name])
+        return default
+
+    def keys(self):
+        return self._data.keys()
+
+    def to_dict(self):
+        """ Returns the underlying dictionary. """
+        return self._data
+
+    def __repr__(self):
+        return "MetaView({!r})".format(self._data)
+
+def _wrap(value):
+    if type(value) is dict:
+        return MetaView(value)
+    return value
+
+class NodeRecord(object):
+    """
+    A lightweight, read-only stand-in for a node object. The OSDF fields
+    are available as attributes (id, version, node_type, links, tags, meta)
+    and any other attribute is looked up in the document's meta section.
+
+    Attributes:
+        id (str): The OSDF ID of the node.
+        version (int): The OSDF version of the node.
+        node_type (str): The node type, for instance 'sample'.
+        links (dict): The linkage of the node.
+        meta (MetaView): The node's properties.
+    """
+    __slots__ = ('id', 'version', 'node_type', 'ns', 'acl', 'links', '_meta')
+
+    def __init__(self, doc):
+        set_slot = object.__setattr__
+        set_slot(self, 'id', doc.get('id'))
+        set_slot(self, 'version', doc.get('ver'))
+        set_slot(self, 'node_type', doc['node_type'])
+        set_slot(self, 'ns', doc.get('ns'))
+        set_slot(self, 'acl', doc.get('acl'))
+        set_slot(self, 'links', doc.get('linkage', {}))
+        set_slot(self, '_meta', doc.get('meta', {}))
+
+    @property
+    def meta(self):
+        """ MetaView: Read-only access to the node's properties. """
+        return MetaView(self._meta)
+
+    @property
+    def tags(self):
+        """ list: The node's tags. """
+        return self._meta.get('tags', [])
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not one of the slots
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            return _wrap(self._meta[name])
+        except KeyError:
+            raise AttributeError("{} record has no property '{}'.".format(
+                self.node_type, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Records are read-only. Use promote() to get "
+                             "an editable object.")
+
+    def get(self, path, default=None):
+        """
+        Returns the value at a dotted path, such as 'mixs.biome' (relative
+        to meta) or 'linkage.prepared_from', or the default if it is absent.
+        """
+        parts = path.split('.')
+
+        if parts[0] == 'linkage':
+            value = self.links
+            parts = parts[1:]
+        else:
+            if parts[0] == 'meta':
+                parts = parts[1:]
+            value = self._meta
+
+        for part in parts:
+            if type(value) is not dict or part not in value:
+                return default
+            value = value[part]
+
+        return _wrap(value)
+
+    def to_doc(self):
+        """ Returns the record as an OSDF document dictionary. """
+        doc = {'node_type': self.node_type, 'linkage': self.links, 'meta': self._meta}
+
+        for (key, value) in (('id', self.id), ('ver', self.version),
+                             ('ns', self.ns), ('acl', self.acl)):
+            if value is not None:
+                doc[key] = value
+
+        return doc
+
+    def promote(self):
+        """
+        Returns the full node object for this record, with all of its
+        properties set and validated.
+        """
+        # local import to avoid cyclic imports
+        from cutlass.dependency import node_loaders
+
+        return node_loaders[self.node_type](self.to_doc())
+
+    def __eq__(self, other):
+        return isinstance(other, NodeRecord) and self.id is not None and \
+            self.id == other.id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        if self.id is None:
+            raise TypeError("Unhashable; record has no ID.")
+
+        return hash(self.id)
+
+    def __repr__(self):
+        _id = "no ID" if not self.id else self.id[-8:]
+        return "<{} record ({})>".format(self.node_type, _id)
+
+    __str__ = __repr__
+
+class LazyNode(object):
+    """
+    A placeholder for a node object that defers building and validating it
+    from the document until a property other than id or node_type is used.
+    Reading links uses the document as it is; any other attribute access,
+    including method calls such as save(), hydrates the full object, after
+    which the proxy forwards everything to it.
+
+    The proxy reports the class of the node it stands for, so isinstance()
+    checks against the node classes work without hydrating.
+
+    Attributes:
+        id (str): The OSDF ID of the node.
+        node_type (str): The node type, for instance 'visit'.
+    """
+    __slots__ = ('id', 'node_type', '_doc', '_node')
+
+    def __init__(self, node_id, node_type, doc):
+        if doc is None:
+            raise ValueError("The document of the node is required.")
+
+        set_slot = object.__setattr__
+        set_slot(self, 'id', node_id)
+        set_slot(self, 'node_type', node_type)
+        set_slot(self, '_doc', doc)
+        set_slot(self, '_node', None)
+
+    @staticmethod
+    def from_doc(doc):
+        """ Returns a LazyNode for an already parsed OSDF document. """
+        return LazyNode(doc.get('id'), doc['node_type'], doc=doc)
+
+    @property
+    def links(self):
+        """ dict: The linkage of the node. Does not hydrate the node. """
+        if self._node is not None:
+            return self._node.links
+
+        return self._doc.get('linkage', {})
+
+    def to_doc(self):
+        """
+        Returns the OSDF document for the node, without hydrating it if it
+        has not been hydrated yet.
+        """
+        if self._node is not None:
+            return self._node._get_raw_doc()
+
+        return self._doc
+
+    @property
+    def hydrated(self):
+        """ bool: Whether the full node object has been built yet. """
+        return self._node is not None
+
+    def hydrate(self):
+        """ Builds the full node object, if not done already, and returns it. """
+        if self._node is None:
+            # local import to avoid cyclic imports
+            from cutlass.dependency import node_loaders
+
+            node = node_loaders[self.node_type](self._doc)
+
+            object.__setattr__(self, '_node', node)
+            object.__setattr__(self, '_doc', None)
+
+        return self._node
+
+    @property
+    def __class__(self):
+        # local import to avoid cyclic imports
+        from cutlass.dependency import node_classes
+
+        return node_classes[self.node_type]
+
+    def __getattr__(self, name):
+        # Only called for attributes that the proxy itself does not have
+        if name == '_id':
+            return self.id
+
+        return getattr(self.hydrate(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.hydrate(), name, value)
+
+    def __eq__(self, other):
+        return self.id is not None and getattr(other, 'id', None) == self.id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        if self.id is None:
+            raise TypeError("Unhashable; node has no ID.")
+
+        return hash(self.id)
+
+    def __repr__(self):
+        if self._node is not None:
+            return repr(self._node)
+
+        _id = "no ID" if not self.id else self.id[-8:]
+        return "<lazy {} ({})>".format(self.node_type, _id)
+
+    __str__ = __repr__
@@ -0,0 +1,368 @@
+"""
+Export of a node and everything below it to a JSON lines file, and import
+of such a file into another OSDF instance.
+
+export_subtree() walks down from the root one level at a time, with the
+linkage queries of each level issued concurrently, and writes each
+document as soon as every node it links to has been written, so that a
+node follows all of its parents in the file even when it is reachable at
+several depths. Only the IDs written so far, the current level and the
+documents still waiting for a parent are kept in memory; a document
+linking outside the subtree waits until the end. Files whose name ends
+in '.gz' are gzip compressed.
+
+import_subtree() recreates the nodes with new IDs, parents first, rewriting
+the linkage of each document to the new IDs of its parents. Nodes whose
+parents have all been created are inserted concurrently. A node that
+cannot be inserted is reported, and the nodes below it are skipped, while
+the rest of the file is imported. Given a Journal, an interrupted import
+can be run again to insert only what is missing.
+"""
+
+import gzip
+import json
+import logging
+import time
+from multiprocessing.pool import ThreadPool
+
+from cutlass.bulk import BulkResult, delete_levels
+from cutlass.costs import estimate_export
+from cutlass.iHMPSession import iHMPSession
+from cutlass.planner import iter_levels, DEFAULT_CHUNK_SIZE
+from cutlass.dependency import DEFAULT_WORKERS, link_ids
+from cutlass.records import byteify
+
+# pylint: disable=W0703, C1801
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# How many documents to read ahead when importing, by default.
+DEFAULT_BATCH_SIZE = 500
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+
+    return open(path, mode)
+
+def read_docs(path):
+    """
+    Generator over the documents of a JSON lines file, compressed or not.
+    """
+    with _open(path, "rb") as handle:
+        for line in handle:
+            if line.strip():
+                yield byteify(json.loads(line))
+
+def export_subtree(root, path, include_root=True, exclude_types=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Writes the documents of a node and all of its descendants to a JSON
+    lines file, in topological order, so that parents precede their
+    children.
+
+    Args:
+        root (Base): The node at the top of the subtree. It must have an ID.
+        path (str): The file to write. Compressed if it ends in '.gz'.
+        include_root (bool): Whether to write the root node itself.
+        exclude_types (list): Node types not to export or descend into.
+        chunk_size (int): The maximum number of parent IDs per query.
+        workers (int): The maximum number of queries in flight at once.
+        dry_run (bool): Write nothing; only estimate the requests, time and
+                        file size of the export. The subtree is still walked
+                        and its documents retrieved, so a dry run takes
+                        nearly as long as the export.
+
+    Returns:
+        The number of documents written or, for a dry run, a CostEstimate.
+
+    Exceptions:
+        ValueError: If the root node has no ID, or if the links between the
+                    nodes of the subtree form a cycle, in which case the
+                    documents still held back are not written.
+    """
+    module_logger.debug("In export_subtree.")
+
+    if dry_run:
+        return estimate_export(root, include_root=include_root,
+                               exclude_types=exclude_types, chunk_size=chunk_size,
+                               workers=workers)
+
+    if root.id is None:
+        raise ValueError("Cannot export a node without an ID.")
+
+    with _open(path, "wb") as handle:
+        writer = _Writer(handle)
+
+        if include_root:
+            writer.write(iHMPSession.get_session().get_osdf().get_node(root.id))
+        else:
+            writer.written.add(root.id)
+
+        for (hop, docs) in iter_levels(root, exclude_types=exclude_types,
+                                       chunk_size=chunk_size, workers=workers):
+            for doc in docs:
+                writer.add(doc)
+
+            module_logger.debug("Exported level %s: %s documents in %.2fs, %s waiting.",
+                                hop['hop'], len(docs), hop['seconds'], len(writer.held))
+
+        writer.finish()
+
+    module_logger.info("Exported %s documents to %s.", writer.count, path)
+
+    return writer.count
+
+class _Writer(object):
+    # Writes documents parents first. A node found at depth 1 may also hang
+    # below a node found at depth 3, so a document is held back until every
+    # node it links to has been written.
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.count = 0
+        self.written = set()
+        # node ID -> the held documents waiting for it
+        self.waiting = {}
+        # node ID -> [document, number of links not written yet]
+        self.held = {}
+
+    def add(self, doc):
+        """ Writes a document, or holds it back until its parents are written. """
+        missing = [node_id for node_id in link_ids(doc.get('linkage', {}))
+                   if node_id not in self.written and node_id != doc['id']]
+
+        if not missing:
+            self.write(doc)
+            return
+
+        self.held[doc['id']] = [doc, len(missing)]
+
+        for node_id in missing:
+            self.waiting.setdefault(node_id, []).append(doc['id'])
+
+    def write(self, doc):
+        """ Writes a document, then the held documents it was the last parent of. """
+        ready = [doc]
+
+        while ready:
+            doc = ready.pop()
+            self.handle.write(json.dumps(doc, sort_keys=True) + "\n")
+            self.written.add(doc['id'])
+            self.count += 1
+
+            for child_id in self.waiting.pop(doc['id'], []):
+                entry = self.held[child_id]
+                entry[1] -= 1
+
+                if entry[1] == 0:
+                    del self.held[child_id]
+                    ready.append(entry[0])
+
+    def finish(self):
+        """
+        Writes the documents still held, which link to nodes outside the
+        subtree, parents first among themselves.
+        """
+        docs = [doc for (doc, _missing) in self.held.values()]
+        self.held = {}
+        self.waiting = {}
+
+        # delete_levels() only orders by the links within the list
+        for level in reversed(delete_levels(sorted(docs, key=lambda doc: doc['id']))):
+            for doc in level:
+                self.handle.write(json.dumps(doc, sort_keys=True) + "\n")
+                self.written.add(doc['id'])
+                self.count += 1
+
+def _journal_key(doc):
+    # Imports are journaled by the ID of the node in the exported file
+    return "import:{}".format(doc['id'])
+
+class _Importer(object):
+    # Holds the documents waiting for their parents, the ID mapping and the
+    # outcome of each document.
+
+    def __init__(self, snapshot_ids, namespace, keep_external, workers, journal):
+        self.snapshot_ids = snapshot_ids
+        self.namespace = namespace
+        self.keep_external = keep_external
+        self.workers = workers
+        self.journal = journal
+        self.id_map = {}
+        self.not_created = set()
+        self.pending = []
+        self.result = BulkResult()
+        self.result.id_map = self.id_map
+
+    def _blocked(self, doc):
+        for ids in doc.get('linkage', {}).values():
+            for node_id in ids:
+                if node_id in self.not_created:
+                    return True
+        return False
+
+    def _ready(self, doc):
+        for ids in doc.get('linkage', {}).values():
+            for node_id in ids:
+                if node_id in self.snapshot_ids and node_id not in self.id_map:
+                    return False
+        return True
+
+    def _new_doc(self, doc):
+        linkage = {}
+
+        for (relation, ids) in doc.get('linkage', {}).items():
+            new_ids = []
+            for node_id in ids:
+                if node_id in self.id_map:
+                    new_ids.append(self.id_map[node_id])
+                elif self.keep_external:
+                    new_ids.append(node_id)
+            if new_ids:
+                linkage[relation] = new_ids
+
+        new_doc = {
+            'node_type': doc['node_type'],
+            'ns': self.namespace or doc.get('ns'),
+            'acl': doc.get('acl'),
+            'linkage': linkage,
+            'meta': doc.get('meta', {})
+        }
+
+        return new_doc
+
+    def add(self, doc):
+        """ Queues a document, unless the journal has it as imported. """
+        if self.journal is not None:
+            found = self.journal.lookup(_journal_key(doc))
+            if found is not None:
+                self.id_map[doc['id']] = found[0]
+                self.result.results.append({'node': doc['id'], 'id': found[0],
+                                            'status': 'resumed', 'error': None})
+                return
+
+        self.pending.append(doc)
+
+    def _insert(self, doc):
+        osdf = iHMPSession.get_session().get_osdf()
+        key = _journal_key(doc)
+
+        if self.journal is not None:
+            self.journal.planned(key, node_type=doc['node_type'])
+
+        try:
+            node_id = osdf.insert_node(self._new_doc(doc))
+        except Exception as insert_exception:
+            if self.journal is not None:
+                self.journal.failed(key, str(insert_exception), node_type=doc['node_type'])
+            return {'node': doc['id'], 'id': None, 'status': 'failed',
+                    'error': str(insert_exception)}
+
+        if self.journal is not None:
+            self.journal.saved(key, node_id, 1, node_type=doc['node_type'])
+
+        return {'node': doc['id'], 'id': node_id, 'status': 'saved', 'error': None}
+
+    def skip(self, doc, error):
+        """ Reports a document as not imported, with those below it. """
+        self.not_created.add(doc['id'])
+        self.result.results.append({'node': doc['id'], 'id': None,
+                                    'status': 'skipped', 'error': error})
+
+    def flush(self):
+        """ Inserts every pending document whose parents now exist. """
+        while self.pending:
+            blocked = [doc for doc in self.pending if self._blocked(doc)]
+
+            if blocked:
+                for doc in blocked:
+                    self.skip(doc, "A linked node was not imported.")
+                self.pending = [doc for doc in self.pending if not self._blocked(doc)]
+                continue
+
+            ready = [doc for doc in self.pending if self._ready(doc)]
+
+            if not ready:
+                break
+
+            pending = [doc for doc in self.pending if not self._ready(doc)]
+
+            pool = ThreadPool(max(1, min(self.workers, len(ready))))
+            try:
+                outcomes = pool.map(self._insert, ready)
+            finally:
+                pool.close()
+                pool.join()
+
+            for outcome in outcomes:
+                if outcome['status'] == 'saved':
+                    self.id_map[outcome['node']] = outcome['id']
+                else:
+                    self.not_created.add(outcome['node'])
+
+            self.result.results.extend(outcomes)
+            self.result.levels.append(len(ready))
+            self.pending = pending
+
+def import_subtree(path, namespace=None, keep_external=True,
+                   batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, journal=None):
+    """
+    Recreates the nodes of a file written by export_subtree() through the
+    current session, giving them new IDs and remapping the linkage.
+
+    The file is read twice: once for the IDs it contains and once for the
+    documents, which are inserted in waves as their parents are created.
+    A document that cannot be inserted does not stop the import: it is
+    reported as failed, and the documents below it as skipped.
+
+    Args:
+        path (str): The file to read. Decompressed if it ends in '.gz'.
+        namespace (str): The namespace of the new nodes. Defaults to the
+                         namespace of each document.
+        keep_external (bool): Whether to keep links to nodes outside the
+                              file as they are, or to drop them.
+        batch_size (int): How many documents to read before inserting.
+        workers (int): The maximum number of concurrent inserts.
+        journal (Journal): Optional journal to record the inserts in. The
+                           documents it records as imported by an earlier,
+                           interrupted run are not inserted again.
+
+    Returns:
+        A BulkResult with one entry per document, whose 'node' is the ID in
+        the file and 'id' the new ID, or None if it was not created. Its
+        id_map attribute is a dictionary of old node ID to new node ID.
+    """
+    module_logger.debug("In import_subtree.")
+
+    start = time.time()
+
+    snapshot_ids = set(doc['id'] for doc in read_docs(path))
+
+    importer = _Importer(snapshot_ids, namespace, keep_external, workers, journal)
+
+    for doc in read_docs(path):
+        importer.add(doc)
+
+        if len(importer.pending) >= batch_size:
+            importer.flush()
+
+    importer.flush()
+
+    # Whatever still waits links to nodes of the file in a cycle
+    for doc in importer.pending:
+        importer.skip(doc, "Its parents in the file form a linkage cycle.")
+
+    result = importer.result
+    result.seconds = time.time() - start
+
+    if not result.ok:
+        module_logger.warning("Could not import %s of the documents in %s.",
+                              result.count('failed') + result.count('skipped'), path)
+
+    module_logger.info("Imported from %s: %s.", path, result)
+
+    return result
@@ -0,0 +1,269 @@
+"""
+Incremental parsing of OSDF Query Language (OQL) responses.
+
+The OSDF client reads a whole page of query results, parses it into one
+large dictionary and only then hands it over. For pages of big documents
+(subject_attr or proteome nodes, for instance) that doubles the peak memory
+use and delays the first result until the last byte has arrived.
+
+This module instead reads the response body in fixed size chunks and parses
+the "results" array one document at a time, so that each document can be
+turned into a node while the rest of the page is still being received. The
+other top level values of the response, such as result_count, are collected
+into a dictionary as they are encountered.
+
+Streamed queries bypass the session's wrapper around the OSDF client, so
+stream_oql() records their timing in the session's RequestStats itself.
+Only the time spent requesting and parsing counts, not the time the caller
+spends between documents.
+"""
+
+import httplib
+import json
+import logging
+import time
+from base64 import b64encode
+from json.decoder import scanstring
+
+from osdf import OSDF
+
+from cutlass.records import byteify
+
+# pylint: disable=C0111, R0912
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# How many bytes of the response to read at a time by default.
+DEFAULT_CHUNK_SIZE = 65536
+
+WHITESPACE = " \t\n\r"
+
+class _Reader(object):
+    """
+    A buffer over an iterator of text chunks. Consumed text is dropped from
+    the buffer, so it never holds much more than the current document.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """ Reads the next chunk. Returns False at the end of the input. """
+        if self.eof:
+            return False
+
+        for chunk in self._chunks:
+            if chunk:
+                self.buf = self.buf[self.pos:] + chunk
+                self.pos = 0
+                return True
+
+        self.eof = True
+        return False
+
+    def peek(self):
+        """ Returns the next character that is not whitespace, or None at the end. """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if not self.more():
+                return None
+
+    def expect(self, chars):
+        char = self.peek()
+
+        if char is None or char not in chars:
+            raise ValueError("Malformed OQL response: expected %r, found %r."
+                             % (chars, char))
+
+        self.pos += 1
+        return char
+
+    def key(self):
+        self.expect('"')
+
+        while True:
+            try:
+                (key, end) = scanstring(self.buf, self.pos)
+                self.pos = end
+                return key
+            except ValueError:
+                if not self.more():
+                    raise ValueError("Malformed OQL response: truncated key.")
+
+    def value(self, decoder):
+        self.peek()
+
+        while True:
+            try:
+                (value, end) = decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+
+            # A number at the very end of the buffer may continue in the
+            # next chunk, so it is only accepted with something after it.
+            if end < len(self.buf) or type(value) not in (int, long, float) \
+               or not self.more():
+                self.pos = end
+                return value
+
+def iter_results(chunks, meta=None):
+    """
+    Parses an OQL response incrementally, yielding the documents of its
+    "results" array one at a time.
+
+    Args:
+        chunks (iterable): The response body, as an iterator of strings.
+        meta (dict): Optional dictionary that receives the other top level
+                     values of the response, such as result_count. It is
+                     complete once the generator is exhausted.
+
+    Returns:
+        An iterator of the documents, with plain (not unicode) strings.
+
+    Exceptions:
+        ValueError: If the response is not a valid JSON object.
+    """
+    if meta is None:
+        meta = {}
+
+    reader = _Reader(chunks)
+    decoder = json.JSONDecoder()
+
+    reader.expect("{")
+
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.key()
+        reader.expect(":")
+
+        if key == "results" and reader.peek() == "[":
+            reader.expect("[")
+
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield byteify(reader.value(decoder))
+
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            meta[byteify(key)] = byteify(reader.value(decoder))
+
+        if reader.expect(",}") == "}":
+            break
+
+def _read_chunks(response, chunk_size):
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def stream_oql(osdf, namespace, query, page=1, meta=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Issues an OQL query and yields the documents of the requested page as
+    they are parsed from the response.
+
+    Clients other than the OSDF client (for instance test doubles) are
+    queried with their own oql_query() method instead.
+
+    Args:
+        osdf (OSDF): The OSDF client holding the connection parameters.
+        namespace (str): The OSDF namespace to query.
+        query (str): The OQL query.
+        page (int): The page of results to retrieve.
+        meta (dict): Optional dictionary that receives the result_count and
+                     the other top level values of the response.
+        chunk_size (int): How many bytes to read at a time.
+
+    Returns:
+        An iterator of the documents.
+
+    Exceptions:
+        Exception: If the server rejects the query.
+    """
+    if meta is None:
+        meta = {}
+
+    # The client behind the session's wrapper holds the credentials
+    client = getattr(osdf, 'client', osdf)
+
+    if not isinstance(client, OSDF):
+        data = osdf.oql_query(namespace, query, page=page)
+
+        for (key, value) in data.items():
+            if key != 'results':
+                meta[key] = value
+
+        for doc in data['results']:
+            yield doc
+
+        return
+
+    module_logger.debug("Streaming OQL query, page %s: %s", page, query)
+
+    # local import to avoid cyclic imports
+    from cutlass.iHMPSession import iHMPSession
+
+    stats = iHMPSession.get_session().stats
+    started = time.time()
+    elapsed = 0.0
+    failed = True
+
+    if client.ssl:
+        conn = httplib.HTTPSConnection(client.server, client.port)
+    else:
+        conn = httplib.HTTPConnection(client.server, client.port)
+
+    try:
+        conn.putrequest("POST", "/nodes/oql/%s/page/%s" % (namespace, page))
+        conn.putheader("Authorization", "Basic " +
+                       b64encode('%s:%s' % (client.username, client.password)))
+        conn.putheader("Content-Length", "%d" % len(query))
+        conn.endheaders()
+        conn.send(query)
+
+        response = conn.getresponse()
+
+        if response.status not in (200, 206):
+            reason = response.getheader('x-osdf-error')
+            response.read()
+
+            if reason is not None:
+                raise Exception("Unable to query namespace %s. Reason: %s"
+                                % (namespace, reason))
+
+            raise Exception("Unable to query namespace.")
+
+        for doc in iter_results(_read_chunks(response, chunk_size), meta):
+            elapsed += time.time() - started
+            yield doc
+            started = time.time()
+
+        failed = False
+    except GeneratorExit:
+        # The caller stopped reading early
+        started = time.time()
+        failed = False
+        raise
+    finally:
+        conn.close()
+
+        if stats is not None:
+            stats.record('oql_query', elapsed + time.time() - started, failed=failed)
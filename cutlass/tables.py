@@ -0,0 +1,486 @@
+"""
+Column-wise loading of wide attribute tables, such as the clinical tables
+behind SubjectAttribute and VisitAttribute nodes.
+
+Creating one object per row and calling a setter per cell is slow for
+tables with tens of thousands of rows and dozens of columns. An
+AttributeTable works on whole columns instead. Each column is converted
+and checked in a single pass: its type, and optionally a set of allowed
+values, a numeric range, a date format or a pattern. Every bad cell of
+the table is reported at once. Only a table without problems produces
+documents, which can then be inserted concurrently.
+
+The type of each property and where it goes in the document are worked
+out once per node type, by setting the property on a single instance of
+the node class and looking at the document it produces. The documents of
+a table therefore have the same layout as those the class would save,
+including nested sections such as the DiseaseMeta fields of a visit
+attribute.
+
+    table = AttributeTable.from_file("visits.tsv", "visit_attr",
+                                     rules={"age": {"min": 0, "max": 120}},
+                                     links={"associated_with": "Visit"},
+                                     values={"study": "prediabetes"})
+    for problem in table.problems:
+        print(problem)
+
+    result = table.save()
+"""
+
+import copy
+import logging
+import re
+import time
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+from cutlass.iHMPSession import iHMPSession
+from cutlass.dependency import DEFAULT_WORKERS
+
+# pylint: disable=W0703, W0212
+
+# Create a module logger named after the module
+module_logger = logging.getLogger(__name__)
+# Add a NullHandler for the case if no logging is configured by the application
+module_logger.addHandler(logging.NullHandler())
+
+# The cells accepted for boolean properties, in lower case.
+TRUE_VALUES = frozenset(["true", "t", "yes", "y", "1"])
+FALSE_VALUES = frozenset(["false", "f", "no", "n", "0"])
+
+INT_PATTERN = re.compile(r'^[-+]?\d+$')
+
+# Values that a property setter accepts for each type, used to find the
+# type of the property and where it appears in the document.
+_PROBES = [(str, "\x01probe\x01"), (int, 987654321), (float, 0.987654321),
+           (bool, True)]
+
+# The properties common to every node, which tables do not set per cell.
+_BASE_PROPERTIES = frozenset(["id", "version", "links", "tags"])
+
+_layouts = {}
+
+def _flatten(doc, prefix=()):
+    flat = {}
+
+    for (name, value) in doc.items():
+        if isinstance(value, dict) and value:
+            flat.update(_flatten(value, prefix + (name,)))
+        else:
+            flat[prefix + (name,)] = value
+
+    return flat
+
+def _put(doc, path, value, replace=True):
+    for name in path[:-1]:
+        if not isinstance(doc.get(name), dict):
+            doc[name] = {}
+        doc = doc[name]
+
+    if replace or path[-1] not in doc:
+        doc[path[-1]] = value
+
+def _probe(cls, prop, base):
+    for (kind, sentinel) in _PROBES:
+        node = cls()
+
+        try:
+            setattr(node, prop, sentinel)
+        except Exception:
+            continue
+
+        flat = _flatten(node._get_raw_doc())
+
+        paths = sorted([path for (path, value) in flat.items()
+                        if type(value) is kind and value == sentinel and
+                        base.get(path) != sentinel])
+
+        # Anything else the property brings along, such as the skeleton
+        # of a nested section
+        extras = dict((path, value) for (path, value) in flat.items()
+                      if path not in paths and path not in base)
+
+        return (kind, paths, extras)
+
+    return None
+
+def layout(node_type):
+    """
+    Returns how the properties of a node type map to its documents.
+
+    Args:
+        node_type (str): The node type, for instance 'visit_attr'.
+
+    Returns:
+        A tuple of the document of an empty node, and a dictionary of
+        property name to a tuple of its type, its paths in the document and
+        the other document fields that setting it adds.
+
+    Exceptions:
+        ValueError: If the node type is not known.
+    """
+    if node_type in _layouts:
+        return _layouts[node_type]
+
+    # local import to avoid cyclic imports
+    from cutlass.dependency import node_classes
+
+    if node_type not in node_classes:
+        raise ValueError("Unknown node type: %s" % node_type)
+
+    cls = node_classes[node_type]
+
+    # Some classes only define their properties when first instantiated
+    empty = cls()._get_raw_doc()
+    base = _flatten(empty)
+
+    properties = {}
+
+    for name in dir(cls):
+        attribute = getattr(cls, name, None)
+
+        if isinstance(attribute, property) and attribute.fset is not None and \
+           name not in _BASE_PROPERTIES and not name.startswith("_"):
+            probed = _probe(cls, name, base)
+
+            if probed is not None and probed[1]:
+                properties[name] = probed
+
+    for key in ('id', 'ver'):
+        empty.pop(key, None)
+
+    _layouts[node_type] = (empty, properties)
+
+    return _layouts[node_type]
+
+def _convert(kind, cells):
+    # Converts a column of cells to values. Returns the values and the
+    # indexes and messages of the cells that could not be converted.
+    values = [None] * len(cells)
+    bad = []
+
+    if kind is str:
+        for (index, cell) in enumerate(cells):
+            if cell:
+                values[index] = cell
+    elif kind is int:
+        for (index, cell) in enumerate(cells):
+            if cell:
+                if INT_PATTERN.match(cell):
+                    values[index] = int(cell)
+                else:
+                    bad.append((index, "Not an integer."))
+    elif kind is float:
+        for (index, cell) in enumerate(cells):
+            if cell:
+                try:
+                    values[index] = float(cell)
+                except ValueError:
+                    bad.append((index, "Not a number."))
+    elif kind is bool:
+        for (index, cell) in enumerate(cells):
+            if cell:
+                lowered = cell.lower()
+                if lowered in TRUE_VALUES:
+                    values[index] = True
+                elif lowered in FALSE_VALUES:
+                    values[index] = False
+                else:
+                    bad.append((index, "Not a boolean."))
+
+    return (values, bad)
+
+def _check(rule, values):
+    # Applies the optional checks of a rule to a column of converted values.
+    bad = []
+
+    if 'choices' in rule:
+        choices = frozenset(rule['choices'])
+        bad.extend([(index, "Not one of the allowed values.")
+                    for (index, value) in enumerate(values)
+                    if value is not None and value not in choices])
+
+    if 'min' in rule:
+        bad.extend([(index, "Less than %s." % rule['min'])
+                    for (index, value) in enumerate(values)
+                    if value is not None and value < rule['min']])
+
+    if 'max' in rule:
+        bad.extend([(index, "More than %s." % rule['max'])
+                    for (index, value) in enumerate(values)
+                    if value is not None and value > rule['max']])
+
+    if 'pattern' in rule:
+        pattern = re.compile(rule['pattern'])
+        bad.extend([(index, "Does not match %s." % rule['pattern'])
+                    for (index, value) in enumerate(values)
+                    if value is not None and not pattern.match(str(value))])
+
+    if 'date' in rule:
+        for (index, value) in enumerate(values):
+            if value is not None:
+                try:
+                    datetime.strptime(value, rule['date'])
+                except (TypeError, ValueError):
+                    bad.append((index, "Not a date in the format %s." % rule['date']))
+
+    return bad
+
+class AttributeTable(object):
+    """
+    A table of attribute nodes, converted and checked column by column.
+
+    Attributes:
+        node_type (str): The node type of the rows.
+        rows (int): The number of rows.
+        problems (list): A dictionary per bad cell, with its 'row' (the line
+                         number for tables read from a file), 'column',
+                         'value' and 'error'.
+        ignored (list): The columns that do not map to any property.
+    """
+
+    def __init__(self, node_type, rows, columns=None, rules=None, links=None,
+                 values=None, index=None):
+        """
+        Converts and checks a table.
+
+        Args:
+            node_type (str): The node type, for instance 'subject_attr'.
+            rows (iterable): The rows, as dictionaries of column to cell, or
+                             tuples of a line number and such a dictionary.
+            columns (dict): Property name to column name, for the columns
+                            not named after their property.
+            rules (dict): Property name to further checks of its values:
+                          'choices' (the allowed values), 'min', 'max',
+                          'pattern' (a regular expression) or 'date' (a
+                          strptime format).
+            links (dict): Linkage relation to the column holding the IDs of
+                          the linked nodes. With an index, a (column, node
+                          type) tuple looks up natural keys instead.
+            values (dict): Property values shared by every row.
+            index (KeyIndex): The key index for natural key links.
+
+        Exceptions:
+            ValueError: If the node type is unknown, or a column, rule or
+                        value refers to a property the table cannot set.
+        """
+        self.node_type = node_type
+        self.problems = []
+        self.ignored = []
+
+        (self._empty, self._properties) = layout(node_type)
+
+        self._columns = dict((prop, prop) for prop in self._properties)
+        self._columns.update(columns or {})
+        self._rules = rules or {}
+        self._links = links or {}
+        self._values = {}
+        self._index = index
+
+        for prop in list(self._columns) + list(self._rules) + list(values or {}):
+            if prop not in self._properties:
+                raise ValueError("%s nodes have no property %s that can be loaded "
+                                 "from a table." % (node_type, prop))
+
+        lines = []
+        cells = {}
+
+        for row in rows:
+            if isinstance(row, tuple):
+                (line, row) = row
+            else:
+                line = len(lines) + 1
+
+            lines.append(line)
+
+            for (column, cell) in row.items():
+                # csv.DictReader puts the cells beyond the header under None
+                if column is None:
+                    continue
+
+                column_cells = cells.setdefault(column, [])
+                column_cells.extend([""] * (len(lines) - 1 - len(column_cells)))
+                column_cells.append(cell.strip() if cell else "")
+
+        for column_cells in cells.values():
+            column_cells.extend([""] * (len(lines) - len(column_cells)))
+
+        self.rows = len(lines)
+        self._lines = lines
+
+        start = time.time()
+
+        self._check_values(values or {})
+        self._data = self._convert_columns(cells)
+        self._linkage = self._convert_links(cells)
+
+        used = set(self._columns.values())
+        used.update([link[0] if isinstance(link, tuple) else link
+                     for link in self._links.values()])
+        self.ignored = sorted([column for column in cells if column not in used])
+
+        self.problems.sort(key=lambda problem: (problem['row'], problem['column']))
+
+        module_logger.info("Checked %s %s rows in %.2fs: %s problems.", self.rows,
+                           node_type, time.time() - start, len(self.problems))
+
+    @staticmethod
+    def from_file(path, node_type, delimiter=None, **kwargs):
+        """
+        Reads a table from a CSV or TSV file. The arguments after the node
+        type are those of the constructor.
+        """
+        # local import to avoid cyclic imports
+        from cutlass.ingest import read_manifest
+
+        return AttributeTable(node_type, read_manifest(path, delimiter=delimiter), **kwargs)
+
+    def _bad(self, index, column, value, error):
+        self.problems.append({'row': self._lines[index], 'column': column,
+                              'value': value, 'error': error})
+
+    def _check_values(self, values):
+        for (prop, value) in values.items():
+            kind = self._properties[prop][0]
+
+            if type(value) is not kind:
+                raise ValueError("The value of %s must be a %s." % (prop, kind.__name__))
+
+            self._values[prop] = value
+
+    def _convert_columns(self, cells):
+        data = {}
+
+        for (prop, column) in sorted(self._columns.items()):
+            if column not in cells or prop in self._values:
+                continue
+
+            (values, bad) = _convert(self._properties[prop][0], cells[column])
+
+            if prop in self._rules:
+                bad.extend(_check(self._rules[prop], values))
+
+            for (index, error) in bad:
+                values[index] = None
+                self._bad(index, column, cells[column][index], error)
+
+            data[prop] = values
+
+        return data
+
+    def _convert_links(self, cells):
+        linkage = {}
+
+        for (relation, link) in sorted(self._links.items()):
+            (column, node_type) = link if isinstance(link, tuple) else (link, None)
+
+            if column not in cells:
+                raise ValueError("Missing column: %s" % column)
+
+            ids = list(cells[column])
+
+            for (index, cell) in enumerate(ids):
+                if not cell:
+                    self._bad(index, column, cell, "No linked node.")
+                elif node_type is not None:
+                    ids[index] = self._index.lookup(node_type, cell) \
+                                 if self._index is not None else None
+
+                    if ids[index] is None:
+                        self._bad(index, column, cell, "No %s has this key." % node_type)
+
+            linkage[relation] = ids
+
+        return linkage
+
+    @property
+    def ok(self):
+        """ bool: Whether the table has no bad cells. """
+        return len(self.problems) == 0
+
+    def documents(self):
+        """
+        Returns the OSDF documents of the rows, ready to be inserted.
+
+        Returns:
+            A list of documents, one per row.
+
+        Exceptions:
+            ValueError: If the table has bad cells.
+        """
+        if not self.ok:
+            raise ValueError("The table has %s bad cells." % len(self.problems))
+
+        # The document of every row starts with the shared values
+        template = copy.deepcopy(self._empty)
+        self._fill(template, self._values.items())
+
+        docs = []
+        columns = sorted(self._data.items())
+
+        for index in range(self.rows):
+            doc = copy.deepcopy(template)
+
+            self._fill(doc, [(prop, values[index]) for (prop, values) in columns
+                             if values[index] is not None])
+
+            doc['linkage'] = dict((relation, [ids[index]])
+                                  for (relation, ids) in self._linkage.items())
+            docs.append(doc)
+
+        return docs
+
+    def _fill(self, doc, items):
+        items = list(items)
+
+        for (prop, _value) in items:
+            for (path, extra) in self._properties[prop][2].items():
+                _put(doc, path, extra, replace=False)
+
+        for (prop, value) in items:
+            for path in self._properties[prop][1]:
+                _put(doc, path, value)
+
+    def save(self, workers=DEFAULT_WORKERS):
+        """
+        Inserts the documents of the rows concurrently.
+
+        Args:
+            workers (int): The maximum number of concurrent inserts.
+
+        Returns:
+            A BulkResult, with the documents as the nodes. The documents
+            that were inserted have their new 'id' and 'ver'.
+
+        Exceptions:
+            ValueError: If the table has bad cells.
+        """
+        # local import to avoid cyclic imports
+        from cutlass.bulk import BulkResult
+
+        docs = self.documents()
+        result = BulkResult()
+        start = time.time()
+
+        def insert(doc):
+            try:
+                doc['id'] = iHMPSession.get_session().get_osdf().insert_node(doc)
+                doc['ver'] = 1
+                return {'node': doc, 'status': 'saved', 'error': None}
+            except Exception as insert_exception:
+                return {'node': doc, 'status': 'failed', 'error': str(insert_exception)}
+
+        pool = ThreadPool(max(1, workers))
+
+        try:
+            result.results = pool.map(insert, docs)
+        finally:
+            pool.close()
+            pool.join()
+
+        result.levels.append(len(docs))
+        result.seconds = time.time() - start
+
+        module_logger.info("Saved a %s table: %s", self.node_type, result)
+
+        return result
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+# pylint: disable=C0111, C0325
+
+import argparse
+import logging
+import time
+from cutlass import iHMPSession
+from cutlass.dependency import node_loaders
+
+## input
+parser = argparse.ArgumentParser()
+parser.add_argument('--username', help='OSDF username')
+parser.add_argument('--password', help='OSDF password')
+parser.add_argument('--server', help='OSDF server address')
+parser.add_argument('--ids', help='File with one OSDF node ID per line.')
+parser.add_argument('--workers', type=int, default=8,
+                    help='Number of concurrent lookups for load_many().')
+args = parser.parse_args()
+
+# main program
+logging.basicConfig(level=logging.WARN)
+session = iHMPSession(args.username, args.password, args.server)
+
+with open(args.ids, 'r') as ids_fh:
+    node_ids = [line.strip() for line in ids_fh if line.strip()]
+
+# one get_node() call after another, which is what load() does
+start = time.time()
+n_loaded = 0
+for node_id in node_ids:
+    try:
+        doc = session.get_osdf().get_node(node_id)
+        node_loaders[doc['node_type']](doc)
+        n_loaded = n_loaded + 1
+    except Exception:
+        pass
+serial = time.time() - start
+print("load():      " + str(n_loaded) + " nodes in %.2fs (%.1f nodes/s)" %
+      (serial, n_loaded / serial))
+
+start = time.time()
+(nodes, missing) = session.load_many(node_ids, workers=args.workers)
+batched = time.time() - start
+print("load_many(): " + str(len(nodes)) + " nodes in %.2fs (%.1f nodes/s)" %
+      (batched, len(nodes) / batched))
+print("missing=" + str(len(missing)) + " speedup=%.1fx" % (serial / batched))
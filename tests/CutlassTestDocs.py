@@ -0,0 +1,91 @@
+""" Minimal OSDF documents and a canned OSDF client for offline tests. """
+
+MIXS = {
+    "biome": "blah",
+    "body_product": "blah",
+    "collection_date": "blah",
+    "env_package": "blah",
+    "feature": "blah",
+    "geo_loc_name": "blah",
+    "lat_lon": "blah",
+    "material": "blah",
+    "project_name": "blah",
+    "rel_to_oxygen": "blah",
+    "samp_collect_device": "blah",
+    "samp_mat_process": "blah",
+    "samp_size": "blah",
+    "source_mat_id": ["a", "b", "c"]
+}
+
+class CannedOSDF(object):
+    """
+    Answers OQL queries from a fixed table of responses, and node lookups
+    from a dictionary of documents.
+    """
+
+    def __init__(self, answers=None, docs=None, page_size=None):
+        self.answers = answers or {}
+        self.docs = docs or {}
+        self.page_size = page_size
+        self.queries = []
+        self.gets = []
+
+    def get_node(self, node_id):
+        self.gets.append(node_id)
+
+        if node_id not in self.docs:
+            raise Exception("Unable to retrieve node.")
+
+        return self.docs[node_id]
+
+    def oql_query(self, namespace, query, page=1):
+        self.queries.append(query)
+        answer = self.answers.get(query, [])
+
+        if self.page_size is None:
+            results = answer if page == 1 else []
+        else:
+            results = answer[(page - 1) * self.page_size:page * self.page_size]
+
+        return {'result_count': len(answer), 'page': page, 'results': results}
+
+class CutlassTestDocs(object):
+    """ Builders for minimal, loadable OSDF documents. """
+
+    @staticmethod
+    def doc(node_id, node_type, linkage, meta):
+        meta.setdefault('tags', [])
+        return {'id': node_id, 'ver': 1, 'node_type': node_type, 'ns': 'ihmp',
+                'acl': {'read': ['all'], 'write': ['ihmp']},
+                'linkage': linkage, 'meta': meta}
+
+    @staticmethod
+    def project(node_id):
+        return CutlassTestDocs.doc(node_id, 'project', {},
+                                   {'name': node_id, 'description': 'test',
+                                    'mixs': dict(MIXS)})
+
+    @staticmethod
+    def study(node_id, linkage):
+        return CutlassTestDocs.doc(node_id, 'study', linkage,
+                                   {'name': node_id, 'description': 'test',
+                                    'center': 'Broad Institute',
+                                    'contact': 'test', 'subtype': 'ibd'})
+
+    @staticmethod
+    def subject(node_id, linkage):
+        return CutlassTestDocs.doc(node_id, 'subject', linkage,
+                                   {'rand_subject_id': node_id,
+                                    'gender': 'female'})
+
+    @staticmethod
+    def visit(node_id, linkage):
+        return CutlassTestDocs.doc(node_id, 'visit', linkage,
+                                   {'visit_id': node_id, 'visit_number': 1,
+                                    'interval': 0})
+
+    @staticmethod
+    def sample(node_id, linkage):
+        return CutlassTestDocs.doc(node_id, 'sample', linkage,
+                                   {'fma_body_site': 'test',
+                                    'mixs': dict(MIXS), 'name': node_id})
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+""" A unittest script for the bulk module. """
+
+import unittest
+
+from cutlass import iHMPSession, Project
+from cutlass.bulk import link_changes, save_levels
+from cutlass.dependency import make_node
+from cutlass.local import LocalStore
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+def new_node(doc):
+    """ Returns an unsaved node object for a test document. """
+    node = make_node(doc)
+    node._set_id(None)
+    return node
+
+class BulkTest(unittest.TestCase):
+    """ A unit test class for the bulk module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+        self.osdf = iHMPSession.get_session().use_local(
+            LocalStore([CutlassTestDocs.project("proj1")]))
+
+        self.study = new_node(CutlassTestDocs.study("study1", {"part_of": ["proj1"]}))
+        self.subjects = [new_node(CutlassTestDocs.subject("subject%s" % num,
+                                                          {"participates_in": [self.study]}))
+                         for num in range(3)]
+        self.visits = [new_node(CutlassTestDocs.visit("visit%s" % num,
+                                                      {"by": [self.subjects[num % 3]]}))
+                       for num in range(6)]
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+    def testLevels(self):
+        """ Test the dependency order, including nodes only reached by links. """
+        levels = save_levels(self.visits)
+
+        self.assertEqual([len(level) for level in levels], [1, 3, 6])
+        self.assertTrue(levels[0][0] is self.study)
+        self.assertEqual([visit.visit_id for visit in levels[2]],
+                         ["visit%s" % num for num in range(6)])
+
+        self.study.links = {"part_of": [self.visits[0]]}
+        with self.assertRaises(ValueError):
+            save_levels(self.visits)
+
+    def testSaveAll(self):
+        """ Test saving in order, with the IDs of new parents filled in. """
+        result = iHMPSession.get_session().save_all(self.visits + self.subjects, workers=3)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count('saved'), 10)
+        self.assertEqual(result.levels, [1, 3, 6])
+        self.assertTrue(result.throughput > 0)
+
+        subject = self.osdf.get_node(self.subjects[1].id)
+        self.assertEqual(subject['linkage'], {"participates_in": [self.study.id]})
+        self.assertEqual(self.visits[4].links, {"by": [self.subjects[1].id]})
+
+    def testFailedParent(self):
+        """ Test that the nodes below a node that fails to save are skipped. """
+        self.subjects[0].links = {}
+
+        result = iHMPSession.get_session().save_all(self.visits)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.nodes('failed'), [self.subjects[0]])
+        self.assertEqual(result.nodes('skipped'), [self.visits[0], self.visits[3]])
+        self.assertEqual(result.count('saved'), 7)
+
+    def testRollback(self):
+        """ Test that a failed save deletes the nodes it inserted. """
+        session = iHMPSession.get_session()
+        original = self.osdf.insert_node
+
+        def failing(json_data):
+            if json_data['meta'].get('rand_subject_id') == "subject2":
+                raise Exception("Server error.")
+            return original(json_data)
+
+        self.osdf.insert_node = failing
+
+        result = session.save_all(self.visits, workers=2, rollback=True)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.nodes('failed'), [self.subjects[2]])
+        self.assertEqual(result.count('rolled_back'), 3)
+        self.assertEqual(result.count('skipped'), 6)
+        self.assertTrue(result.rollback.ok)
+        self.assertEqual(result.rollback.levels, [2, 1])
+
+        self.assertEqual([doc['id'] for doc in self.osdf.store], ["proj1"])
+        self.assertTrue(self.study.id is None)
+        self.assertTrue(self.subjects[0].links["participates_in"][0] is self.study)
+
+        self.osdf.insert_node = original
+
+        result = session.save_all(self.visits, rollback=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(self.osdf.store), 11)
+
+    def testUnitOfWork(self):
+        """ Test that saves are deferred, coalesced and written at the end. """
+        session = iHMPSession.get_session()
+        inserts = []
+        original = self.osdf.insert_node
+
+        def counting(json_data):
+            inserts.append(json_data['node_type'])
+            return original(json_data)
+
+        self.osdf.insert_node = counting
+
+        with session.unit_of_work() as unit:
+            for visit in self.visits:
+                self.assertTrue(visit.save())
+            self.subjects[0].save()
+            self.subjects[0].save()
+
+            self.assertEqual(inserts, [])
+            self.assertEqual(len(unit), 7)
+            self.assertEqual(unit.coalesced, 1)
+
+        self.assertTrue(unit.ok)
+        self.assertEqual(len(inserts), 10)
+        self.assertEqual(len(self.osdf.store), 11)
+        self.assertTrue(session.current_unit_of_work() is None)
+
+    def testUnitOfWorkLimits(self):
+        """ Test the periodic flushes and the discarding on errors. """
+        session = iHMPSession.get_session()
+
+        with session.unit_of_work(max_nodes=2) as unit:
+            self.subjects[0].save()
+            self.subjects[1].save()
+            self.assertEqual(len(unit), 0)
+            self.subjects[2].save()
+
+        self.assertEqual([result.count('saved') for result in unit.results], [3, 1])
+        self.assertEqual(len(self.osdf.store), 5)
+
+        with self.assertRaises(RuntimeError):
+            with session.unit_of_work(max_bytes=10 ** 6):
+                self.visits[0].save()
+                raise RuntimeError("Failed.")
+
+        self.assertEqual(len(self.osdf.store), 5)
+        self.assertTrue(self.visits[0].id is None)
+
+    def testSaveAllInUnitOfWork(self):
+        """ Test that bulk saves inside a unit of work are not deferred. """
+        session = iHMPSession.get_session()
+
+        with session.unit_of_work() as unit:
+            self.subjects[0].save()
+
+            result = session.save_all(self.visits[:2], workers=2)
+
+            # The deferred subject is saved with the nodes that need it
+            self.assertTrue(result.ok)
+            self.assertEqual(result.count('saved'), 5)
+            self.assertTrue(self.subjects[1].id is not None)
+            self.assertEqual(len(self.osdf.store), 6)
+
+            self.assertTrue(self.subjects[2].save())
+            self.assertEqual(len(unit), 2)
+            self.assertEqual(len(self.osdf.store), 6)
+
+        self.assertTrue(unit.ok)
+        self.assertEqual(len(self.osdf.store), 7)
+
+    def _load_tree(self):
+        docs = [
+            CutlassTestDocs.project("proj1"),
+            CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+            CutlassTestDocs.study("study2", {"subset_of": ["study1"], "part_of": ["proj1"]}),
+            CutlassTestDocs.subject("subject1", {"participates_in": ["study1", "study2"]}),
+            CutlassTestDocs.visit("visit1", {"by": ["subject1"]}),
+            CutlassTestDocs.sample("sample1", {"collected_during": ["visit1"]}),
+            CutlassTestDocs.project("other")
+        ]
+        for doc in docs:
+            doc['meta']['tags'] = ["test_load"] if doc['id'] != "other" else []
+
+        return iHMPSession.get_session().use_local(LocalStore(docs))
+
+    def testDeleteSubtree(self):
+        """ Test deleting a subtree leaves first, and the dry run. """
+        osdf = self._load_tree()
+        session = iHMPSession.get_session()
+
+        plan = session.delete_subtree(Project.load("proj1"), dry_run=True)
+        self.assertEqual([doc['id'] for doc in plan.nodes('planned')],
+                         ["sample1", "visit1", "subject1", "study2", "study1", "proj1"])
+        self.assertEqual(len(osdf.store), 7)
+
+        result = session.delete_subtree(Project.load("proj1"), workers=3)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count('deleted'), 6)
+        self.assertEqual([doc['id'] for doc in osdf.store], ["other"])
+
+    def testDeleteWhere(self):
+        """ Test that a failed delete blocks the deletion of its parents. """
+        osdf = self._load_tree()
+        original = osdf.delete_node
+
+        def failing(node_id):
+            if node_id == "visit1":
+                raise Exception("Server error.")
+            return original(node_id)
+
+        osdf.delete_node = failing
+
+        result = iHMPSession.get_session().delete_where('"test_load"[tags]')
+
+        self.assertEqual([doc['id'] for doc in result.nodes('failed')], ["visit1"])
+        self.assertEqual([doc['id'] for doc in result.nodes('skipped')],
+                         ["subject1", "study2", "study1", "proj1"])
+        self.assertEqual(sorted(doc['id'] for doc in osdf.store), ["other", "proj1", "study1",
+                                                                   "study2", "subject1",
+                                                                   "visit1"])
+
+    def testLinkChanges(self):
+        """ Test setting, adding and removing links. """
+        linkage = {"computed_from": ["a"], "by": ["subject1"]}
+
+        self.assertEqual(link_changes(linkage, {"add": {"computed_from": ["b", "a"]}}),
+                         {"computed_from": ["a", "b"], "by": ["subject1"]})
+        self.assertEqual(link_changes(linkage, {"set": {"by": []},
+                                                "remove": {"computed_from": ["a"]}}), {})
+        self.assertEqual(linkage, {"computed_from": ["a"], "by": ["subject1"]})
+
+        with self.assertRaises(ValueError):
+            link_changes(linkage, {"replace": {"by": []}})
+
+    def testRelink(self):
+        """ Test relinking in batches, with conflicts reported. """
+        osdf = self._load_tree()
+        osdf.store.add(CutlassTestDocs.visit("visit2", {"by": ["subject1"]}))
+        session = iHMPSession.get_session()
+
+        # Someone else edits study2 between the read and the write
+        original = osdf.get_node
+
+        def racing(node_id):
+            doc = original(node_id)
+            if node_id == "study2" and doc['ver'] == 1:
+                osdf.edit_node(dict(doc, meta=dict(doc['meta'], name="renamed")))
+            return doc
+
+        osdf.get_node = racing
+
+        result = session.relink({
+            "sample1": {"set": {"collected_during": ["visit2"]}},
+            "subject1": {"add": {"participates_in": ["study1"]}},
+            "study2": {"remove": {"subset_of": ["study1"]}},
+            "visit1": {"add": {"by": ["subject2"]}, "ver": 5},
+            "missing": {"add": {"by": ["subject1"]}}
+        }, batch_size=2, workers=3)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.levels, [2, 2, 1])
+        self.assertEqual(result.nodes('failed'), ["missing"])
+        self.assertEqual(result.nodes('relinked'), ["sample1"])
+        self.assertEqual(result.nodes('unchanged'), ["subject1"])
+        self.assertEqual(sorted(result.nodes('conflict')), ["study2", "visit1"])
+
+        docs = dict((outcome['node'], outcome['doc']) for outcome in result.results)
+        self.assertEqual(docs["missing"], None)
+        self.assertEqual(docs["study2"]['meta']['name'], "renamed")
+
+        sample = osdf.store.get("sample1")
+        self.assertEqual((sample['linkage'], sample['ver']),
+                         ({"collected_during": ["visit2"]}, 2))
+        self.assertEqual(docs["sample1"]['ver'], 2)
+
+        study = osdf.store.get("study2")
+        self.assertEqual(study['meta']['name'], "renamed")
+        self.assertEqual(study['linkage']['subset_of'], ["study1"])
+        self.assertEqual(osdf.store.get("visit1")['linkage'], {"by": ["subject1"]})
+
+if __name__ == '__main__':
+    unittest.main()
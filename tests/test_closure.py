@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+""" A unittest script for the closure module. """
+
+import unittest
+
+from cutlass import iHMPSession, Sample
+from cutlass.closure import ClosureIndex
+from cutlass.local import LocalStore
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+class ClosureTest(unittest.TestCase):
+    """ A unit test class for the closure module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+        self.docs = [
+            CutlassTestDocs.project("proj1"),
+            CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+            CutlassTestDocs.subject("subject1", {"participates_in": ["study1"]}),
+            CutlassTestDocs.subject("subject2", {"participates_in": ["study1"]}),
+            CutlassTestDocs.visit("visit1", {"by": ["subject1"]}),
+            CutlassTestDocs.visit("visit2", {"by": ["subject2"]}),
+            CutlassTestDocs.sample("sample1", {"collected_during": ["visit1"]}),
+            CutlassTestDocs.sample("sample2", {"collected_during": ["visit2"]})
+        ]
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+    def testLookups(self):
+        """ Test ancestor, provenance and descendant lookups. """
+        # Children before parents, to exercise the deferred closure
+        index = ClosureIndex(reversed(self.docs))
+
+        self.assertEqual(index.ancestors("sample1"),
+                         ["visit1", "subject1", "study1", "proj1"])
+        self.assertEqual(index.ancestor("sample1", "subject"), "subject1")
+        self.assertEqual(index.provenance("sample2"),
+                         {"visit": ["visit2"], "subject": ["subject2"],
+                          "study": ["study1"], "project": ["proj1"]})
+        self.assertEqual(index.descendants("study1", "sample"), ["sample1", "sample2"])
+        self.assertEqual(len(index.descendants("proj1")), 7)
+        self.assertEqual(index.ancestors("unknown"), [])
+
+    def testIncrementalUpdates(self):
+        """ Test relinking and removing nodes. """
+        index = ClosureIndex(self.docs)
+
+        # Move visit2 to subject1
+        index.add(CutlassTestDocs.visit("visit2", {"by": ["subject1"]}))
+        self.assertEqual(index.ancestor("sample2", "subject"), "subject1")
+        self.assertEqual(index.descendants("subject1", "sample"), ["sample1", "sample2"])
+        self.assertEqual(index.descendants("subject2"), [])
+
+        index.remove("visit1")
+        self.assertEqual(index.ancestors("sample1"), [])
+        self.assertEqual(index.descendants("subject1", "sample"), ["sample2"])
+
+        # Adding it back restores the closure of the nodes below it
+        index.add(self.docs[4])
+        self.assertEqual(index.ancestor("sample1", "study"), "study1")
+
+    def testAttach(self):
+        """ Test that an attached index follows the saves of the session. """
+        session = iHMPSession.get_session()
+        session.use_local(LocalStore(self.docs))
+
+        index = ClosureIndex.from_namespace(node_types=["project", "study", "subject",
+                                                        "visit", "sample"])
+        self.assertEqual(len(index), 8)
+
+        index.attach()
+        try:
+            sample = Sample.load("sample1")
+            sample._set_id(None)
+            sample.links = {"collected_during": ["visit2"]}
+            self.assertTrue(sample.save())
+            self.assertEqual(index.ancestor(sample.id, "subject"), "subject2")
+
+            self.assertTrue(sample.delete())
+            self.assertFalse(sample.id in index)
+        finally:
+            index.detach()
+
+        self.assertEqual(session._listeners, [])
+
+    def testConcurrentSaves(self):
+        """ Test that the saves of a bulk save, made by many threads, are all indexed. """
+        session = iHMPSession.get_session()
+        session.use_local(LocalStore(self.docs))
+
+        index = ClosureIndex(self.docs)
+        index.attach()
+        try:
+            samples = []
+            for num in range(300):
+                sample = Sample.load("sample1")
+                sample._set_id(None)
+                sample.name = "sample%s" % (num + 3)
+                sample.links = {"collected_during": ["visit%s" % (num % 2 + 1)]}
+                samples.append(sample)
+
+            result = session.save_all(samples, workers=8)
+            self.assertTrue(result.ok)
+        finally:
+            index.detach()
+
+        self.assertEqual(len(index), 308)
+        self.assertEqual(len(index.descendants("study1", "sample")), 302)
+        self.assertEqual(len(index.descendants("subject2", "sample")), 151)
+        self.assertEqual(index.ancestor(samples[1].id, "subject"), "subject2")
+
+if __name__ == '__main__':
+    unittest.main()
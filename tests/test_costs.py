@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+""" A unittest script for the costs module. """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession, Project, WgsRawSeqSet
+from cutlass.aspera import aspera
+from cutlass.costs import RequestStats
+from cutlass.dependency import make_node
+from cutlass.local import LocalStore
+from cutlass.snapshot import export_subtree
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+def new_node(doc):
+    """ Returns an unsaved node object for a test document. """
+    node = make_node(doc)
+    node._set_id(None)
+    return node
+
+class CostsTest(unittest.TestCase):
+    """ A unit test class for the costs module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.osdf = iHMPSession.get_session().use_local(LocalStore([
+            CutlassTestDocs.project("proj1"),
+            CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+            CutlassTestDocs.subject("subject1", {"participates_in": ["study1"]}),
+            CutlassTestDocs.subject("subject2", {"participates_in": ["study1"]}),
+            CutlassTestDocs.visit("visit1", {"by": ["subject1"]}),
+            CutlassTestDocs.visit("visit2", {"by": ["subject2"]})
+        ]))
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.stop_stats()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+        shutil.rmtree(self.directory)
+
+    def testStats(self):
+        """ Test that the requests made through the session are timed. """
+        session = iHMPSession.get_session()
+        self.assertTrue(session.get_osdf() is self.osdf)
+
+        stats = session.start_stats()
+        self.assertTrue(session.start_stats() is stats)
+
+        self.osdf.get_node("proj1")
+        self.assertEqual(stats.count('get_node'), 0)
+
+        osdf = session.get_osdf()
+        osdf.get_node("proj1")
+        osdf.get_node("study1")
+
+        with self.assertRaises(Exception):
+            osdf.get_node("missing")
+
+        summary = stats.summary()
+        self.assertEqual(summary['get_node']['count'], 3)
+        self.assertEqual(summary['get_node']['failures'], 1)
+        self.assertTrue(stats.mean('get_node') >= 0)
+        self.assertEqual(stats.mean('insert_node', 1.5), 1.5)
+
+        session._record_upload("reads.fastq", 1000, 2.0, True)
+        self.assertEqual(stats.rate(), 500)
+
+        self.assertTrue(session.stop_stats() is stats)
+        self.assertTrue(session.stats is None)
+        self.assertTrue(session.get_osdf() is self.osdf)
+        self.assertFalse(session._record_upload in aspera.upload_listeners)
+
+    def testSave(self):
+        """ Test the estimate of a bulk save, and that nothing is written. """
+        path = os.path.join(self.directory, "reads.fastq")
+        with open(path, "w") as handle:
+            handle.write("@read\n" * 100)
+
+        subjects = [new_node(CutlassTestDocs.subject("subject%s" % num,
+                                                     {"participates_in": ["study1"]}))
+                    for num in range(3, 5)]
+        visits = [new_node(CutlassTestDocs.visit("visit%s" % num, {"by": [subjects[num % 2]]}))
+                  for num in range(3, 7)]
+        edited = make_node(self.osdf.get_node("visit1"))
+
+        seq_set = WgsRawSeqSet()
+        seq_set.local_file = path
+        seq_set.links = {"sequenced_from": ["prep1"]}
+
+        result = iHMPSession.get_session().save_all(visits + [edited, seq_set], workers=4,
+                                                     dry_run=True)
+
+        self.assertEqual(result.count('planned'), 8)
+        self.assertEqual(len(self.osdf.store), 6)
+        self.assertTrue(subjects[0].id is None)
+
+        estimate = result.estimate
+        self.assertEqual(estimate.requests['subject'], {'validate_node': 2, 'insert_node': 2})
+        self.assertEqual(estimate.requests['visit'], {'validate_node': 5, 'insert_node': 4,
+                                                      'edit_node': 1, 'get_node': 1})
+        self.assertEqual(estimate.round_trips_by_type()['wgs_raw_seq_set'], 2)
+        self.assertEqual(estimate.round_trips, 17)
+        self.assertEqual((estimate.transfers, estimate.bytes), (1, 600))
+
+        stats = RequestStats()
+        for request in ('validate_node', 'insert_node', 'edit_node', 'get_node'):
+            stats.record(request, 1.0)
+        stats.record('upload', 1.0, size=600)
+
+        # Levels of 4 nodes each over 4 workers, plus the upload
+        self.assertEqual(result.levels, [4, 4])
+        self.assertAlmostEqual(estimate.seconds(stats), 9 / 4.0 + 8 / 4.0 + 1)
+        self.assertTrue("17 round trips" in estimate.explain(stats))
+
+    def testDelete(self):
+        """ Test that a dry run delete counts the walk and the deletes. """
+        session = iHMPSession.get_session()
+
+        result = session.delete_subtree(Project.load("proj1"), dry_run=True, workers=2)
+        estimate = result.estimate
+
+        self.assertEqual(len(self.osdf.store), 6)
+        self.assertEqual(estimate.nodes, 6)
+        self.assertEqual(estimate.requests['project'], {'get_node': 1, 'oql_query': 1,
+                                                        'delete_node': 1})
+        self.assertEqual(estimate.requests['visit'], {'oql_query': 2, 'delete_node': 2})
+        self.assertEqual(estimate.round_trips, 14)
+
+        result = session.delete_where('"visit"[node_type]', dry_run=True)
+        self.assertEqual(result.estimate.requests, {'visit': {'oql_query': 1,
+                                                              'delete_node': 2}})
+
+    def testTraversalAndExport(self):
+        """ Test the estimates of a traversal and of an export. """
+        project = Project.load("proj1")
+
+        estimate = project.traverse(dry_run=True)
+        self.assertEqual(estimate.nodes, 5)
+        # proj1, study1, subject1, subject2 and both visits are expanded
+        self.assertEqual(estimate.round_trips, 6)
+        self.assertEqual(len(list(project.traverse())), 5)
+
+        estimate = project.traverse(max_depth=2, dry_run=True)
+        self.assertEqual(estimate.round_trips_by_type(), {'project': 1, 'study': 1})
+
+        path = os.path.join(self.directory, "export.jsonl")
+        estimate = export_subtree(project, path, dry_run=True)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(estimate.nodes, 6)
+
+        export_subtree(project, path)
+        self.assertEqual(estimate.output_bytes, os.path.getsize(path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+""" A unittest script for the dependency module. """
+
+import unittest
+
+from cutlass import iHMPSession, Project, Sample, Study, WgsRawSeqSet
+from cutlass import dependency
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CannedOSDF, CutlassTestDocs
+
+# pylint: disable=W0703, C1801
+
+class DependencyTest(unittest.TestCase):
+    """ A unit test class for the dependency module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+    def tearDown(self):
+        iHMPSession.get_session()._osdf = self.saved_osdf
+
+    def testNodeTypeOf(self):
+        """ Test the mapping of classes and objects to node types. """
+        self.assertEqual(dependency.node_type_of(Sample), "sample")
+        self.assertEqual(dependency.node_type_of(WgsRawSeqSet()), "wgs_raw_seq_set")
+
+        with self.assertRaises(ValueError):
+            dependency.node_type_of(object())
+
+    def testLinkagesCoverLoaders(self):
+        """ Test that every loadable node type has linkage information. """
+        self.assertEqual(sorted(dependency.node_loaders.keys()),
+                         sorted(dependency.node_linkages.keys()))
+
+        for relations in dependency.node_linkages.values():
+            for parent_types in relations.values():
+                for parent_type in parent_types:
+                    self.assertTrue(parent_type in dependency.node_loaders)
+
+    def testChildRelationsPruning(self):
+        """ Test that excluded and unreachable branches are pruned. """
+        everything = dependency.child_relations("sample")
+        self.assertTrue("associated_with" in everything)
+        self.assertTrue("wgs_dna_prep" in everything["prepared_from"])
+
+        only_wgs = dependency.child_relations("sample",
+                                              include_types=["wgs_raw_seq_set"])
+        self.assertEqual(only_wgs, {"prepared_from": ["wgs_dna_prep"]})
+
+        no_preps = dependency.child_relations("sample",
+                                              exclude_types=["wgs_dna_prep"])
+        self.assertFalse("wgs_dna_prep" in no_preps["prepared_from"])
+
+        self.assertEqual(dependency.child_relations("clustered_seq_set"), {})
+
+    def testTraverseArguments(self):
+        """ Test that invalid traversal arguments are rejected by the call itself. """
+        sample = Sample()
+        sample._set_id("sample1")
+
+        with self.assertRaises(ValueError):
+            sample.traverse(order="sideways")
+
+        with self.assertRaises(ValueError):
+            sample.traverse(max_depth=-1)
+
+        with self.assertRaises(ValueError):
+            Sample().traverse()
+
+        with self.assertRaises(ValueError):
+            sample.traverse(order="sideways", dry_run=True)
+
+    def testTraverseSharedDescendant(self):
+        """ Test that a node with two parents is only returned once. """
+        project = Project()
+        project._set_id("proj1")
+
+        study1 = CutlassTestDocs.study("study1", {"part_of": ["proj1"]})
+        study2 = CutlassTestDocs.study("study2", {"part_of": ["proj1"]})
+        study3 = CutlassTestDocs.study("study3", {"subset_of": ["study1", "study2"]})
+
+        osdf = CannedOSDF({
+            '"proj1"[linkage.part_of]': [study1, study2],
+            '"study1"[linkage.participates_in] || "study1"[linkage.subset_of]': [study3],
+            '"study2"[linkage.participates_in] || "study2"[linkage.subset_of]': [study3]
+        })
+        iHMPSession.get_session()._osdf = osdf
+
+        ids = [node.id for node in project.traverse()]
+        self.assertEqual(ids, ["study1", "study3", "study2"])
+
+        ids = [node.id for node in project.traverse(order="bfs")]
+        self.assertEqual(ids, ["study1", "study2", "study3"])
+
+        ids = [node.id for node in project.traverse(max_depth=1)]
+        self.assertEqual(ids, ["study1", "study2"])
+
+        nodes = list(project.traverse(lazy=True))
+        self.assertEqual([node.id for node in nodes], ["study1", "study3", "study2"])
+        self.assertFalse(any([node.hydrated for node in nodes]),
+                         "Lazy traversal does not hydrate the nodes.")
+
+        osdf.queries = []
+        ids = [node.id for node in project.traverse(exclude_types=["study"])]
+        self.assertEqual(ids, [])
+        self.assertEqual(osdf.queries, [], "Excluded branches are not queried.")
+
+    def testAncestors(self):
+        """ Test resolution of parents and ancestors with a shared cache. """
+        project = CutlassTestDocs.project("proj1")
+        study1 = CutlassTestDocs.study("study1", {"part_of": ["proj1"]})
+        study2 = CutlassTestDocs.study("study2", {"part_of": ["proj1"]})
+
+        osdf = CannedOSDF(docs={"proj1": project, "study1": study1, "study2": study2})
+        iHMPSession.get_session()._osdf = osdf
+
+        study3 = Study()
+        study3.links = {"subset_of": ["study1", "study2", "missing"]}
+
+        parents = study3.parents()
+        self.assertEqual(sorted([node.id for node in parents]), ["study1", "study2"])
+
+        cache = {}
+        ancestors = study3.ancestors(cache=cache)
+        self.assertEqual([node.id for node in ancestors], ["study1", "study2", "proj1"])
+        self.assertEqual(osdf.gets.count("proj1"), 1, "Shared ancestor fetched once.")
+
+        osdf.gets = []
+        projects = study3.ancestors(include_types=["project"], cache=cache)
+        self.assertEqual([node.id for node in projects], ["proj1"])
+        self.assertEqual(osdf.gets, ["missing"], "Cached documents are reused.")
+
+        lists = dependency.ancestor_lists([study3, Study.load_study(study1)],
+                                          max_depth=1, cache=cache)
+        self.assertEqual([len(ancestors) for ancestors in lists], [2, 1])
+
+    def testLoadMany(self):
+        """ Test batched loading, ordering and reporting of missing IDs. """
+        docs = {
+            "proj1": CutlassTestDocs.project("proj1"),
+            "study1": CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+            "study2": CutlassTestDocs.study("study2", {"part_of": ["proj1"]})
+        }
+        iHMPSession.get_session()._osdf = CannedOSDF(docs=docs)
+
+        (studies, missing) = Study.load_many(["study2", "nope", "proj1", "study1"])
+        self.assertEqual([study.id for study in studies], ["study2", "study1"])
+        self.assertTrue(all([isinstance(study, Study) for study in studies]))
+        self.assertEqual(missing, ["nope", "proj1"])
+
+        (nodes, missing) = self.session.load_many(["proj1", "study1"])
+        self.assertTrue(isinstance(nodes[0], Project))
+        self.assertTrue(isinstance(nodes[1], Study))
+        self.assertEqual(missing, [])
+
+        # Any iterable of IDs will do
+        (studies, missing) = Study.load_many(node_id for node_id in ["study1", "nope"])
+        self.assertEqual([study.id for study in studies], ["study1"])
+        self.assertEqual(missing, ["nope"])
+
+    def testSearchIter(self):
+        """ Test that search_iter() walks every page of results. """
+        studies = [CutlassTestDocs.study("study%s" % num, {}) for num in range(7)]
+
+        osdf = CannedOSDF({'"study"[node_type]': studies,
+                           '"study"[node_type] && ("ibd"[meta.subtype])': studies[:2]},
+                          page_size=3)
+        iHMPSession.get_session()._osdf = osdf
+
+        results = Study.search_iter()
+        self.assertEqual(osdf.queries, [], "Nothing is fetched until iterated.")
+
+        self.assertEqual(len(list(results)), 7)
+        self.assertEqual(len(osdf.queries), 3)
+
+        results = list(Study.search_iter('"ibd"[meta.subtype]'))
+        self.assertEqual([study.id for study in results], ["study0", "study1"])
+
+    def testCount(self):
+        """ Test counting with a single query and grouped by node type. """
+        studies = [CutlassTestDocs.study("study%s" % num, {}) for num in range(5)]
+        osdf = CannedOSDF({'"study"[node_type]': studies,
+                           '"study"[node_type] && ("ibd"[meta.subtype])': studies[:2],
+                           '"subject"[node_type] && ("ibd"[meta.subtype])': []},
+                          page_size=2)
+        iHMPSession.get_session()._osdf = osdf
+
+        self.assertEqual(Study.count(), 5)
+        self.assertEqual(len(osdf.queries), 1, "Only the first page is requested.")
+
+        counts = self.session.count('"ibd"[meta.subtype]', node_types=["study", "subject"])
+        self.assertEqual(counts, {"study": 2, "subject": 0})
+
+        with self.assertRaises(ValueError):
+            self.session.count()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+""" A unittest script for the frames module. """
+
+import unittest
+
+from cutlass import iHMPSession, Sample
+from cutlass import frames
+from cutlass.records import NodeRecord
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CannedOSDF, CutlassTestDocs
+
+# pylint: disable=W0703, C1801
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+class FramesTest(unittest.TestCase):
+    """ A unit test class for the frames module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+        self.docs = [CutlassTestDocs.sample("sample%s" % num,
+                                            {"collected_during": ["visit%s" % num]})
+                     for num in range(5)]
+        self.docs[1]['meta']['int_sample_size'] = 10
+        self.docs[3]['meta']['int_sample_size'] = 2.5
+
+    def tearDown(self):
+        iHMPSession.get_session()._osdf = self.saved_osdf
+
+    def testFlatten(self):
+        """ Test that nested properties and linkages become columns. """
+        row = frames.flatten_doc(self.docs[0])
+
+        self.assertEqual(row['id'], "sample0")
+        self.assertEqual(row['node_type'], "sample")
+        self.assertEqual(row['fma_body_site'], "test")
+        self.assertEqual(row['mixs.biome'], "blah")
+        self.assertEqual(row['linkage.collected_during'], ["visit0"])
+
+        # Objects and records give the same row as their document
+        self.assertEqual(frames.flatten_doc(NodeRecord(self.docs[0])), row)
+
+    def testColumns(self):
+        """ Test column selection and the typing of the columns. """
+        (names, data, kinds) = frames.to_columns(self.docs)
+
+        self.assertEqual(names[:3], ["id", "ver", "node_type"])
+        self.assertTrue("mixs.biome" in names)
+        self.assertEqual(kinds['ver'], "int")
+        self.assertEqual(kinds['linkage.collected_during'], "list")
+        self.assertEqual(kinds['int_sample_size'], "float")
+        self.assertEqual(data['int_sample_size'], [None, 10.0, None, 2.5, None])
+
+        (names, data, kinds) = frames.to_columns(self.docs[:2], ["id", "int_sample_size"])
+        self.assertEqual(names, ["id", "int_sample_size"])
+        self.assertEqual(kinds['int_sample_size'], "int")
+        self.assertEqual(data['id'], ["sample0", "sample1"])
+
+    def testMergeKinds(self):
+        """ Test the widening of column types. """
+        self.assertEqual(frames.merge_kinds(None, "int"), "int")
+        self.assertEqual(frames.merge_kinds("int", "float"), "float")
+        self.assertEqual(frames.merge_kinds("int", "str"), "str")
+        self.assertEqual(frames.merge_kinds("str", "list"), "object")
+        self.assertEqual(frames.column_kind([None, None]), None)
+
+    def testMixedColumn(self):
+        """ Test that a column of lists and scalars keeps the scalars as text. """
+        self.docs[0]['meta']['extra'] = ["a", "b"]
+        self.docs[1]['meta']['extra'] = "abc"
+        self.docs[2]['meta']['extra'] = 7
+
+        (_names, data, kinds) = frames.to_columns(self.docs, ["extra"])
+
+        self.assertEqual(kinds['extra'], "object")
+        self.assertEqual(data['extra'], ['["a", "b"]', "abc", "7", None, None])
+
+        (_names, data, kinds) = frames.to_columns(self.docs[1:3], ["extra"])
+        self.assertEqual(kinds['extra'], "str")
+        self.assertEqual(data['extra'], ["abc", "7"])
+
+    def testReconcileColumns(self):
+        """ Test that chunks with differing column types are brought to a common type. """
+        self.docs[0]['meta']['extra'] = 5
+        self.docs[2]['meta']['extra'] = "abc"
+        self.docs[3]['meta']['extra'] = ["a", "b"]
+        self.docs[4]['meta']['extra'] = "def"
+
+        chunks = [frames.to_columns(self.docs[:2]), frames.to_columns(self.docs[2:4]),
+                  frames.to_columns(self.docs[4:])]
+        self.assertEqual([kinds['extra'] for (_names, _data, kinds) in chunks],
+                         ["int", "object", "str"])
+        self.assertEqual([kinds.get('int_sample_size') for (_names, _data, kinds) in chunks],
+                         ["int", "float", None])
+
+        (names, kinds) = frames.reconcile_columns(chunks)
+
+        self.assertEqual(names, chunks[0][0])
+        self.assertEqual(kinds['extra'], "object")
+        self.assertEqual(kinds['int_sample_size'], "float")
+        self.assertEqual([value for (_names, data, _kinds) in chunks for value in data['extra']],
+                         ["5", None, "abc", '["a", "b"]', "def"])
+        self.assertEqual([value for (_names, data, _kinds) in chunks
+                          for value in data['int_sample_size']],
+                         [None, 10.0, None, 2.5, None])
+
+        for (chunk_names, _data, chunk_kinds) in chunks:
+            self.assertEqual(chunk_names, names)
+            self.assertEqual(chunk_kinds, kinds)
+
+    def testReconcileMissingColumns(self):
+        """ Test that a column missing from a chunk is filled with None. """
+        self.docs[3]['meta']['extra'] = 2.5
+        chunks = [frames.to_columns(self.docs[:2]), frames.to_columns(self.docs[2:4])]
+
+        (names, kinds) = frames.reconcile_columns(chunks, ["id", "extra"])
+
+        self.assertEqual(names[:2], ["id", "extra"])
+        self.assertEqual(kinds['extra'], "float")
+        self.assertEqual(chunks[0][1]['extra'], [None, None])
+        self.assertEqual(chunks[1][1]['extra'], [None, 2.5])
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def testToFrame(self):
+        """ Test the export of a search to a pandas data frame in chunks. """
+        iHMPSession.get_session()._osdf = CannedOSDF({'"sample"[node_type]': self.docs})
+
+        frame = Sample.to_frame(columns=["id", "mixs.biome", "int_sample_size"],
+                                chunk_size=2)
+
+        self.assertEqual(list(frame.columns), ["id", "mixs.biome", "int_sample_size"])
+        self.assertEqual(list(frame['id']), ["sample%s" % num for num in range(5)])
+        self.assertEqual(str(frame['int_sample_size'].dtype), "float64")
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def testToArrow(self):
+        """ Test the export to an Arrow table with batches of differing types. """
+        table = frames.to_arrow(self.docs, chunk_size=2)
+
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(str(table.schema.field('int_sample_size').type), "double")
+        self.assertEqual(table.column('int_sample_size').to_pylist(),
+                         [None, 10.0, None, 2.5, None])
+
+if __name__ == '__main__':
+    unittest.main()
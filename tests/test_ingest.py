@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+""" A unittest script for the ingest module. """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession
+from cutlass.ingest import ManifestLoader, ingest_manifest, read_manifest
+from cutlass.keys import KeyIndex
+from cutlass.local import LocalStore
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs, MIXS
+
+# pylint: disable=W0703, C1801, W0212
+
+MANIFEST = """Subject\tSex\tVisit\tVisit number\tSample\tBody site
+subject1\tfemale\tvisit1\t1\tsample1\tstool
+subject1\tfemale\tvisit1\t1\tsample2\tskin
+subject1\tfemale\tvisit2\t2\tsample3\tstool
+subject2\tmale\tvisit3\t1\tsample4\tstool
+subject2\tmale\tvisit4\tsecond\tsample5\tstool
+subject3\tunknown_gender\tvisit5\t1\tsample6\tstool
+"""
+
+SPEC = {
+    "subject": {
+        "columns": {"rand_subject_id": "Subject", "gender": "Sex"},
+        "links": {"participates_in": ["study1"]}
+    },
+    "visit": {
+        "columns": {"visit_id": "Visit", "visit_number": ("Visit number", int)},
+        "values": {"interval": 0},
+        "links": {"by": "subject"}
+    },
+    "sample": {
+        "columns": {"name": "Sample", "fma_body_site": "Body site"},
+        "values": {"mixs": MIXS},
+        "links": {"collected_during": "visit"}
+    }
+}
+
+class IngestTest(unittest.TestCase):
+    """ A unit test class for the ingest module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.osdf = iHMPSession.get_session().use_local(
+            LocalStore([CutlassTestDocs.study("study1", {})]))
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "manifest.tsv")
+
+        with open(self.path, "w") as handle:
+            handle.write(MANIFEST)
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+        shutil.rmtree(self.directory)
+
+    def _docs(self, node_type):
+        return self.osdf.store.find('"%s"[node_type]' % node_type)
+
+    def testReadManifest(self):
+        """ Test reading rows with the delimiter guessed from the name. """
+        rows = list(read_manifest(self.path))
+
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0], (2, {"Subject": "subject1", "Sex": "female",
+                                       "Visit": "visit1", "Visit number": "1",
+                                       "Sample": "sample1", "Body site": "stool"}))
+
+    def testIngest(self):
+        """ Test the nodes created, the shared parents and the rejected rows. """
+        report = ingest_manifest(self.path, SPEC, workers={"save": 3}, queue_size=2)
+
+        self.assertEqual(report.rows, 6)
+        self.assertEqual(report.saved, 4)
+        self.assertEqual([(error['line'], error['stage']) for error in report.errors],
+                         [(6, "parse"), (7, "build")])
+        self.assertTrue(report.bottleneck in ("parse", "build", "validate", "save"))
+        self.assertEqual([stage.name for stage in report.stages],
+                         ["parse", "build", "validate", "save"])
+        self.assertEqual(report.stages[-1].workers, 3)
+
+        self.assertEqual(len(self._docs("subject")), 2)
+        self.assertEqual(len(self._docs("visit")), 3)
+        self.assertEqual(len(self._docs("sample")), 4)
+        self.assertEqual(report.nodes, 9)
+
+        visit = [doc for doc in self._docs("visit") if doc['meta']['visit_id'] == "visit2"][0]
+        subject = self.osdf.get_node(visit['linkage']['by'][0])
+        self.assertEqual(subject['meta']['rand_subject_id'], "subject1")
+        self.assertEqual(subject['linkage'], {"participates_in": ["study1"]})
+
+    def testIndex(self):
+        """ Test that a manifest loaded again with a key index writes nothing. """
+        index = KeyIndex()
+
+        ManifestLoader(SPEC, validate=False, index=index).load(self.path)
+        self.assertEqual(len(self.osdf.store), 10)
+
+        writes = []
+        original = self.osdf.insert_node
+
+        def counting(json_data):
+            writes.append(json_data)
+            return original(json_data)
+
+        self.osdf.insert_node = counting
+
+        report = ManifestLoader(SPEC, validate=False, index=index).load(self.path)
+
+        self.assertEqual(report.saved, 4)
+        self.assertEqual(writes, [])
+        self.assertEqual(len(self.osdf.store), 10)
+
+    def testUnkeyedRows(self):
+        """ Test that every row of nodes without a key is saved. """
+        spec = {"subject": dict(SPEC["subject"], key=None)}
+        rows = [(line, {"Subject": "subject%s" % line, "Sex": "female"})
+                for line in range(2, 1002)]
+
+        loader = ManifestLoader(spec, workers={"save": 4}, queue_size=10)
+        report = loader.load_rows(rows)
+
+        self.assertTrue(report.ok)
+        self.assertEqual((report.saved, report.nodes), (1000, 1000))
+        self.assertEqual(len(self._docs("subject")), 1000)
+        self.assertEqual(loader._shared, {})
+
+    def testSpecErrors(self):
+        """ Test that links to unknown entries and cycles are rejected. """
+        with self.assertRaises(ValueError):
+            ManifestLoader({"visit": {"links": {"by": "subject"}}})
+
+        with self.assertRaises(ValueError):
+            ManifestLoader({"visit": {"links": {"by": "subject"}},
+                            "subject": {"links": {"participates_in": "visit"}}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+""" A unittest script for the journal module. """
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession
+from cutlass.dependency import make_node
+from cutlass.journal import Journal, content_key
+from cutlass.local import LocalStore
+from cutlass.snapshot import import_subtree
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+def new_node(doc):
+    """ Returns an unsaved node object for a test document. """
+    node = make_node(doc)
+    node._set_id(None)
+    return node
+
+class JournalTest(unittest.TestCase):
+    """ A unit test class for the journal module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.osdf = iHMPSession.get_session().use_local(
+            LocalStore([CutlassTestDocs.project("proj1")]))
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "load.journal")
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def _build():
+        study = new_node(CutlassTestDocs.study("study1", {"part_of": ["proj1"]}))
+        subjects = [new_node(CutlassTestDocs.subject("subject%s" % num,
+                                                     {"participates_in": [study]}))
+                    for num in range(2)]
+        visits = [new_node(CutlassTestDocs.visit("visit%s" % num, {"by": [subjects[num % 2]]}))
+                  for num in range(4)]
+
+        return visits
+
+    def testContentKey(self):
+        """ Test that keys depend on the content and the linked nodes. """
+        first = self._build()
+        second = self._build()
+
+        self.assertEqual(content_key(first[0]), content_key(second[0]))
+        self.assertNotEqual(content_key(first[0]), content_key(first[2]))
+        self.assertTrue(content_key(first[0]).startswith("visit:"))
+
+        second[0].links["by"][0].rand_subject_id = "other"
+        self.assertNotEqual(content_key(first[0]), content_key(second[0]))
+
+    def testResume(self):
+        """ Test that a load run again only saves what the first run did not. """
+        session = iHMPSession.get_session()
+        original = self.osdf.insert_node
+
+        def failing(json_data):
+            if json_data['meta'].get('visit_id') == "visit3":
+                raise Exception("Connection reset.")
+            return original(json_data)
+
+        self.osdf.insert_node = failing
+
+        with Journal(self.path) as journal:
+            result = session.save_all(self._build(), journal=journal)
+
+        self.assertEqual(result.count('saved'), 6)
+        self.assertEqual(result.count('failed'), 1)
+
+        self.osdf.insert_node = original
+
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal), 6)
+            self.assertEqual(len(journal.failures()), 1)
+            self.assertEqual(journal.in_flight(), [])
+
+            visits = self._build()
+            result = session.save_all(visits, journal=journal)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count('resumed'), 6)
+        self.assertEqual(result.count('saved'), 1)
+        self.assertEqual(len(self.osdf.store), 8)
+
+        subject = self.osdf.get_node(visits[3].links["by"][0])
+        self.assertEqual(subject['meta']['rand_subject_id'], "subject1")
+
+    def testInFlight(self):
+        """ Test that writes planned but never completed are reported. """
+        with Journal(self.path) as journal:
+            journal.planned("a", node_type="subject")
+            journal.planned("b", node_type="subject")
+            journal.saved("a", "id_a", 1, node_type="subject")
+            journal.saved("c", "id_c", 1, node_type="subject")
+            journal.rolled_back("c", node_type="subject")
+
+        with Journal(self.path) as journal:
+            self.assertEqual([record['key'] for record in journal.in_flight()], ["b"])
+            self.assertEqual(journal.lookup("a"), ("id_a", 1))
+            self.assertEqual(journal.lookup("c"), None)
+
+    def testImport(self):
+        """ Test that an import run again skips the documents already created. """
+        path = os.path.join(self.directory, "tree.jsonl")
+        docs = [CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+                CutlassTestDocs.subject("subject1", {"participates_in": ["study1"]})]
+
+        with open(path, "w") as handle:
+            for doc in docs:
+                handle.write(json.dumps(doc) + "\n")
+
+        with Journal(self.path) as journal:
+            journal.saved("import:study1", "new_study", 1)
+
+        self.osdf.store.add(CutlassTestDocs.study("new_study", {"part_of": ["proj1"]}))
+
+        with Journal(self.path) as journal:
+            result = import_subtree(path, journal=journal)
+
+        self.assertEqual(result.nodes('resumed'), ["study1"])
+        id_map = result.id_map
+
+        self.assertEqual(id_map["study1"], "new_study")
+        self.assertEqual(len(self.osdf.store), 3)
+        self.assertEqual(self.osdf.get_node(id_map["subject1"])['linkage'],
+                         {"participates_in": ["new_study"]})
+
+if __name__ == '__main__':
+    unittest.main()
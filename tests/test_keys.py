@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+""" A unittest script for the keys module. """
+
+import unittest
+
+from cutlass import iHMPSession
+from cutlass.dependency import make_node
+from cutlass.keys import KeyIndex, key_value
+from cutlass.local import LocalStore
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+def new_node(doc):
+    """ Returns an unsaved node object for a test document. """
+    node = make_node(doc)
+    node._set_id(None)
+    return node
+
+class KeysTest(unittest.TestCase):
+    """ A unit test class for the keys module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.osdf = iHMPSession.get_session().use_local(LocalStore())
+
+        self.calls = []
+        for name in ("oql_query", "get_node", "insert_node", "edit_node"):
+            setattr(self.osdf, name, self._counting(name, getattr(self.osdf, name)))
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+    def _counting(self, name, method):
+        def counted(*args, **kwargs):
+            self.calls.append(name)
+            return method(*args, **kwargs)
+
+        return counted
+
+    @staticmethod
+    def _build(gender="female"):
+        subjects = []
+        visits = []
+
+        for num in range(3):
+            doc = CutlassTestDocs.subject("subject%s" % num, {"participates_in": ["study1"]})
+            doc['meta']['gender'] = gender if num == 0 else "female"
+            subjects.append(new_node(doc))
+            visits.append(new_node(CutlassTestDocs.visit("visit%s" % num,
+                                                         {"by": [subjects[-1]]})))
+
+        return subjects + visits
+
+    def testKeyValue(self):
+        """ Test simple and composite key values. """
+        doc = CutlassTestDocs.visit("visit1", {"by": ["subject1"]})
+
+        self.assertEqual(key_value(doc, "visit_id"), "visit1")
+        self.assertEqual(key_value(doc, ("visit_id", "linkage.by")), ("visit1", "subject1"))
+        self.assertEqual(key_value(doc, "body_site"), None)
+
+    def testUpsertAll(self):
+        """ Test that loading the same nodes again writes only what changed. """
+        index = KeyIndex()
+
+        result = index.upsert_all(self._build())
+        self.assertEqual(result.count('saved'), 6)
+        self.assertEqual(len(index), 6)
+
+        del self.calls[:]
+        result = index.upsert_all(self._build())
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count('unchanged'), 6)
+        self.assertEqual(self.calls, [])
+
+        nodes = self._build(gender="male")
+        result = index.upsert_all(nodes)
+
+        self.assertEqual(result.nodes('saved'), [nodes[0]])
+        self.assertEqual(self.calls, ["edit_node", "get_node"])
+        self.assertEqual(len(self.osdf.store), 6)
+        self.assertEqual(self.osdf.get_node(nodes[0].id)['meta']['gender'], "male")
+
+    def testFromNamespace(self):
+        """ Test building the index with a scan, and upserting single nodes. """
+        iHMPSession.get_session().save_all(self._build())
+
+        index = KeyIndex.from_namespace(node_types=["subject", "visit"])
+        self.assertEqual(len(index), 6)
+
+        subject_id = index.lookup("subject", "subject1")
+        self.assertEqual(self.osdf.get_node(subject_id)['meta']['rand_subject_id'], "subject1")
+
+        del self.calls[:]
+
+        subject = new_node(CutlassTestDocs.subject("subject9", {"participates_in": ["study1"]}))
+        subject.gender = "female"
+        self.assertEqual(index.upsert(subject), 'inserted')
+        self.assertEqual(index.upsert(subject), 'unchanged')
+
+        subject.gender = "male"
+        self.assertEqual(index.upsert(subject), 'updated')
+        self.assertEqual(self.calls, ["insert_node", "edit_node", "get_node"])
+
+        with self.assertRaises(ValueError):
+            index.upsert(new_node(CutlassTestDocs.sample("sample1", {})), key="int_sample_id")
+
+    def testAttach(self):
+        """ Test that an attached index follows the saves and deletes. """
+        index = KeyIndex()
+        index.attach()
+
+        try:
+            nodes = self._build()
+            iHMPSession.get_session().save_all(nodes)
+            self.assertEqual(index.lookup("visit", "visit2"), nodes[5].id)
+
+            nodes[5].delete()
+            self.assertEqual(index.lookup("visit", "visit2"), None)
+        finally:
+            index.detach()
+
+if __name__ == '__main__':
+    unittest.main()
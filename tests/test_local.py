@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+""" A unittest script for the local module. """
+
+import os
+import tempfile
+import unittest
+
+from cutlass import iHMPSession, Sample, Visit
+from cutlass.local import LocalStore, matches
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+class LocalTest(unittest.TestCase):
+    """ A unit test class for the local module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+        visits = [CutlassTestDocs.visit("visit%s" % num, {"by": ["subject1"]})
+                  for num in range(3)]
+        visits[2]['meta']['visit_number'] = 3
+        visits[2]['meta']['tags'] = ["needs review"]
+
+        samples = [CutlassTestDocs.sample("sample%s" % num,
+                                          {"collected_during": ["visit%s" % (num % 2)]})
+                   for num in range(4)]
+        samples[3]['meta']['fma_body_site'] = "Stool, left colon"
+
+        self.store = LocalStore(visits + samples, indexed_fields=["meta.fma_body_site"])
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+    def testMatches(self):
+        """ Test the evaluation of OQL terms against a document. """
+        doc = self.store.get("sample3")
+
+        self.assertTrue(matches(doc, '"sample"[node_type]'))
+        self.assertTrue(matches(doc, '"visit1"[linkage.collected_during]'))
+        self.assertTrue(matches(doc, '"stool"[meta.fma_body_site]'))
+        self.assertTrue(matches(doc, '"LEFT colon"[meta.fma_body_site]'))
+        self.assertFalse(matches(doc, '"right colon"[meta.fma_body_site]'))
+        self.assertTrue(matches(doc, '"blah"[meta.mixs.biome] && !"visit"[node_type]'))
+        self.assertTrue(matches(self.store.get("visit2"), '[meta.visit_number] > 2'))
+        self.assertFalse(matches(self.store.get("visit1"), '[meta.visit_number] > 2'))
+
+    def testFind(self):
+        """ Test indexed and unindexed queries against the store. """
+        self.assertEqual([doc['id'] for doc in self.store.find('"visit1"[linkage.collected_during]')],
+                         ["sample1", "sample3"])
+        self.assertEqual(self.store.count('"visit"[node_type] || "sample"[node_type]'), 7)
+        self.assertEqual(self.store.count('"review"[meta.tags]'), 1)
+        self.assertEqual(self.store.count('"review"[tags]'), 1)
+        self.assertEqual(self.store.count('"visit"[node_type] && [meta.visit_number] == 1'), 2)
+        self.assertEqual(self.store.count('!"visit"[node_type]'), 4)
+
+        # Replaced and removed documents leave the indexes
+        doc = dict(self.store.get("sample1"), linkage={"collected_during": ["visit2"]})
+        self.store.add(doc)
+        self.assertEqual(self.store.count('"visit1"[linkage.collected_during]'), 1)
+        self.store.remove("sample3")
+        self.assertEqual(self.store.count('"visit1"[linkage.collected_during]'), 0)
+        self.assertEqual(self.store.count('"stool"[meta.fma_body_site]'), 0)
+
+    def testDumpLoad(self):
+        """ Test writing and reading a dump file. """
+        (handle, path) = tempfile.mkstemp()
+        os.close(handle)
+
+        try:
+            self.store.dump(path)
+            store = LocalStore()
+            self.assertEqual(store.load(path), 7)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(store.get("visit2"), self.store.get("visit2"))
+        self.assertTrue(type(store.get("visit2")['meta']['visit_id']) is str)
+
+    def testOffline(self):
+        """ Test that the node classes work against a local store. """
+        osdf = iHMPSession.get_session().use_local(self.store)
+
+        self.assertEqual(len(Visit.search()), 3)
+        self.assertEqual(Sample.count('"visit0"[linkage.collected_during]'), 2)
+        self.assertEqual([sample.id for sample in Visit.load("visit1").samples()],
+                         ["sample1", "sample3"])
+
+        visit = Visit.load("visit0")
+        visit.visit_number = 7
+        self.assertTrue(visit.save())
+        self.assertEqual(Visit.load("visit0").visit_number, 7)
+        self.assertEqual(osdf.get_node_by_version("visit0", 1)['meta']['visit_number'], 1)
+
+        sample = Sample.load("sample0")
+        sample._set_id(None)
+        self.assertTrue(sample.save())
+        self.assertEqual(Sample.count('"visit0"[linkage.collected_during]'), 3)
+
+        self.assertTrue(sample.delete())
+        self.assertEqual(Sample.count(), 4)
+
+        iHMPSession.get_session().use_remote()
+        self.assertTrue(iHMPSession.get_session()._osdf is self.saved_osdf)
+
+if __name__ == '__main__':
+    unittest.main()
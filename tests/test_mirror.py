@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+""" A unittest script for the mirror module. """
+
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession
+from cutlass.local import LocalStore
+from cutlass.mirror import Mirror
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+TYPES = ["subject", "visit"]
+
+class MirrorTest(unittest.TestCase):
+    """ A unit test class for the mirror module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.tmpdir = tempfile.mkdtemp()
+
+        docs = [CutlassTestDocs.subject("subject1", {})] + \
+               [CutlassTestDocs.visit("visit%s" % num, {"by": ["subject1"]})
+                for num in range(5)]
+
+        self.source = iHMPSession.get_session().use_local(LocalStore(docs), page_size=2)
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+        shutil.rmtree(self.tmpdir)
+
+    def testSync(self):
+        """ Test that only the differences are applied on later syncs. """
+        mirror = Mirror(self.tmpdir)
+
+        stats = mirror.sync(TYPES, workers=2)
+        self.assertEqual(stats['visit']['added'], 5)
+        self.assertEqual(stats['visit']['pages'], 3)
+        self.assertEqual(len(mirror.store), 6)
+
+        doc = self.source.get_node("visit1")
+        doc['meta']['visit_number'] = 9
+        self.source.edit_node(doc)
+        self.source.delete_node("visit2")
+        self.source.insert_node(CutlassTestDocs.visit("new", {"by": ["subject1"]}))
+
+        stats = mirror.sync(TYPES)
+        self.assertEqual((stats['visit']['added'], stats['visit']['changed'],
+                          stats['visit']['deleted'], stats['visit']['unchanged']),
+                         (1, 1, 1, 3))
+        self.assertEqual(stats['subject']['unchanged'], 1)
+        self.assertEqual(mirror.store.get("visit1")['meta']['visit_number'], 9)
+        self.assertEqual(mirror.store.get("visit1")['ver'], 2)
+        self.assertFalse("visit2" in mirror.store)
+
+        # The persisted mirror has the same documents
+        reloaded = Mirror(self.tmpdir)
+        self.assertEqual(sorted(doc['id'] for doc in reloaded.store),
+                         sorted(doc['id'] for doc in mirror.store))
+
+    def testQuick(self):
+        """ Test that quick syncs skip the types with unchanged counts. """
+        mirror = Mirror()
+        mirror.sync(TYPES)
+
+        doc = self.source.get_node("visit1")
+        doc['meta']['visit_number'] = 9
+        self.source.edit_node(doc)
+
+        stats = mirror.sync(TYPES, quick=True)
+        self.assertTrue(stats['visit']['skipped'])
+        self.assertEqual(mirror.store.get("visit1")['meta']['visit_number'], 1)
+
+    def _shift_pages(self, change):
+        # Changes the source once, when the second page of visits is read
+        original = self.source.oql_query
+        pending = [change]
+
+        def shifting(namespace, query, page=1):
+            if "visit" in query and page == 2 and pending:
+                pending.pop()()
+            return original(namespace, query, page)
+
+        self.source.oql_query = shifting
+
+    def testShiftedPages(self):
+        """ Test that documents hidden by shifted pages are not deleted. """
+        mirror = Mirror()
+        mirror.sync(TYPES)
+
+        # A deletion shifts the pages and changes the count
+        self._shift_pages(lambda: self.source.delete_node("visit0"))
+
+        stats = mirror.sync(TYPES, workers=1)
+        self.assertTrue(stats['visit']['incomplete'])
+        self.assertEqual(stats['visit']['deleted'], 0)
+        self.assertEqual(len(mirror.store), 6)
+
+        stats = mirror.sync(TYPES, quick=True)
+        self.assertFalse(stats['visit']['skipped'])
+        self.assertEqual(stats['visit']['deleted'], 1)
+        self.assertFalse("visit0" in mirror.store)
+
+        # A deletion and an insertion shift the pages without changing the
+        # count, hiding visit3
+        def replace():
+            self.source.delete_node("visit1")
+            self.source.store.add(CutlassTestDocs.visit("visit9", {"by": ["subject1"]}))
+
+        self._shift_pages(replace)
+
+        stats = mirror.sync(TYPES, workers=1)
+        self.assertFalse(stats['visit']['incomplete'])
+        self.assertEqual(stats['visit']['deleted'], 0)
+        self.assertTrue("visit3" in mirror.store)
+
+        mirror.sync(TYPES)
+        self.assertEqual(sorted(doc['id'] for doc in mirror.store),
+                         sorted(doc['id'] for doc in self.source.store))
+
+    def testResume(self):
+        """ Test that an interrupted sync resumes after the completed types. """
+        mirror = Mirror(self.tmpdir)
+        original = self.source.oql_query
+
+        def failing(namespace, query, page=1):
+            if "visit" in query:
+                raise Exception("Connection reset.")
+            return original(namespace, query, page)
+
+        self.source.oql_query = failing
+
+        with self.assertRaises(Exception):
+            mirror.sync(TYPES)
+
+        self.source.oql_query = original
+
+        resumed = Mirror(self.tmpdir)
+        self.assertEqual(len(resumed.store), 1, "The subjects were logged.")
+
+        stats = resumed.sync(TYPES)
+        self.assertEqual(sorted(stats.keys()), ["visit"])
+        self.assertEqual(len(resumed.store), 6)
+
+if __name__ == '__main__':
+    unittest.main()
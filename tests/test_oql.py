@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+""" A unittest script for the oql module. """
+
+import unittest
+
+from cutlass import oql
+
+# pylint: disable=W0703, C1801
+
+class OqlTest(unittest.TestCase):
+    """ A unit test class for the oql module. """
+
+    def testMatch(self):
+        """ Test the rendering and escaping of string predicates. """
+        self.assertEqual(oql.field("meta.body_site", "stool").to_oql(),
+                         '"stool"[meta.body_site]')
+
+        self.assertEqual(oql.field("meta.name", 'say "hi" \\o/').to_oql(),
+                         '"say \\"hi\\" \\\\o/"[meta.name]')
+
+        with self.assertRaises(ValueError):
+            oql.field("meta.name]", "x")
+
+        with self.assertRaises(ValueError):
+            oql.field("meta.name", 5)
+
+    def testCompare(self):
+        """ Test numeric comparisons. """
+        self.assertEqual(oql.compare("meta.size", ">", 100).to_oql(),
+                         "[meta.size] > 100")
+
+        with self.assertRaises(ValueError):
+            oql.compare("meta.size", "=~", 100)
+
+        with self.assertRaises(ValueError):
+            oql.compare("meta.size", ">", "100")
+
+        self.assertEqual(oql.compare("meta.size", ">=", long(2 ** 40)).to_oql(),
+                         "[meta.size] >= 1099511627776")
+        self.assertEqual(oql.compare("meta.size", "<", 2.5).to_oql(), "[meta.size] < 2.5")
+
+    def testCanonicalOrder(self):
+        """ Test that equivalent queries compile to the same OQL. """
+        sample = oql.node_type("sample")
+        oral = oql.field("meta.supersite", "oral")
+        skin = oql.field("meta.supersite", "skin")
+
+        query1 = sample & (oral | skin)
+        query2 = (skin | oral | skin) & sample
+
+        self.assertEqual(query1.to_oql(), query2.to_oql())
+        self.assertEqual(query1, query2)
+        self.assertEqual(hash(query1), hash(query2))
+        self.assertEqual(query1.to_oql(),
+                         '"sample"[node_type] && ("oral"[meta.supersite] || '
+                         '"skin"[meta.supersite])')
+
+    def testFlattening(self):
+        """ Test that nested conjunctions are flattened. """
+        query_a = oql.field("a", "1")
+        query_b = oql.field("b", "2")
+        query_c = oql.field("c", "3")
+
+        self.assertEqual(((query_a & query_b) & query_c).to_oql(),
+                         (query_a & (query_b & query_c)).to_oql())
+        self.assertEqual(len((query_a & (query_b & query_c)).terms), 3)
+
+    def testNot(self):
+        """ Test negation. """
+        query = oql.field("a", "1") | oql.field("b", "2")
+        self.assertEqual((~query).to_oql(), '!("1"[a] || "2"[b])')
+        self.assertEqual(~~query, query)
+
+    def testHelpers(self):
+        """ Test the linkage, tag and id helpers. """
+        self.assertEqual(oql.linkage("prepared_from", "x", "y").to_oql(),
+                         '"x"[linkage.prepared_from] || "y"[linkage.prepared_from]')
+        self.assertEqual(oql.tag("t1").to_oql(), '"t1"[tags]')
+        self.assertEqual(oql.id_in(["b", "a"]).to_oql(), '"a"[id] || "b"[id]')
+
+        # Values taken from parsed JSON are unicode
+        self.assertEqual(oql.linkage(u"by", u"abc").to_oql(), '"abc"[linkage.by]')
+        self.assertEqual(oql.field("meta.name", u"x") & u'"y"[tags]',
+                         oql.field("meta.name", "x") & '"y"[tags]')
+
+    def testNonAscii(self):
+        """ Test that non-ASCII unicode values build and parse back. """
+        query = oql.field("meta.name", u"caf\xe9") & oql.node_type("sample")
+
+        self.assertEqual(query.to_oql(), u'"caf\xe9"[meta.name] && "sample"[node_type]')
+        self.assertEqual(oql.parse(query.to_oql()), query)
+        self.assertEqual(oql.parse(query.to_oql()).terms[0].value, u"caf\xe9")
+
+    def testRaw(self):
+        """ Test that raw OQL strings can be combined with built terms. """
+        query = oql.raw('"x"[a] || "y"[a]') & oql.node_type("visit")
+        self.assertEqual(query.to_oql(), '"visit"[node_type] && ("x"[a] || "y"[a])')
+        self.assertEqual(oql.canonical(' "x"[a] '), '"x"[a]')
+
+        with self.assertRaises(ValueError):
+            oql.raw("  ")
+
+    def testParse(self):
+        """ Test that OQL strings parse back into the same terms. """
+        query = (oql.node_type("visit") & ~oql.field("meta.tags", 'say "hi"')) | \
+                oql.compare("meta.visit_number", ">=", 2)
+
+        self.assertEqual(oql.parse(query.to_oql()), query)
+        self.assertEqual(oql.parse('"a"[x] || "b"[y] && "c"[z]'),
+                         oql.field("x", "a") | (oql.field("y", "b") & oql.field("z", "c")))
+        self.assertEqual(oql.parse('!"a"[x] && ("b"[y])').to_oql(), '!"a"[x] && "b"[y]')
+        self.assertEqual(oql.parse("[meta.size] < 1.5e3").value, 1500.0)
+
+        for invalid in ('"a"[x] &&', '"a"', '("a"[x]', '[x] > "a"', '"a"[x] "b"[y]'):
+            with self.assertRaises(ValueError):
+                oql.parse(invalid)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+""" A unittest script for the planner module. """
+
+import unittest
+
+from cutlass import iHMPSession, Study, oql
+from cutlass import planner
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CannedOSDF, CutlassTestDocs
+
+# pylint: disable=W0703, C1801
+
+class PlannerTest(unittest.TestCase):
+    """ A unit test class for the planner module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+    def tearDown(self):
+        iHMPSession.get_session()._osdf = self.saved_osdf
+
+    def testFindUnder(self):
+        """ Test that each hop is one set-at-a-time query per relation. """
+        study = Study.load_study(CutlassTestDocs.study("study1", {}))
+
+        subjects = [CutlassTestDocs.subject("subj%s" % num,
+                                            {"participates_in": ["study1"]})
+                    for num in range(3)]
+        visits = [CutlassTestDocs.visit("visit%s" % num,
+                                        {"by": ["subj%s" % (num % 3)]})
+                  for num in range(5)]
+
+        subject_query = oql.linkage("participates_in", "study1") & oql.node_type("subject")
+        visit_query = oql.linkage("by", "subj0", "subj1") & oql.node_type("visit")
+        visit_query2 = oql.linkage("by", "subj2") & oql.node_type("visit")
+
+        osdf = CannedOSDF({subject_query.to_oql(): subjects,
+                           visit_query.to_oql(): visits[:2] + visits[3:5],
+                           visit_query2.to_oql(): visits[2:3]}, page_size=2)
+        iHMPSession.get_session()._osdf = osdf
+
+        result = planner.find_under(study, "visit", chunk_size=2)
+
+        self.assertEqual(sorted([visit.id for visit in result.nodes]),
+                         ["visit%s" % num for num in range(5)])
+        self.assertEqual(len(result.hops), 2)
+        self.assertEqual(result.hops[1]['parents'], 3)
+        self.assertEqual(result.hops[1]['queries'], 2)
+        self.assertEqual(result.hops[1]['round_trips'], 3)
+        self.assertTrue("hop 2: by -> visit" in result.explain())
+
+    def testFindUnderArguments(self):
+        """ Test that invalid arguments are rejected. """
+        study = Study.load_study(CutlassTestDocs.study("study1", {}))
+
+        with self.assertRaises(ValueError):
+            planner.find_under(study, "not_a_type")
+
+        with self.assertRaises(ValueError):
+            planner.find_under(Study(), "visit")
+
+if __name__ == '__main__':
+    unittest.main()
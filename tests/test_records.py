@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+""" A unittest script for the records module. """
+
+import unittest
+
+from cutlass import iHMPSession, Project, Sample, Visit
+from cutlass.Base import Base
+from cutlass.records import LazyNode, NodeRecord
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CannedOSDF, CutlassTestDocs
+
+# pylint: disable=W0703, C1801
+
+class RecordsTest(unittest.TestCase):
+    """ A unit test class for the records module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+    def tearDown(self):
+        iHMPSession.get_session()._osdf = self.saved_osdf
+
+    def testAttributes(self):
+        """ Test access to the OSDF fields and to the meta properties. """
+        doc = CutlassTestDocs.sample("sample1", {"collected_during": ["visit1"]})
+        record = NodeRecord(doc)
+
+        self.assertEqual(record.id, "sample1")
+        self.assertEqual(record.version, 1)
+        self.assertEqual(record.node_type, "sample")
+        self.assertEqual(record.links, {"collected_during": ["visit1"]})
+        self.assertEqual(record.fma_body_site, "test")
+        self.assertEqual(record.meta.mixs.biome, "blah")
+        self.assertEqual(record.get("mixs.biome"), "blah")
+        self.assertEqual(record.get("meta.name"), "sample1")
+        self.assertEqual(record.get("linkage.collected_during"), ["visit1"])
+        self.assertEqual(record.get("mixs.nothing", "default"), "default")
+
+        with self.assertRaises(AttributeError):
+            record.supersite
+
+    def testReadOnly(self):
+        """ Test that records cannot be modified. """
+        record = NodeRecord(CutlassTestDocs.project("proj1"))
+
+        with self.assertRaises(AttributeError):
+            record.name = "other"
+
+        with self.assertRaises(AttributeError):
+            record.meta.name = "other"
+
+    def testPromote(self):
+        """ Test the promotion of a record to a full node object. """
+        record = NodeRecord(CutlassTestDocs.project("proj1"))
+        project = record.promote()
+
+        self.assertTrue(isinstance(project, Project))
+        self.assertEqual(project.id, "proj1")
+        self.assertEqual(project.name, "proj1")
+        self.assertEqual(project.description, record.description)
+
+    def testRecordMode(self):
+        """ Test that search_iter() and load_many() can return records. """
+        docs = [CutlassTestDocs.sample("sample%s" % num, {}) for num in range(3)]
+        iHMPSession.get_session()._osdf = CannedOSDF(
+            {'"sample"[node_type]': docs},
+            docs=dict((doc['id'], doc) for doc in docs))
+
+        records = list(Sample.search_iter(records=True))
+        self.assertEqual([record.id for record in records],
+                         ["sample0", "sample1", "sample2"])
+        self.assertTrue(all([isinstance(record, NodeRecord) for record in records]))
+
+        (records, missing) = Sample.load_many(["sample2", "sample0"], records=True)
+        self.assertEqual([record.name for record in records], ["sample2", "sample0"])
+        self.assertEqual(missing, [])
+
+    def testLazyNode(self):
+        """ Test that a lazy node is only hydrated when a property is read. """
+        doc = CutlassTestDocs.visit("visit1", {"by": ["subject1"]})
+        lazy = LazyNode.from_doc(doc)
+
+        self.assertEqual(lazy.id, "visit1")
+        self.assertEqual(lazy.node_type, "visit")
+        self.assertTrue(isinstance(lazy, Visit))
+        self.assertTrue(isinstance(lazy, Base))
+        self.assertEqual(lazy.links, {"by": ["subject1"]})
+        self.assertFalse(lazy.hydrated)
+
+        self.assertEqual(lazy.visit_id, doc['meta']['visit_id'])
+        self.assertTrue(lazy.hydrated)
+        self.assertTrue(type(lazy.hydrate()) is Visit)
+        self.assertEqual(type(lazy.visit_id), str)
+
+        # Writes go to the hydrated object and are validated
+        lazy.visit_number = 5
+        self.assertEqual(lazy.hydrate().visit_number, 5)
+
+        with self.assertRaises(ValueError):
+            lazy.visit_number = "five"
+
+        with self.assertRaises(ValueError):
+            LazyNode("visit1", "visit", None)
+
+    def testLazyMode(self):
+        """ Test that search_iter() and load_many() can return lazy nodes. """
+        docs = [CutlassTestDocs.sample("sample%s" % num, {}) for num in range(3)]
+        iHMPSession.get_session()._osdf = CannedOSDF(
+            {'"sample"[node_type]': docs},
+            docs=dict((doc['id'], doc) for doc in docs))
+
+        nodes = list(Sample.search_iter(lazy=True))
+        self.assertEqual([node.id for node in nodes], ["sample0", "sample1", "sample2"])
+        self.assertFalse(any([node.hydrated for node in nodes]))
+
+        (nodes, missing) = Sample.load_many(["sample2", "sample0"], lazy=True)
+        self.assertEqual(missing, [])
+        self.assertFalse(nodes[0].hydrated)
+        self.assertEqual(nodes[0].name, "sample2")
+        self.assertTrue(nodes[0].hydrated)
+        self.assertFalse(nodes[1].hydrated)
+
+if __name__ == '__main__':
+    unittest.main()
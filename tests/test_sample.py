@@ -208,6 +208,19 @@ class SampleTest(unittest.TestCase):
                          "'name' in JSON had expected value."
                         )
 
+    def testIntSampleIdInJson(self):
+        """ Test that int_sample_id is written under its own key, not as the name. """
+        sample = self.session.create_sample()
+        sample.name = "test_name"
+        sample.int_sample_id = "test_int_sample_id"
+
+        sample_data = json.loads(sample.to_json())
+
+        self.assertEqual(sample_data['meta']['name'], "test_name",
+                         "'name' in JSON was not overwritten.")
+        self.assertEqual(sample_data['meta']['int_sample_id'], "test_int_sample_id",
+                         "'int_sample_id' in JSON had expected value.")
+
     def testId(self):
         """ Test the id property. """
         sample = self.session.create_sample()
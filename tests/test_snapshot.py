@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+""" A unittest script for the snapshot module. """
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession, Project
+from cutlass.local import LocalStore
+from cutlass import snapshot
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+class SnapshotTest(unittest.TestCase):
+    """ A unit test class for the snapshot module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.tmpdir = tempfile.mkdtemp()
+
+        self.docs = [
+            CutlassTestDocs.project("proj1"),
+            CutlassTestDocs.study("study1", {"part_of": ["proj1"]}),
+            CutlassTestDocs.study("study2", {"part_of": ["proj1"]}),
+            CutlassTestDocs.study("study3", {"subset_of": ["study1", "study2"]}),
+            CutlassTestDocs.subject("subject1", {"participates_in": ["study1"]}),
+            CutlassTestDocs.visit("visit1", {"by": ["subject1"]}),
+            CutlassTestDocs.sample("sample1", {"collected_during": ["visit1"]}),
+            CutlassTestDocs.project("other")
+        ]
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+        shutil.rmtree(self.tmpdir)
+
+    def testRoundTrip(self):
+        """ Test exporting a subtree and importing it elsewhere. """
+        session = iHMPSession.get_session()
+        session.use_local(LocalStore(self.docs))
+
+        path = os.path.join(self.tmpdir, "proj1.jsonl.gz")
+        written = snapshot.export_subtree(Project.load("proj1"), path, workers=2)
+        self.assertEqual(written, 7)
+
+        ids = [doc['id'] for doc in snapshot.read_docs(path)]
+        self.assertEqual(ids[0], "proj1")
+        self.assertFalse("other" in ids)
+        for (parent, child) in (("study1", "subject1"), ("subject1", "visit1"),
+                                ("visit1", "sample1")):
+            self.assertTrue(ids.index(parent) < ids.index(child))
+
+        session.use_remote()
+        target = session.use_local()
+
+        result = snapshot.import_subtree(path, batch_size=2, workers=2)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.count('saved'), 7)
+
+        id_map = result.id_map
+        self.assertEqual(sorted(id_map), sorted(ids))
+
+        study3 = target.get_node(id_map["study3"])
+        self.assertEqual(sorted(study3['linkage']['subset_of']),
+                         sorted([id_map["study1"], id_map["study2"]]))
+        self.assertEqual(target.get_node(id_map["sample1"])['meta']['name'], "sample1")
+
+    def testImportOrder(self):
+        """ Test that children listed before their parents wait for them. """
+        path = os.path.join(self.tmpdir, "reversed.jsonl")
+        with open(path, "w") as handle:
+            for doc in reversed(self.docs[:7]):
+                handle.write(json.dumps(doc) + "\n")
+
+        target = iHMPSession.get_session().use_local()
+        id_map = snapshot.import_subtree(path, batch_size=3).id_map
+
+        self.assertEqual(len(id_map), 7)
+        self.assertEqual(target.get_node(id_map["visit1"])['linkage'],
+                         {"by": [id_map["subject1"]]})
+
+    def testExternalLinks(self):
+        """ Test keeping or dropping links to nodes outside the file. """
+        path = os.path.join(self.tmpdir, "visit.jsonl.gz")
+        handle = gzip.open(path, "wb")
+        handle.write(json.dumps(self.docs[5]) + "\n")
+        handle.close()
+
+        target = iHMPSession.get_session().use_local()
+
+        id_map = snapshot.import_subtree(path).id_map
+        self.assertEqual(target.get_node(id_map["visit1"])['linkage'], {"by": ["subject1"]})
+
+        id_map = snapshot.import_subtree(path, keep_external=False).id_map
+        self.assertEqual(target.get_node(id_map["visit1"])['linkage'], {})
+
+    def testExportOrder(self):
+        """ Test that a node reachable at two depths follows its deeper parent. """
+        # study4 is found at depth 1 through proj1 and at depth 3 through study3
+        # sample2 also links to a visit outside the subtree
+        docs = self.docs + [CutlassTestDocs.study("study4", {"part_of": ["proj1"],
+                                                             "subset_of": ["study3"]}),
+                            CutlassTestDocs.sample("sample2", {"collected_during":
+                                                               ["visit1", "visit9"]})]
+        session = iHMPSession.get_session()
+        session.use_local(LocalStore(docs))
+
+        path = os.path.join(self.tmpdir, "dag.jsonl")
+        self.assertEqual(snapshot.export_subtree(Project.load("proj1"), path), 9)
+
+        ids = [doc['id'] for doc in snapshot.read_docs(path)]
+        self.assertTrue(ids.index("study3") < ids.index("study4"))
+        self.assertTrue(ids.index("visit1") < ids.index("sample2"))
+
+        session.use_remote()
+        target = session.use_local()
+
+        result = snapshot.import_subtree(path, batch_size=1)
+        self.assertTrue(result.ok)
+        self.assertEqual(target.get_node(result.id_map["study4"])['linkage']['subset_of'],
+                         [result.id_map["study3"]])
+
+    def testImportFailure(self):
+        """ Test that a failed insert is reported and only its subtree skipped. """
+        path = os.path.join(self.tmpdir, "proj1.jsonl")
+        with open(path, "w") as handle:
+            for doc in self.docs[:7]:
+                handle.write(json.dumps(doc) + "\n")
+
+        target = iHMPSession.get_session().use_local()
+        insert_node = target.insert_node
+
+        def failing_insert(doc):
+            """ Refuses to insert subjects. """
+            if doc['node_type'] == "subject":
+                raise Exception("Refused.")
+            return insert_node(doc)
+
+        target.insert_node = failing_insert
+
+        result = snapshot.import_subtree(path, batch_size=2)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.nodes('failed'), ["subject1"])
+        self.assertEqual(sorted(result.nodes('skipped')), ["sample1", "visit1"])
+        self.assertEqual(result.count('saved'), 4)
+        self.assertEqual(sorted(result.id_map), ["proj1", "study1", "study2", "study3"])
+        self.assertEqual(len(target.store), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+""" A unittest script for the streaming module. """
+
+import json
+import unittest
+
+from osdf import OSDF
+
+from cutlass import iHMPSession, Sample
+from cutlass import streaming
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CannedOSDF, CutlassTestDocs
+
+# pylint: disable=W0703, C1801
+
+def _pieces(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+class _Response(object):
+    """ A canned HTTP response. """
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def getheader(self, _name):
+        return None
+
+    def read(self, size=None):
+        if size is None:
+            size = len(self.body)
+        (chunk, self.body) = (self.body[:size], self.body[size:])
+        return chunk
+
+class _Connection(object):
+    """ Stands in for an HTTP connection, answering with the next response. """
+    responses = []
+
+    def __init__(self, _server, _port):
+        pass
+
+    def putrequest(self, *_args):
+        pass
+
+    def putheader(self, *_args):
+        pass
+
+    def endheaders(self):
+        pass
+
+    def send(self, _data):
+        pass
+
+    def getresponse(self):
+        return _Connection.responses.pop(0)
+
+    def close(self):
+        pass
+
+class StreamingTest(unittest.TestCase):
+    """ A unit test class for the streaming module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+
+    def tearDown(self):
+        iHMPSession.get_session()._osdf = self.saved_osdf
+
+    def testIterResults(self):
+        """ Test parsing a response split at every possible boundary. """
+        docs = [CutlassTestDocs.sample("sample%s" % num, {"collected_during": ["v"]})
+                for num in range(4)]
+        text = json.dumps({"page": 1, "results": docs, "result_count": 1234567})
+
+        for size in (1, 2, 5, 64, len(text)):
+            meta = {}
+            parsed = list(streaming.iter_results(_pieces(text, size), meta))
+
+            self.assertEqual(parsed, docs)
+            self.assertEqual(meta, {"page": 1, "result_count": 1234567})
+            self.assertTrue(type(parsed[0]['meta']['name']) is str)
+
+    def testIterResultsIsIncremental(self):
+        """ Test that documents are yielded before the response is complete. """
+        read = []
+
+        def chunks():
+            for piece in ['{"result_count": 2, "results": [{"id": "a"}',
+                          ', {"id": "b"}', ']}']:
+                read.append(piece)
+                yield piece
+
+        results = streaming.iter_results(chunks())
+
+        self.assertEqual(next(results), {"id": "a"})
+        self.assertEqual(len(read), 1)
+        self.assertEqual(list(results), [{"id": "b"}])
+
+    def testMalformed(self):
+        """ Test that truncated or invalid responses are rejected. """
+        with self.assertRaises(ValueError):
+            list(streaming.iter_results(['{"results": [{"id": "a"}']))
+
+        with self.assertRaises(ValueError):
+            list(streaming.iter_results(['["not", "an", "object"]']))
+
+        self.assertEqual(list(streaming.iter_results(['{"results": []}'])), [])
+
+    def testStreamedSearch(self):
+        """ Test the streamed search path, across several pages. """
+        docs = [CutlassTestDocs.sample("sample%s" % num, {}) for num in range(5)]
+        osdf = CannedOSDF({'"sample"[node_type]': docs}, page_size=2)
+        iHMPSession.get_session()._osdf = osdf
+
+        ids = [sample.id for sample in Sample.search_iter(stream=True)]
+
+        self.assertEqual(ids, ["sample%s" % num for num in range(5)])
+        self.assertEqual(len(osdf.queries), 3)
+
+    def testStreamedStats(self):
+        """ Test that streamed queries are timed in the session's stats. """
+        docs = [CutlassTestDocs.sample("sample%s" % num, {}) for num in range(3)]
+        body = json.dumps({"result_count": 3, "page": 1, "results": docs})
+        client = OSDF("localhost", "user", "password")
+
+        _Connection.responses = [_Response(200, body), _Response(200, body),
+                                 _Response(500, "")]
+        original = streaming.httplib.HTTPConnection
+        streaming.httplib.HTTPConnection = _Connection
+
+        session = iHMPSession.get_session()
+        stats = session.start_stats()
+        try:
+            self.assertEqual(len(list(streaming.stream_oql(client, "test", "q"))), 3)
+
+            # Reading only part of a page still counts as a success
+            results = streaming.stream_oql(client, "test", "q")
+            next(results)
+            results.close()
+
+            with self.assertRaises(Exception):
+                list(streaming.stream_oql(client, "test", "q"))
+        finally:
+            streaming.httplib.HTTPConnection = original
+            session.stop_stats()
+
+        summary = stats.summary()
+        self.assertEqual(summary['oql_query']['count'], 3)
+        self.assertEqual(summary['oql_query']['failures'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
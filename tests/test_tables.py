@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+""" A unittest script for the tables module. """
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from cutlass import iHMPSession, SubjectAttribute, VisitAttribute
+from cutlass.keys import KeyIndex
+from cutlass.local import LocalStore
+from cutlass.tables import AttributeTable, layout
+
+from CutlassTestConfig import CutlassTestConfig
+from CutlassTestDocs import CutlassTestDocs
+
+# pylint: disable=W0703, C1801, W0212
+
+TABLE = """Visit\tage\tbmi\tpregnant\tsixtym_gluc\twalking_days\tdisease_name\tnotes
+visit1\t34\t22.5\tno\t110\t3\tT2D\tx
+visit2\t41\t\tyes\t\t\t\t
+visit3\told\t27.1\tmaybe\t95\t2\t\t
+visit4\t150\t30.2\tn\t101\t-1\t\t
+"""
+
+class TablesTest(unittest.TestCase):
+    """ A unit test class for the tables module. """
+
+    session = None
+
+    @classmethod
+    def setUpClass(cls):
+        """ Setup for the unittest. """
+        cls.session = CutlassTestConfig.get_session()
+
+    def setUp(self):
+        self.saved_osdf = iHMPSession.get_session()._osdf
+        self.osdf = iHMPSession.get_session().use_local(
+            LocalStore([CutlassTestDocs.visit("visit%s" % num, {"by": ["subject1"]})
+                        for num in range(1, 5)]))
+
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "visits.tsv")
+
+        with open(self.path, "w") as handle:
+            handle.write(TABLE)
+
+    def tearDown(self):
+        session = iHMPSession.get_session()
+        session.use_remote()
+        session._osdf = self.saved_osdf
+
+        shutil.rmtree(self.directory)
+
+    def testLayout(self):
+        """ Test the property types and document paths found for a class. """
+        (_empty, properties) = layout("visit_attr")
+
+        self.assertEqual(properties["age"][:2], (int, [("meta", "clinical_patient", "age")]))
+        self.assertEqual(properties["sixtym_gluc"][1], [("meta", "clinical_patient", "60m_gluc")])
+        self.assertEqual(properties["pregnant"][0], bool)
+        self.assertEqual(properties["study"][1], [("meta", "study"), ("meta", "subtype")])
+
+        (_empty, properties) = layout("subject_attr")
+        self.assertEqual(properties["tobacco"][:2], (int, [("meta", "tobacco")]))
+
+    def testProblems(self):
+        """ Test that every bad cell is reported, and no documents made. """
+        table = AttributeTable.from_file(self.path, "visit_attr",
+                                         rules={"age": {"min": 0, "max": 120},
+                                                "walking_days": {"min": 0, "max": 7}},
+                                         links={"associated_with": "Visit"})
+
+        self.assertEqual(table.rows, 4)
+        self.assertEqual(table.ignored, ["notes"])
+        self.assertEqual([(problem['row'], problem['column']) for problem in table.problems],
+                         [(4, "age"), (4, "pregnant"), (5, "age"), (5, "walking_days")])
+        self.assertEqual(table.problems[1]['value'], "maybe")
+
+        with self.assertRaises(ValueError):
+            table.documents()
+
+    def testDocuments(self):
+        """ Test that the documents match those the class would save. """
+        rows = [{"age": "34", "bmi": "22.5", "pregnant": "no", "sixtym_gluc": "110",
+                 "walking_days": "3", "disease_name": "T2D", "Visit": "visit1"}]
+
+        table = AttributeTable("visit_attr", rows, links={"associated_with": "Visit"},
+                               values={"study": "prediabetes", "comment": "test",
+                                       "survey_id": "s1"})
+        self.assertTrue(table.ok)
+
+        attr = VisitAttribute()
+        attr.study = "prediabetes"
+        attr.comment = "test"
+        attr.survey_id = "s1"
+        attr.age = 34
+        attr.bmi = 22.5
+        attr.pregnant = False
+        attr.sixtym_gluc = 110
+        attr.walking_days = 3
+        attr.disease_name = "T2D"
+        attr.links = {"associated_with": ["visit1"]}
+
+        self.assertEqual(table.documents(), [attr._get_raw_doc()])
+
+        attr = SubjectAttribute()
+        attr.study = "prediabetes"
+        attr.tobacco = 2
+        attr.allergies = True
+
+        table = AttributeTable("subject_attr", [{"tobacco": "2", "allergies": "Yes"}],
+                               values={"study": "prediabetes"})
+        self.assertEqual(table.documents(), [attr._get_raw_doc()])
+
+    def testSave(self):
+        """ Test saving, with the linked visits found by their natural key. """
+        index = KeyIndex(self.osdf.store)
+
+        table = AttributeTable.from_file(self.path, "visit_attr",
+                                         links={"associated_with": ("Visit", "visit")},
+                                         index=index)
+        self.assertEqual([problem['column'] for problem in table.problems], ["age", "pregnant"])
+
+        table = AttributeTable("visit_attr",
+                               [{"Visit": "visit2", "age": "41"},
+                                {"Visit": "visit9", "age": "40"}],
+                               links={"associated_with": ("Visit", "visit")}, index=index)
+        self.assertEqual(table.problems, [{'row': 2, 'column': "Visit", 'value': "visit9",
+                                           'error': "No visit has this key."}])
+
+        table = AttributeTable("visit_attr", [{"Visit": "visit2", "age": "41"}],
+                               links={"associated_with": ("Visit", "visit")}, index=index)
+        result = table.save(workers=2)
+
+        self.assertTrue(result.ok)
+        doc = self.osdf.get_node(result.nodes('saved')[0]['id'])
+        self.assertEqual(doc['linkage'], {"associated_with": ["visit2"]})
+        self.assertEqual(doc['meta']['clinical_patient'], {"age": 41})
+
+if __name__ == '__main__':
+    unittest.main()